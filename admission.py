@@ -0,0 +1,246 @@
+# admission.py
+import os
+import asyncio
+import threading
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import select, func, or_
+from dotenv import load_dotenv
+from models import Video, Subscription, SubscriptionPlan
+from workspace import scratch
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Счетчики задач в обработке: memory - в процессе, redis - общие для всех процессов и узлов
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", os.getenv("JOB_BACKEND", "local"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Сколько задач (в очереди и в работе) принимается всего и на одного пользователя
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "2"))
+ADMISSION_MAX_PER_USER_PREMIUM = int(os.getenv("ADMISSION_MAX_PER_USER_PREMIUM", "4"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "30"))
+# Лимит видео в месяц для пользователей без подписки (-1 - без ограничений)
+FREE_PLAN_MAX_VIDEOS = int(os.getenv("FREE_PLAN_MAX_VIDEOS", "5"))
+# Счетчики в Redis живут не дольше суток на случай падения воркера
+COUNTER_TTL_SECONDS = 24 * 3600
+
+# Меньшее значение забирается из очереди раньше
+PRIORITY_PREMIUM = 0
+PRIORITY_FREE = 1
+
+TOTAL_KEY = "captioncraft:admission:total"
+USER_KEY_PREFIX = "captioncraft:admission:user:"
+
+_ACQUIRE_SCRIPT = """
+local user = tonumber(redis.call('GET', KEYS[2]) or '0')
+if user >= tonumber(ARGV[2]) then return 1 end
+local total = tonumber(redis.call('GET', KEYS[1]) or '0')
+if total >= tonumber(ARGV[1]) then return 2 end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if tonumber(redis.call('GET', key) or '0') > 0 then redis.call('DECR', key) end
+end
+return 0
+"""
+
+# Результаты acquire
+ADMITTED = 0
+USER_LIMIT = 1
+NODE_LIMIT = 2
+
+
+class _MemoryCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total = 0
+        self._users = {}
+
+    def acquire(self, user_id, max_total, max_per_user):
+        with self._lock:
+            if self._users.get(user_id, 0) >= max_per_user:
+                return USER_LIMIT
+            if self._total >= max_total:
+                return NODE_LIMIT
+            self._total += 1
+            self._users[user_id] = self._users.get(user_id, 0) + 1
+            return ADMITTED
+
+    def release(self, user_id):
+        with self._lock:
+            count = self._users.get(user_id, 0)
+            if count <= 0:
+                return
+            if count == 1:
+                del self._users[user_id]
+            else:
+                self._users[user_id] = count - 1
+            self._total = max(self._total - 1, 0)
+
+    def in_flight(self):
+        return self._total
+
+
+class _RedisCounters:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self._acquire = self.client.register_script(_ACQUIRE_SCRIPT)
+        self._release = self.client.register_script(_RELEASE_SCRIPT)
+
+    def acquire(self, user_id, max_total, max_per_user):
+        return int(self._acquire(
+            keys=[TOTAL_KEY, USER_KEY_PREFIX + str(user_id)],
+            args=[max_total, max_per_user, COUNTER_TTL_SECONDS],
+        ))
+
+    def release(self, user_id):
+        self._release(keys=[TOTAL_KEY, USER_KEY_PREFIX + str(user_id)])
+
+    def in_flight(self):
+        return int(self.client.get(TOTAL_KEY) or 0)
+
+
+def _month_start(now):
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _seconds_until_next_month(now):
+    start = _month_start(now)
+    if start.month == 12:
+        next_start = start.replace(year=start.year + 1, month=1)
+    else:
+        next_start = start.replace(month=start.month + 1)
+    return int((next_start - now).total_seconds()) + 1
+
+
+def _too_many_requests(detail, retry_after):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class AdmissionController:
+    """
+    Пропускает задачу рендера, только если у пользователя не исчерпан
+    месячный лимит тарифа и не превышены лимиты одновременных задач
+    (общий и на пользователя). Иначе запрос отклоняется с 429 и Retry-After,
+    чтобы очередь и время ожидания не росли без ограничений. При нехватке
+    места под рабочие файлы - 503 с Retry-After.
+    """
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.admitted = 0
+        self.rejected = {"quota": 0, "user": 0, "node": 0, "disk": 0}
+
+    async def plan_usage(self, db, user):
+        """Лимит видео по тарифу и количество видео за текущий месяц одним запросом"""
+        now = datetime.utcnow()
+        plan_limit = (
+            select(SubscriptionPlan.max_videos)
+            .join(Subscription, Subscription.plan_id == SubscriptionPlan.id)
+            .where(
+                Subscription.user_id == user.id,
+                Subscription.is_active.is_(True),
+                or_(Subscription.end_date.is_(None), Subscription.end_date > now),
+            )
+            .order_by(Subscription.start_date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        used = (
+            select(func.count(Video.id))
+            .where(Video.user_id == user.id, Video.created_at >= _month_start(now))
+            .scalar_subquery()
+        )
+        row = (await db.execute(select(plan_limit, used))).one()
+        max_videos = row[0]
+        if max_videos is None:
+            max_videos = FREE_PLAN_MAX_VIDEOS if user.free_tier else -1
+        return max_videos, row[1]
+
+    async def videos_left(self, db, user):
+        """Сколько видео пользователь еще может обработать в этом месяце (None - без ограничения)"""
+        max_videos, used = await self.plan_usage(db, user)
+        return None if max_videos < 0 else max(max_videos - used, 0)
+
+    async def admit(self, db, user, incoming_bytes=None):
+        """
+        Резервирует место для задачи пользователя и возвращает ее приоритет.
+        incoming_bytes - размер загрузки для задач с рабочими файлами: если бюджет
+        SCRATCH_MAX_MB исчерпан, задача ждет освобождения места, а не получив его, - 503.
+        """
+        max_videos, used = await self.plan_usage(db, user)
+        # Завершаем транзакцию: иначе соединение остается занятым, пока ждем место
+        # на диске и читаем тело запроса (минуты для больших загрузок). Сессия
+        # создана с expire_on_commit=False, поэтому user остается загруженным.
+        await db.commit()
+        if max_videos >= 0 and used >= max_videos:
+            self.rejected["quota"] += 1
+            raise _too_many_requests(
+                f"Лимит тарифа исчерпан: {max_videos} видео в месяц",
+                _seconds_until_next_month(datetime.utcnow()),
+            )
+
+        if incoming_bytes is not None and not await scratch.wait_for_room(incoming_bytes):
+            self.rejected["disk"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Недостаточно места для обработки, повторите попытку позже",
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+
+        premium = not user.free_tier or max_videos < 0
+        max_per_user = ADMISSION_MAX_PER_USER_PREMIUM if premium else ADMISSION_MAX_PER_USER
+        result = await asyncio.to_thread(
+            self.counters.acquire, user.id, ADMISSION_MAX_IN_FLIGHT, max_per_user
+        )
+        if result == USER_LIMIT:
+            self.rejected["user"] += 1
+            raise _too_many_requests(
+                f"Слишком много задач в обработке. Одновременно можно не более {max_per_user}",
+                ADMISSION_RETRY_AFTER_SECONDS,
+            )
+        if result == NODE_LIMIT:
+            self.rejected["node"] += 1
+            raise _too_many_requests(
+                "Сервер перегружен, повторите попытку позже",
+                ADMISSION_RETRY_AFTER_SECONDS,
+            )
+        self.admitted += 1
+        return PRIORITY_PREMIUM if premium else PRIORITY_FREE
+
+    def release(self, user_id):
+        """Освобождает место после завершения задачи (вызывается и из воркеров)"""
+        self.counters.release(user_id)
+
+    def stats(self):
+        return {
+            "backend": "redis" if isinstance(self.counters, _RedisCounters) else "memory",
+            "in_flight": self.counters.in_flight(),
+            "max_in_flight": ADMISSION_MAX_IN_FLIGHT,
+            "max_per_user": ADMISSION_MAX_PER_USER,
+            "max_per_user_premium": ADMISSION_MAX_PER_USER_PREMIUM,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            **scratch.stats(),
+        }
+
+
+def _create_counters():
+    if ADMISSION_BACKEND == "redis":
+        return _RedisCounters(REDIS_URL)
+    return _MemoryCounters()
+
+
+admission = AdmissionController(_create_counters())
@@ -1,24 +1,50 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, AsyncSessionLocal
+from models import User
+from user_cache import user_cache
 import os
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Получаем секретный ключ из переменных окружения или используем значение по умолчанию
 SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 дней
 
+# Стоимость bcrypt; хеши с другой стоимостью пересчитываются при входе
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Пул для bcrypt: сколько хешей считается одновременно и сколько может ждать в очереди
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "5"))
+
 # Создаем контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt отпускает GIL, поэтому отдельные потоки не блокируют цикл событий
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+# Ссылки на фоновые перехеширования, чтобы задачи не собрал сборщик мусора
+_rehash_tasks = set()
 
 # Создаем схему OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
@@ -29,14 +55,58 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, email: str, password: str):
+async def _run_hashing(func, *args):
+    """
+    Выполняет func в пуле bcrypt. Если пул и очередь заняты дольше
+    PASSWORD_HASH_WAIT_SECONDS, запрос отклоняется с 503.
+    """
+    try:
+        await asyncio.wait_for(_hash_slots.acquire(), PASSWORD_HASH_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_slots.release()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_hashing(get_password_hash, password)
+
+async def _rehash_password(user_id: int, password: str):
+    try:
+        hashed_password = await get_password_hash_async(password)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(User).where(User.id == user_id).values(password=hashed_password)
+            )
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Failed to rehash password for user {user_id}: {e}")
+
+def schedule_rehash(user, password: str):
+    """Пересчитывает хеш с устаревшей стоимостью в фоне, не задерживая ответ"""
+    if not pwd_context.needs_update(user.password):
+        return
+    task = asyncio.get_running_loop().create_task(_rehash_password(user.id, password))
+    _rehash_tasks.add(task)
+    task.add_done_callback(_rehash_tasks.discard)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     # Импортируем здесь, чтобы избежать циклического импорта
     from user import get_user_by_email
-    user = get_user_by_email(db, email)
+    user = await get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         return False
+    schedule_rehash(user, password)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -49,7 +119,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Недействительные учетные данные",
@@ -63,10 +133,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    # Импортируем здесь, чтобы избежать циклического импорта
-    from user import get_user_by_email
-    user = get_user_by_email(db, email=email)
+    user = await resolve_user(db, email)
     if user is None:
         raise credentials_exception
     return user
 
+async def resolve_user(db: AsyncSession, email: str):
+    """Пользователь по subject токена: сначала из кэша, затем из базы"""
+    user = await user_cache.get(email)
+    if user is not None:
+        return user
+    # Импортируем здесь, чтобы избежать циклического импорта
+    from user import get_user_by_email
+    user = await get_user_by_email(db, email=email)
+    if user is not None:
+        await user_cache.set(email, user)
+    return user
+
@@ -0,0 +1,111 @@
+# benchmarks/cold_start.py
+# Время холодного старта API: запускает сервер командой --command и опрашивает
+# /healthz (процесс отвечает) и /readyz (база на последней миграции, модели
+# VOSK_PRELOAD_MODELS загружены). Отчет - время до первого ответа каждого
+# эндпоинта по нескольким запускам и самые дорогие импорты main по python -X importtime.
+# Схема должна быть обновлена заранее: alembic upgrade head.
+# Запуск из корня репозитория:
+#   python benchmarks/cold_start.py --runs 5
+#   python benchmarks/cold_start.py --command "gunicorn -c gunicorn.conf.py main:app" --url http://localhost:8000
+import os
+import sys
+import json
+import time
+import shlex
+import signal
+import argparse
+import subprocess
+import statistics
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def status_of(url):
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def measure_start(command, url, timeout):
+    """Секунды от запуска процесса до 200 на /healthz и на /readyz"""
+    started = time.perf_counter()
+    process = subprocess.Popen(shlex.split(command), cwd=ROOT, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    healthy = ready = None
+    try:
+        while ready is None and time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            if healthy is None and status_of(f"{url}/healthz") == 200:
+                healthy = time.perf_counter() - started
+            if healthy is not None and status_of(f"{url}/readyz") == 200:
+                ready = time.perf_counter() - started
+            time.sleep(0.05)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+    return healthy, ready
+
+
+def import_times(limit):
+    """Модули с наибольшим суммарным временем импорта при import main"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Модули, импортированные прямо из main: один уровень отступа под ним
+        name = name[1:]
+        if name.startswith("  ") and not name.startswith("    "):
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold start benchmark")
+    parser.add_argument("--command", default="uvicorn main:app --port 8000", help="server command")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--imports", type=int, default=10, help="how many top imports to show (0 - skip)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    runs = [measure_start(args.command, args.url, args.timeout) for _ in range(args.runs)]
+    healthy = [value for value, _ in runs if value is not None]
+    ready = [value for _, value in runs if value is not None]
+    results = {
+        "command": args.command,
+        "runs": len(runs),
+        "healthz_median": round(statistics.median(healthy), 3) if healthy else None,
+        "readyz_median": round(statistics.median(ready), 3) if ready else None,
+        "readyz_max": round(max(ready), 3) if ready else None,
+        "not_ready": len(runs) - len(ready),
+        "imports": [{"module": name, "seconds": round(seconds, 3)}
+                    for seconds, name in (import_times(args.imports) if args.imports else [])],
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.command}: {len(runs)} runs")
+    print(f"  /healthz median {results['healthz_median']}s")
+    print(f"  /readyz  median {results['readyz_median']}s, max {results['readyz_max']}s, "
+          f"not ready within {args.timeout:g}s: {results['not_ready']}")
+    if results["imports"]:
+        print("Slowest imports of main:")
+        for row in results["imports"]:
+            print(f"  {row['seconds']:>7.3f}s  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/cue_encode.py
+# Сравнение времени вжигания субтитров: по одному слову на субтитр (старый вывод),
+# фразы в SRT и фразы в ASS с караоке. Видео и слова синтетические (lavfi testsrc).
+# Запуск из корня репозитория:
+#   python benchmarks/cue_encode.py --duration 600
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cues import group_words, write_srt_cues, write_ass_cues
+from render import build_burn_in_command
+
+VOCABULARY = ("the", "caption", "video", "short", "really", "important", "moment", "we", "talk", "about",
+              "subtitles", "render", "and", "this", "is", "where", "it", "gets", "interesting")
+
+
+def synthetic_words(duration, seed=0):
+    """Слова со скоростью обычной речи (~2.5 слова/с) и редкими паузами"""
+    rng = random.Random(seed)
+    words = []
+    position = 0.2
+    while position < duration - 1:
+        length = rng.uniform(0.15, 0.45)
+        words.append({"word": rng.choice(VOCABULARY), "start": round(position, 2),
+                      "end": round(position + length, 2), "conf": 1.0})
+        position += length + (rng.uniform(0.7, 1.5) if rng.random() < 0.08 else rng.uniform(0.02, 0.15))
+    return words
+
+
+def make_video(path, duration, size):
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path
+    ], check=True)
+
+
+def time_encode(video, subtitles, output, profile):
+    command = build_burn_in_command(video, None, subtitles, output, profile)
+    command[1:1] = ["-v", "error"]
+    started = time.perf_counter()
+    subprocess.run(command, check=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Burn-in encode time: per-word cues vs grouped cues")
+    parser.add_argument("--duration", type=float, default=120.0, help="synthetic clip length in seconds")
+    parser.add_argument("--size", default="1080x1920")
+    parser.add_argument("--profile", default="fast")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        video = os.path.join(workdir, "input.mp4")
+        make_video(video, args.duration, args.size)
+        words = synthetic_words(args.duration)
+
+        # max_chars=0 - каждое слово отдельным субтитром, как было до группировки
+        per_word = list(group_words(words, max_chars=0))
+        grouped = list(group_words(words))
+        variants = (
+            ("per_word_srt", "words.srt", per_word, write_srt_cues),
+            ("grouped_srt", "grouped.srt", grouped, write_srt_cues),
+            ("karaoke_ass", "karaoke.ass", grouped, write_ass_cues),
+        )
+
+        results = []
+        baseline = None
+        for name, filename, cues, write in variants:
+            path = os.path.join(workdir, filename)
+            write(cues, path)
+            timings = [
+                time_encode(video, path, os.path.join(workdir, f"{name}.mp4"), args.profile)
+                for _ in range(args.repeat)
+            ]
+            best = min(timings)
+            baseline = baseline or best
+            results.append({
+                "variant": name,
+                "cues": len(cues),
+                "encode_seconds": round(best, 3),
+                "speedup": round(baseline / best, 2),
+            })
+
+    if args.json:
+        print(json.dumps({"duration": args.duration, "words": len(words), "results": results}, indent=2))
+        return
+
+    print(f"{args.duration:.0f}s clip, {len(words)} words, profile {args.profile}")
+    print(f"{'variant':>14} {'cues':>7} {'encode s':>10} {'speedup':>8}")
+    for row in results:
+        print(f"{row['variant']:>14} {row['cues']:>7} {row['encode_seconds']:>10.2f} {row['speedup']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
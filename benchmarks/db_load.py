@@ -0,0 +1,114 @@
+# benchmarks/db_load.py
+# Нагрузочный тест эндпоинтов, которые ходят в базу (/profile, /user/statistics).
+# Запускается против работающего сервера с локальным Postgres:
+#   uvicorn main:app --port 8000 &
+#   python benchmarks/db_load.py --url http://localhost:8000 --concurrency 1,8,32,64
+import json
+import time
+import uuid
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _request(url, data=None, headers=None, json_body=None):
+    headers = dict(headers or {})
+    body = None
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers["Content-Type"] = "application/json"
+    elif data is not None:
+        body = urllib.parse.urlencode(data).encode()
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    request = urllib.request.Request(url, data=body, headers=headers)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, response.read()
+
+
+def get_token(base_url, email, password):
+    try:
+        _request(f"{base_url}/register", json_body={"email": email, "password": password, "username": email})
+    except urllib.error.HTTPError:
+        pass
+    _, body = _request(f"{base_url}/login", data={"email": email, "password": password})
+    return json.loads(body)["access_token"]
+
+
+def run_level(url, headers, concurrency, duration):
+    """Гоняет запросы concurrency потоками duration секунд"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        nonlocal errors
+        local = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                _request(url, headers=headers)
+                local.append(time.perf_counter() - started)
+            except Exception:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database-bound endpoint load test")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/profile")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--email", default=f"bench-{uuid.uuid4().hex[:8]}@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    token = get_token(args.url, args.email, args.password)
+    headers = {"Authorization": f"Bearer {token}"}
+    results = [
+        run_level(args.url + args.endpoint, headers, int(level), args.duration)
+        for level in args.concurrency.split(",")
+    ]
+
+    if args.json:
+        print(json.dumps({"endpoint": args.endpoint, "results": results}, indent=2))
+        return
+
+    print(f"{args.endpoint} for {args.duration:.0f}s per level")
+    print(f"{'conc':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for row in results:
+        print(f"{row['concurrency']:>6} {row['rps']:>9.1f} {row['p50_ms'] or 0:>9.2f} "
+              f"{row['p95_ms'] or 0:>9.2f} {row['p99_ms'] or 0:>9.2f} {row['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/login_latency.py
+# Гистограмма задержек /login под параллельной нагрузкой. Параллельно с логинами
+# опрашивается легкий эндпоинт (--probe), чтобы видеть, блокирует ли bcrypt
+# цикл событий для остальных запросов.
+#   uvicorn main:app --port 8000 &
+#   python benchmarks/login_latency.py --url http://localhost:8000 --concurrency 1,8,32
+import json
+import time
+import uuid
+import argparse
+import threading
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from db_load import _request
+
+# Верхние границы корзин гистограммы, мс
+BUCKETS_MS = (25, 50, 100, 200, 400, 800, 1600, 3200, float("inf"))
+
+
+def histogram(latencies):
+    counts = [0] * len(BUCKETS_MS)
+    for latency in latencies:
+        for index, bound in enumerate(BUCKETS_MS):
+            if latency * 1000 <= bound:
+                counts[index] += 1
+                break
+    return {("+Inf" if bound == float("inf") else str(bound)): count for bound, count in zip(BUCKETS_MS, counts)}
+
+
+def percentile(latencies, p):
+    if not latencies:
+        return None
+    return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)
+
+
+def run_level(base_url, credentials, concurrency, duration, probe):
+    login_latencies = []
+    probe_latencies = []
+    errors = {"login": 0, "probe": 0, "rejected": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def login_worker(email, password):
+        local = []
+        local_errors = 0
+        local_rejected = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                _request(f"{base_url}/login", data={"email": email, "password": password})
+                local.append(time.perf_counter() - started)
+            except urllib.error.HTTPError as e:
+                if e.code == 503:
+                    local_rejected += 1
+                else:
+                    local_errors += 1
+            except Exception:
+                local_errors += 1
+        with lock:
+            login_latencies.extend(local)
+            errors["login"] += local_errors
+            errors["rejected"] += local_rejected
+
+    def probe_worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                _request(base_url + probe)
+                probe_latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors["probe"] += 1
+            time.sleep(0.05)
+
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+        pool.submit(probe_worker)
+        for index in range(concurrency):
+            pool.submit(login_worker, *credentials[index % len(credentials)])
+
+    login_latencies.sort()
+    probe_latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "logins": len(login_latencies),
+        "logins_per_second": round(len(login_latencies) / duration, 1),
+        "login_p50_ms": percentile(login_latencies, 0.5),
+        "login_p95_ms": percentile(login_latencies, 0.95),
+        "login_p99_ms": percentile(login_latencies, 0.99),
+        "login_histogram_ms": histogram(login_latencies),
+        "probe_p50_ms": percentile(probe_latencies, 0.5),
+        "probe_p99_ms": percentile(probe_latencies, 0.99),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login latency under concurrent load")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--users", type=int, default=8, help="distinct accounts to log in with")
+    parser.add_argument("--probe", default="/models/stats", help="cheap endpoint polled during the burst")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    credentials = []
+    for index in range(args.users):
+        email, password = f"login-bench-{run_id}-{index}@example.com", "bench-password"
+        _request(f"{args.url}/register", json_body={"email": email, "password": password, "username": email})
+        credentials.append((email, password))
+
+    results = [
+        run_level(args.url, credentials, int(level), args.duration, args.probe)
+        for level in args.concurrency.split(",")
+    ]
+
+    if args.json:
+        print(json.dumps({"results": results}, indent=2))
+        return
+
+    for row in results:
+        print(f"concurrency {row['concurrency']}: {row['logins_per_second']:.1f} logins/s, "
+              f"p50 {row['login_p50_ms'] or 0:.1f} ms, p95 {row['login_p95_ms'] or 0:.1f} ms, "
+              f"p99 {row['login_p99_ms'] or 0:.1f} ms, probe p99 {row['probe_p99_ms'] or 0:.1f} ms, "
+              f"503 {row['errors']['rejected']}, errors {row['errors']['login']}")
+        for bound, count in row["login_histogram_ms"].items():
+            print(f"  <= {bound:>5} ms {count:>7} {'#' * min(count, 60)}")
+
+
+if __name__ == "__main__":
+    main()
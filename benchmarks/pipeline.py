@@ -0,0 +1,225 @@
+# benchmarks/pipeline.py
+# Сквозной бенчмарк конвейера субтитров. Генерирует синтетические медиа через
+# lavfi (testsrc2 + sine) нескольких длительностей и разрешений и для каждого
+# этапа (extract_audio_from_video, transcribe_audio_to_srt, add_subtitles_to_video)
+# замеряет реальное время, пиковый RSS и процессорное время. Каждый замер идет
+# в отдельном процессе, поэтому RSS и CPU включают запущенный им ffmpeg.
+# Опционально нагружает эндпоинты работающего сервера.
+# Запуск из корня репозитория:
+#   python benchmarks/pipeline.py --durations 10,60 --sizes 720x1280 --stub-recognizer --output bench.json
+#   python benchmarks/pipeline.py --model vosk-model-small-en-us-0.15 --url http://localhost:8000
+#   python benchmarks/pipeline.py --sizes 3840x2160 --stub-recognizer --frame-size 1080x1920 --fit crop
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STAGES = ("extract", "transcribe", "render")
+
+
+def make_media(path, duration, size, rate=30):
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:beep_factor=4:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path
+    ], check=True)
+
+
+def install_stub_recognizer():
+    """
+    Подменяет vosk распознавателем-заглушкой: одно слово на каждые 5 кусков PCM.
+    Замер тогда показывает стоимость декодирования и обвязки без самой модели.
+    """
+    import types
+
+    class Model:
+        def __init__(self, model_path=None, model_name=None, lang=None):
+            pass
+
+    class KaldiRecognizer:
+        def __init__(self, model, sample_rate, *args):
+            self.sample_rate = sample_rate
+            self.chunks = 0
+            self.seconds = 0.0
+
+        def SetWords(self, enabled):
+            pass
+
+        def AcceptWaveform(self, data):
+            self.chunks += 1
+            self.seconds += len(data) / 2 / self.sample_rate
+            return self.chunks % 5 == 0
+
+        def _result(self):
+            return json.dumps({"result": [{
+                "word": f"word{self.chunks}", "start": max(self.seconds - 0.4, 0.0),
+                "end": self.seconds, "conf": 1.0,
+            }]})
+
+        Result = FinalResult = _result
+
+        def PartialResult(self):
+            return json.dumps({"partial": f"word{self.chunks}"})
+
+    sys.modules["vosk"] = types.SimpleNamespace(Model=Model, KaldiRecognizer=KaldiRecognizer)
+    # Заглушке не нужен каталог модели на диске: реестр загружает ее под любым именем
+    import model_registry
+    model_registry.resolve_model_path = lambda name: name
+
+
+def run_stage(stage, media, workdir, model, profile, frame=None):
+    """Выполняется в дочернем процессе: один этап конвейера над media"""
+    from subs import extract_audio_from_video, transcribe_audio_to_srt, add_subtitles_to_video
+    from model_registry import get_model
+
+    srt = os.path.join(workdir, "bench.srt")
+    if stage == "transcribe":
+        # Загрузка модели не входит в замер этапа
+        get_model(model)
+    # Время считается без запуска интерпретатора и импортов
+    started = time.perf_counter()
+    if stage == "extract":
+        extract_audio_from_video(media, os.path.join(workdir, "bench.wav"))
+    elif stage == "transcribe":
+        transcribe_audio_to_srt(media, model, srt, "bench")
+    else:
+        add_subtitles_to_video(media, None, srt, os.path.join(workdir, "bench.mp4"), profile, frame=frame)
+    return time.perf_counter() - started
+
+
+def measure(stage, media, workdir, args):
+    """
+    Запускает этап в отдельном процессе и берет rusage этого процесса и его потомков.
+    cpu_seconds и peak_rss_mb включают запуск интерпретатора (~20 МБ).
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--run-stage", stage,
+               "--media", media, "--workdir", workdir, "--model", args.model, "--profile", args.profile,
+               "--frame-size", args.frame_size, "--fit", args.fit, "--max-fps", str(args.max_fps)]
+    if args.stub_recognizer:
+        command.append("--stub-recognizer")
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=ROOT)
+    output = process.stdout.read()
+    _, exit_status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(exit_status)
+    if process.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed with exit code {process.returncode}")
+    seconds = json.loads(output.decode().strip().splitlines()[-1])["seconds"]
+    return {
+        "wall_seconds": round(seconds, 3),
+        "process_seconds": round(wall, 3),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def load_test(url, endpoints, concurrency, duration):
+    from db_load import get_token, run_level
+    import uuid
+    token = get_token(url, f"bench-{uuid.uuid4().hex[:8]}@example.com", "bench-password")
+    headers = {"Authorization": f"Bearer {token}"}
+    results = []
+    for endpoint in endpoints:
+        for level in concurrency:
+            row = run_level(url + endpoint, headers, level, duration)
+            row["endpoint"] = endpoint
+            results.append(row)
+    return results
+
+
+def environment():
+    ffmpeg = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.splitlines()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg[0] if ffmpeg else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end caption pipeline benchmark")
+    parser.add_argument("--durations", default="10,60", help="comma-separated clip lengths in seconds")
+    parser.add_argument("--sizes", default="720x1280,1080x1920", help="comma-separated WxH")
+    parser.add_argument("--model", default="vosk-model-small-en-us-0.15")
+    parser.add_argument("--stub-recognizer", action="store_true", help="replace vosk with a stub recognizer")
+    parser.add_argument("--profile", default="fast")
+    parser.add_argument("--frame-size", default="", help="output frame WxH for the render stage (default: source)")
+    parser.add_argument("--fit", default="contain", help="contain, crop or pad (with --frame-size)")
+    parser.add_argument("--max-fps", type=float, default=0, help="output frame rate cap (0: source)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--url", default=None, help="also load-test a running server")
+    parser.add_argument("--endpoints", default="/profile,/user/statistics,/admission/stats")
+    parser.add_argument("--concurrency", default="1,16")
+    parser.add_argument("--load-duration", type=float, default=5.0)
+    parser.add_argument("--output", default=None, help="write JSON results to this file")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    # Внутренний режим: выполнить один этап в этом процессе
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--media", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        if args.stub_recognizer:
+            install_stub_recognizer()
+        from render import frame_format
+        frame = frame_format(args.frame_size, args.fit, args.max_fps)
+        seconds = run_stage(args.run_stage, args.media, args.workdir, args.model, args.profile, frame)
+        print(json.dumps({"seconds": seconds}))
+        return
+
+    results = {
+        "environment": environment(), "stub_recognizer": args.stub_recognizer,
+        "frame": {"size": args.frame_size or None, "fit": args.fit, "max_fps": args.max_fps or None},
+        "stages": [], "endpoints": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes.split(","):
+            for duration in (float(value) for value in args.durations.split(",")):
+                media = os.path.join(workdir, "input.mp4")
+                make_media(media, duration, size)
+                # Этапы идут по порядку: render использует SRT, созданный transcribe
+                for stage in STAGES:
+                    runs = [measure(stage, media, workdir, args) for _ in range(args.repeat)]
+                    best = min(runs, key=lambda run: run["wall_seconds"])
+                    results["stages"].append({
+                        "stage": stage, "size": size, "duration": duration,
+                        "realtime_factor": round(best["wall_seconds"] / duration, 4),
+                        **best,
+                    })
+
+    if args.url:
+        results["endpoints"] = load_test(
+            args.url, args.endpoints.split(","),
+            [int(level) for level in args.concurrency.split(",")], args.load_duration
+        )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'stage':>10} {'size':>10} {'dur s':>6} {'wall s':>8} {'RTF':>7} {'cpu s':>8} {'rss MB':>8}")
+    for row in results["stages"]:
+        print(f"{row['stage']:>10} {row['size']:>10} {row['duration']:>6.0f} {row['wall_seconds']:>8.2f} "
+              f"{row['realtime_factor']:>7.3f} {row['cpu_seconds']:>8.2f} {row['peak_rss_mb']:>8.1f}")
+    for row in results["endpoints"]:
+        print(f"{row['endpoint']:>20} conc {row['concurrency']:>3}: {row['rps']:.1f} rps, "
+              f"p50 {row['p50_ms'] or 0:.1f} ms, p99 {row['p99_ms'] or 0:.1f} ms, errors {row['errors']}")
+
+
+if __name__ == "__main__":
+    main()
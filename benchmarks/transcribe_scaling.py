@@ -0,0 +1,73 @@
+# benchmarks/transcribe_scaling.py
+# Замер масштабирования параллельного распознавания по числу процессов.
+# Запуск из корня репозитория:
+#   python benchmarks/transcribe_scaling.py --media long.mp4 --model vosk-model-small-en-us-0.15
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import get_model
+from parallel_transcribe import transcribe_parallel
+from render import probe_duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel transcription scaling benchmark")
+    parser.add_argument("--media", required=True, help="audio or video file to transcribe")
+    parser.add_argument("--model", default="vosk-model-small-en-us-0.15")
+    parser.add_argument("--workers", default=None,
+                        help="comma-separated worker counts (default: 1,2,4,... up to CPU count)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(",")]
+    else:
+        counts = []
+        count = 1
+        while count < (os.cpu_count() or 1):
+            counts.append(count)
+            count *= 2
+        counts.append(os.cpu_count() or 1)
+
+    # Загрузка модели не входит в замер
+    get_model(args.model)
+    duration = probe_duration(args.media)
+
+    results = []
+    baseline = None
+    for workers in counts:
+        timings = []
+        words = 0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            words = len(transcribe_parallel(args.media, args.model, workers))
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        baseline = baseline or best
+        results.append({
+            "workers": workers,
+            "seconds": round(best, 3),
+            "realtime_factor": round(best / duration, 4),
+            "speedup": round(baseline / best, 2),
+            "words": words,
+        })
+
+    if args.json:
+        print(json.dumps({"media": args.media, "duration": duration, "results": results}, indent=2))
+        return
+
+    print(f"{args.media}: {duration:.1f}s of media")
+    print(f"{'workers':>8} {'seconds':>10} {'RTF':>8} {'speedup':>8} {'words':>7}")
+    for row in results:
+        print(f"{row['workers']:>8} {row['seconds']:>10.2f} {row['realtime_factor']:>8.3f} "
+              f"{row['speedup']:>8.2f} {row['words']:>7}")
+
+
+if __name__ == "__main__":
+    main()
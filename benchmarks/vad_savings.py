@@ -0,0 +1,114 @@
+# benchmarks/vad_savings.py
+# Сколько времени распознавания экономит пропуск тишины (TRANSCRIBE_VAD).
+# Для каждого файла аудио декодируется в память один раз, затем распознается
+# без VAD и с VAD; отчет - доля речи, RTF (время распознавания / длительность)
+# в обоих режимах и сэкономленная доля времени. Без --media генерируются
+# синтетические файлы с заданной долей тишины (sine с паузами).
+# Запуск из корня репозитория:
+#   python benchmarks/vad_savings.py --media talk.mp4,lecture.mp3 --model vosk-model-small-en-us-0.15
+#   python benchmarks/vad_savings.py --silence 0.3,0.5,0.7 --stub-recognizer
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_gapped_audio(path, duration, silence, period=10):
+    """Тон, который молчит silence-долю каждого периода в period секунд"""
+    speech = period * (1 - silence)
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=300:duration={duration}",
+        "-af", f"volume='if(lt(mod(t,{period}),{speech}),1,0)':eval=frame",
+        "-ac", "1", path
+    ], check=True)
+
+
+def measure(model, chunks, skip_silence, repeat):
+    from subs import recognize_words, SAMPLE_RATE
+    from vad import SpeechFilter
+
+    timings = []
+    words = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        words = list(recognize_words(model, iter(chunks), SAMPLE_RATE, skip_silence=skip_silence))
+        timings.append(time.perf_counter() - started)
+    ratio = None
+    if skip_silence:
+        speech = SpeechFilter(SAMPLE_RATE)
+        for _ in speech.filter(iter(chunks)):
+            pass
+        ratio = speech.stats()["speech_ratio"]
+    return min(timings), len(words), ratio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Silence skipping (VAD) savings benchmark")
+    parser.add_argument("--media", default=None, help="comma-separated audio or video files")
+    parser.add_argument("--silence", default="0.3,0.5",
+                        help="silence shares for synthetic audio when --media is not given")
+    parser.add_argument("--duration", type=float, default=120, help="synthetic audio length, seconds")
+    parser.add_argument("--model", default="vosk-model-small-en-us-0.15")
+    parser.add_argument("--stub-recognizer", action="store_true",
+                        help="replace vosk with a stub (measures VAD overhead only)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.stub_recognizer:
+        from pipeline import install_stub_recognizer
+        install_stub_recognizer()
+
+    from model_registry import get_model
+    from subs import stream_pcm_from_media, SAMPLE_RATE
+
+    workdir = tempfile.mkdtemp(prefix="captioncraft-vad-")
+    if args.media:
+        media = args.media.split(",")
+    else:
+        media = []
+        for silence in (float(value) for value in args.silence.split(",")):
+            path = os.path.join(workdir, f"silence{int(silence * 100)}.wav")
+            make_gapped_audio(path, args.duration, silence)
+            media.append(path)
+
+    # Загрузка модели и декодирование не входят в замер
+    model = get_model(args.model)
+    results = []
+    for path in media:
+        chunks = list(stream_pcm_from_media(path))
+        duration = sum(len(chunk) for chunk in chunks) / 2 / SAMPLE_RATE
+        plain_seconds, plain_words, _ = measure(model, chunks, False, args.repeat)
+        vad_seconds, vad_words, ratio = measure(model, chunks, True, args.repeat)
+        results.append({
+            "media": path,
+            "duration": round(duration, 2),
+            "speech_ratio": ratio,
+            "plain_rtf": round(plain_seconds / duration, 4),
+            "vad_rtf": round(vad_seconds / duration, 4),
+            "saved": round(1 - vad_seconds / plain_seconds, 4) if plain_seconds else None,
+            "plain_words": plain_words,
+            "vad_words": vad_words,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'media':<32} {'dur':>7} {'speech':>7} {'RTF':>7} {'RTF vad':>8} {'saved':>7} {'words':>11}")
+    for row in results:
+        print(f"{os.path.basename(row['media']):<32} {row['duration']:>7.1f} {row['speech_ratio']:>7.0%} "
+              f"{row['plain_rtf']:>7.3f} {row['vad_rtf']:>8.3f} {row['saved']:>7.0%} "
+              f"{row['plain_words']:>5}/{row['vad_words']:<5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# cues.py
+import os
+from dotenv import load_dotenv
+from render import SUBTITLE_STYLE
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Границы одного субтитра: символов, секунд и пауза между словами, после которой начинается новый
+CUE_MAX_CHARS = int(os.getenv("CUE_MAX_CHARS", "32"))
+CUE_MAX_DURATION = float(os.getenv("CUE_MAX_DURATION", "3.5"))
+CUE_MAX_GAP = float(os.getenv("CUE_MAX_GAP", "0.6"))
+# Цвет уже произнесенных слов в режиме караоке (ASS, &HBBGGRR)
+KARAOKE_HIGHLIGHT_COLOUR = os.getenv("KARAOKE_HIGHLIGHT_COLOUR", "&H00FFFF")
+
+# Входит в ключи кэша: при других настройках группировки субтитры будут другими
+CUE_SETTINGS_KEY = f"{CUE_MAX_CHARS}:{CUE_MAX_DURATION}:{CUE_MAX_GAP}"
+
+# Разрешение сцены ASS по умолчанию у libass: с ним размеры из SUBTITLE_STYLE
+# выглядят так же, как у SRT с force_style
+_PLAY_RES = (384, 288)
+
+
+def group_words(words, max_chars=CUE_MAX_CHARS, max_duration=CUE_MAX_DURATION, max_gap=CUE_MAX_GAP):
+    """
+    Объединяет слова Vosk во фразы. Новый субтитр начинается, если фраза
+    превысит max_chars символов или max_duration секунд, либо если пауза
+    перед словом длиннее max_gap. Слово длиннее лимитов остается отдельным субтитром.
+    """
+    cue = None
+    for word in words:
+        if cue is not None:
+            text_length = len(cue["text"]) + 1 + len(word["word"])
+            if (text_length > max_chars
+                    or word["end"] - cue["start"] > max_duration
+                    or word["start"] - cue["end"] > max_gap):
+                yield cue
+                cue = None
+        if cue is None:
+            cue = {"start": word["start"], "end": word["end"], "text": word["word"], "words": [word]}
+        else:
+            cue["end"] = word["end"]
+            cue["text"] += " " + word["word"]
+            cue["words"].append(word)
+    if cue is not None:
+        yield cue
+
+
+def format_srt_timestamp(seconds):
+    """Convert seconds to SRT timestamp format: hh:mm:ss,ms"""
+    millis = int((seconds - int(seconds)) * 1000)
+    h = int(seconds // 3600)
+    m = int((seconds % 3600) // 60)
+    s = int(seconds % 60)
+    return f"{h:02}:{m:02}:{s:02},{millis:03}"
+
+
+def format_vtt_timestamp(seconds):
+    """Convert seconds to WebVTT timestamp format: hh:mm:ss.ms"""
+    return format_srt_timestamp(seconds).replace(",", ".")
+
+
+def format_ass_timestamp(seconds):
+    """Convert seconds to ASS timestamp format: h:mm:ss.cc"""
+    centis = int(round(seconds * 100))
+    h, centis = divmod(centis, 360000)
+    m, centis = divmod(centis, 6000)
+    s, centis = divmod(centis, 100)
+    return f"{h}:{m:02}:{s:02}.{centis:02}"
+
+
+def iter_srt(cues):
+    """SRT по одному субтитру за раз, без сборки всего файла в памяти"""
+    for idx, cue in enumerate(cues, start=1):
+        yield (f"{idx}\n"
+               f"{format_srt_timestamp(cue['start'])} --> {format_srt_timestamp(cue['end'])}\n"
+               f"{cue['text']}\n\n")
+
+
+def iter_vtt(cues):
+    yield "WEBVTT\n\n"
+    for cue in cues:
+        yield (f"{format_vtt_timestamp(cue['start'])} --> {format_vtt_timestamp(cue['end'])}\n"
+               f"{cue['text']}\n\n")
+
+
+def _ass_style():
+    """Стиль ASS из тех же параметров, что SUBTITLE_STYLE для SRT"""
+    style = dict(item.split("=", 1) for item in SUBTITLE_STYLE.split(","))
+    bold = "-1" if style.get("Bold") == "1" else "0"
+    fields = [
+        "Default", style.get("FontName", "Arial"), style.get("Fontsize", "24"),
+        # PrimaryColour - уже произнесенные слова, SecondaryColour - еще не произнесенные
+        KARAOKE_HIGHLIGHT_COLOUR, style.get("PrimaryColour", "&HFFFFFF"),
+        style.get("OutlineColour", "&H000000"), "&H000000",
+        bold, "0", "0", "0", "100", "100", "0", "0",
+        style.get("BorderStyle", "1"), style.get("Outline", "2"), style.get("Shadow", "1"),
+        style.get("Alignment", "2"), "10", "10", style.get("MarginV", "35"), "1",
+    ]
+    return "Style: " + ",".join(fields)
+
+
+def _escape_ass(text):
+    return text.replace("\\", "\\\\").replace("{", "(").replace("}", ")").replace("\n", " ")
+
+
+def _karaoke_text(cue):
+    """Текст с тегами \\k: каждое слово подсвечивается с начала его произношения"""
+    parts = []
+    # Длительности считаются от накопленных границ, чтобы округление не накапливалось
+    position = 0
+    for index, word in enumerate(cue["words"]):
+        start = int(round((word["start"] - cue["start"]) * 100))
+        if start > position:
+            parts.append(f"{{\\k{start - position}}}")
+            position = start
+        if index + 1 < len(cue["words"]):
+            end = int(round((cue["words"][index + 1]["start"] - cue["start"]) * 100))
+        else:
+            end = int(round((cue["end"] - cue["start"]) * 100))
+        end = max(end, position)
+        separator = " " if index + 1 < len(cue["words"]) else ""
+        parts.append(f"{{\\k{end - position}}}{_escape_ass(word['word'])}{separator}")
+        position = end
+    return "".join(parts)
+
+
+def iter_ass(cues, karaoke=True):
+    """ASS по одному субтитру за раз, при karaoke=True с подсветкой слов тегами \\k"""
+    yield (
+        "[Script Info]\n"
+        "ScriptType: v4.00+\n"
+        f"PlayResX: {_PLAY_RES[0]}\n"
+        f"PlayResY: {_PLAY_RES[1]}\n"
+        "WrapStyle: 0\n\n"
+        "[V4+ Styles]\n"
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+        "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+        f"{_ass_style()}\n\n"
+        "[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
+    for cue in cues:
+        text = _karaoke_text(cue) if karaoke else _escape_ass(cue["text"])
+        yield (f"Dialogue: 0,{format_ass_timestamp(cue['start'])},{format_ass_timestamp(cue['end'])},"
+               f"Default,,0,0,0,,{text}\n")
+
+
+def _write(chunks, cues, output_path):
+    """Пишет субтитры в файл; возвращает False, если субтитров не было"""
+    cues = list(cues)
+    if not cues:
+        return False
+    with open(output_path, 'w', encoding='utf-8') as file:
+        file.writelines(chunks(cues))
+    return True
+
+
+def write_srt_cues(cues, output_srt):
+    return _write(iter_srt, cues, output_srt)
+
+
+def write_vtt_cues(cues, output_vtt):
+    return _write(iter_vtt, cues, output_vtt)
+
+
+def write_ass_cues(cues, output_ass):
+    return _write(iter_ass, cues, output_ass)
+
+
+# Сериализаторы по расширению файла / параметру format
+SERIALIZERS = {
+    "srt": (iter_srt, "application/x-subrip"),
+    "vtt": (iter_vtt, "text/vtt"),
+    "ass": (iter_ass, "text/x-ssa"),
+}
+
+
+def write_subtitles(words, output_path, max_chars=CUE_MAX_CHARS, max_duration=CUE_MAX_DURATION, max_gap=CUE_MAX_GAP):
+    """
+    Группирует слова (список или Transcript) в субтитры и пишет их в формате
+    по расширению output_path: .ass - с караоке-подсветкой, .vtt - WebVTT, иначе SRT.
+    Возвращает False, если слов не было
+    """
+    extension = os.path.splitext(output_path)[1].lstrip(".")
+    chunks = SERIALIZERS.get(extension, SERIALIZERS["srt"])[0]
+    return _write(chunks, group_words(words, max_chars, max_duration, max_gap), output_path)
@@ -1,10 +1,12 @@
 # database.py
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 import logging
+from metrics import track_pool
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -20,30 +22,57 @@ DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB", "videos")
 
+# Параметры пула соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# SQL-логирование (выключено по умолчанию)
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+# Схема создается и обновляется миграциями Alembic отдельным шагом (alembic upgrade head).
+# DB_MIGRATE_ON_STARTUP=1 - применять их при запуске приложения (разработка, один процесс).
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "0") == "1"
+ALEMBIC_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
 # Формируем URL для подключения к базе данных
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 logger.info(f"Connecting to database at: {DB_HOST}:{DB_PORT}/{DB_NAME}")
 
-# Создаем движок
-engine = create_engine(
-    DATABASE_URL,
-    echo=True  # Включаем SQL-логирование
+pool_options = dict(
+    echo=DB_ECHO,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
 )
 
-# Создаем фабрику сессий
+# Синхронный движок: миграции схемы и воркеры рендера
+engine = create_engine(DATABASE_URL, **pool_options)
+
+# Асинхронный движок для обработчиков запросов, не блокирует event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options)
+
+# Занятые и открытые соединения обоих пулов видны в /metrics
+track_pool(engine, "sync")
+track_pool(async_engine.sync_engine, "async")
+
+# Создаем фабрики сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 # Создаем базовый класс для моделей
 Base = declarative_base()
 
-# Dependency для получения сессии базы данных
-def get_db():
-    db = SessionLocal()
-    try:
+# Dependency для получения асинхронной сессии базы данных
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Функция для сброса и пересоздания всех таблиц
 # ВНИМАНИЕ: Эта функция удаляет все данные!
@@ -54,17 +83,43 @@ def reset_database():
     Base.metadata.create_all(bind=engine)
     logger.info("Database schema has been reset and recreated.")
 
-# Функция для проверки существования таблицы
-def table_exists(table_name):
-    inspector = inspect(engine)
-    return table_name in inspector.get_table_names()
+def _alembic_config(configure_logger=True):
+    from alembic.config import Config
+    config = Config(ALEMBIC_CONFIG)
+    config.attributes["configure_logger"] = configure_logger
+    return config
 
-# Функция для безопасного обновления схемы
-def update_schema():
+def run_migrations():
     """
-    Обновляет схему базы данных без потери данных.
-    Создает только отсутствующие таблицы.
+    Доводит схему до последней миграции, как alembic upgrade head. Обычно миграции -
+    отдельный шаг перед запуском; из приложения - только при DB_MIGRATE_ON_STARTUP=1.
     """
-    logger.info("Updating database schema...")
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database schema update completed.")
+    from alembic import command
+    logger.info("Applying database migrations...")
+    command.upgrade(_alembic_config(configure_logger=False), "head")
+
+def schema_head():
+    """Последняя ревизия в migrations/: до нее должна быть обновлена база"""
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+def backfill_videos_count(connection=None):
+    """Пересчитывает users.videos_count по таблице videos"""
+    statement = text(
+        "UPDATE users SET videos_count = "
+        "(SELECT COUNT(*) FROM videos WHERE videos.user_id = users.id)"
+    )
+    if connection is not None:
+        connection.execute(statement)
+        return
+    with engine.begin() as connection:
+        connection.execute(statement)
+    logger.info("users.videos_count backfilled.")
+
+if __name__ == "__main__":
+    # python database.py backfill-videos-count - пересчитать счетчики вручную
+    import sys
+    if sys.argv[1:] == ["backfill-videos-count"]:
+        backfill_videos_count()
+    else:
+        print("Usage: python database.py backfill-videos-count")
@@ -0,0 +1,167 @@
+# ffmpeg_runner.py
+import os
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+from dotenv import load_dotenv
+from metrics import FFMPEG_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Предел реального времени и процессорного времени одного запуска ffmpeg (0 - без предела)
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "3600"))
+FFMPEG_CPU_TIMEOUT_SECONDS = int(os.getenv("FFMPEG_CPU_TIMEOUT_SECONDS", "0"))
+# Как часто проверяется отмена задачи
+CANCEL_POLL_SECONDS = 1.0
+STDERR_TAIL_LINES = 50
+
+
+class FFmpegCancelled(Exception):
+    pass
+
+
+class FFmpegTimeout(Exception):
+    pass
+
+
+def _cpu_limit(seconds):
+    if not seconds:
+        return None
+
+    def apply():
+        import resource
+        # По мягкому пределу ядро шлет SIGXCPU, по жесткому - SIGKILL
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 5))
+    return apply
+
+
+def _read_stderr(stream, tail):
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode(errors="replace")
+        tail.append(line.rstrip())
+
+
+class FFmpegSupervisor:
+    """
+    Присмотр за запущенным процессом ffmpeg. stderr читается отдельным потоком,
+    чтобы поток ошибок не заполнил канал и не остановил ffmpeg; сторож убивает
+    процесс по timeout, poll_cancel() - по should_cancel(). После выхода из with
+    check() выбрасывает FFmpegCancelled, FFmpegTimeout или CalledProcessError
+    с хвостом stderr.
+    """
+
+    def __init__(self, process, should_cancel=None, timeout=FFMPEG_TIMEOUT_SECONDS):
+        self.process = process
+        self.should_cancel = should_cancel
+        FFMPEG_PROCESSES.inc()
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self._reason = {}
+        self._stderr_reader = threading.Thread(
+            target=_read_stderr, args=(process.stderr, self.stderr_tail), daemon=True
+        )
+        self._stderr_reader.start()
+        # Сторож убивает зависший процесс, даже если ffmpeg перестал писать в stdout
+        self._watchdog = threading.Timer(timeout, self.kill, args=("timeout",)) if timeout else None
+        if self._watchdog:
+            self._watchdog.daemon = True
+            self._watchdog.start()
+        self.started = time.monotonic()
+        self._last_cancel_check = self.started
+
+    def kill(self, why):
+        if self.process.poll() is None:
+            self._reason.setdefault("why", why)
+            self.process.kill()
+
+    def poll_cancel(self):
+        """Спрашивает should_cancel() не чаще раза в CANCEL_POLL_SECONDS"""
+        now = time.monotonic()
+        if self.should_cancel and now - self._last_cancel_check >= CANCEL_POLL_SECONDS:
+            self._last_cancel_check = now
+            if self.should_cancel():
+                self.kill("cancelled")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._watchdog:
+            self._watchdog.cancel()
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        FFMPEG_PROCESSES.dec()
+        self._stderr_reader.join(timeout=1)
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+    def check(self, command):
+        """Проверяет, чем закончился процесс, и возвращает время его работы"""
+        elapsed = time.monotonic() - self.started
+        if self._reason.get("why") == "cancelled":
+            raise FFmpegCancelled("ffmpeg cancelled")
+        if self._reason.get("why") == "timeout":
+            raise FFmpegTimeout(f"ffmpeg timed out after {elapsed:.0f}s")
+        if self.process.returncode != 0:
+            raise subprocess.CalledProcessError(self.process.returncode, command, stderr="\n".join(self.stderr_tail))
+        return elapsed
+
+
+def run_ffmpeg(command, duration=None, on_progress=None, should_cancel=None,
+               timeout=FFMPEG_TIMEOUT_SECONDS, cpu_timeout=FFMPEG_CPU_TIMEOUT_SECONDS):
+    """
+    Запускает ffmpeg с -progress pipe:1 и разбирает прогресс по мере кодирования.
+    on_progress(dict) получает percent (если известна duration), fps, speed и
+    out_seconds. should_cancel() опрашивается раз в секунду; при True процесс
+    убивается и выбрасывается FFmpegCancelled. При превышении timeout -
+    FFmpegTimeout, при ненулевом коде возврата - CalledProcessError с хвостом stderr.
+    """
+    command = [command[0], "-progress", "pipe:1", "-nostats", *command[1:]]
+    process = subprocess.Popen(
+        command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, preexec_fn=_cpu_limit(cpu_timeout)
+    )
+    with FFmpegSupervisor(process, should_cancel, timeout) as supervisor:
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key != "progress":
+                block[key] = value
+                continue
+            if on_progress:
+                on_progress(_progress_snapshot(block, duration, finished=value == "end"))
+            block = {}
+            supervisor.poll_cancel()
+        process.wait()
+
+    elapsed = supervisor.check(command)
+    logger.info(f"ffmpeg finished in {elapsed:.2f}s")
+    return elapsed
+
+
+def _progress_snapshot(block, duration, finished=False):
+    snapshot = {}
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms")
+    if out_time_us and out_time_us.lstrip("-").isdigit():
+        # out_time_ms в ffmpeg исторически тоже в микросекундах
+        snapshot["out_seconds"] = max(int(out_time_us), 0) / 1_000_000
+    try:
+        snapshot["fps"] = float(block.get("fps", ""))
+    except ValueError:
+        pass
+    speed = block.get("speed", "").rstrip("x")
+    try:
+        snapshot["speed"] = float(speed)
+    except ValueError:
+        pass
+    if finished:
+        snapshot["percent"] = 100.0
+    elif duration and "out_seconds" in snapshot:
+        snapshot["percent"] = round(min(snapshot["out_seconds"] / duration * 100, 99.9), 1)
+    return snapshot
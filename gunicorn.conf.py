@@ -0,0 +1,58 @@
+# gunicorn.conf.py
+# Продакшен-запуск API в нескольких процессах: gunicorn -c gunicorn.conf.py main:app
+# Приложение импортируется в мастер-процессе до fork (preload_app), модели из
+# VOSK_PRELOAD_MODELS загружаются там же один раз, а HTTP-воркеры получают их через
+# fork и делят страницы памяти (copy-on-write), поэтому память не растет с числом воркеров.
+# Схему база получает заранее (alembic upgrade head), воркеры ее не трогают.
+# При JOB_BACKEND=redis HTTP-процессы только ставят задачи, а рендер выполняют
+# процессы worker.py (PIPELINE_PROCESSES), так что тяжелая работа не мешает запросам.
+import os
+import glob
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "1"))
+JOB_BACKEND = os.getenv("JOB_BACKEND", "local")
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "300"))
+
+if HTTP_WORKERS > 1 and JOB_BACKEND != "redis":
+    # Очередь и состояние задач в памяти процесса не видны остальным воркерам
+    raise RuntimeError("HTTP_WORKERS > 1 requires JOB_BACKEND=redis")
+
+if JOB_BACKEND == "redis":
+    # Рендер выполняют процессы worker.py; JOB_WORKERS можно задать явно
+    os.environ.setdefault("JOB_WORKERS", "0")
+
+# Все процессы пишут метрики в общий каталог. Он очищается один раз при запуске
+# мастера (конфиг перечитывается и по SIGHUP, тогда файлы живых воркеров не трогаем).
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/captioncraft-metrics")
+if not os.environ.get("CAPTIONCRAFT_METRICS_DIR_READY"):
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(path)
+    os.environ["CAPTIONCRAFT_METRICS_DIR_READY"] = "1"
+
+bind = os.getenv("HTTP_BIND", "0.0.0.0:8000")
+workers = HTTP_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Долгие загрузки и long-poll ожидания не должны считаться зависанием воркера
+timeout = int(os.getenv("HTTP_TIMEOUT_SECONDS", "120"))
+# При остановке воркер доделывает запросы и начатые рендеры (JOB_DRAIN_SECONDS)
+graceful_timeout = int(JOB_DRAIN_SECONDS) + 30
+keepalive = 5
+
+
+def when_ready(server):
+    # Вызывается в мастере до запуска воркеров
+    from model_registry import registry, PRELOAD_MODELS
+    if PRELOAD_MODELS:
+        server.log.info(f"Preloading Vosk models before fork: {', '.join(PRELOAD_MODELS)}")
+        registry.preload(PRELOAD_MODELS)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
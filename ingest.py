@@ -0,0 +1,394 @@
+# ingest.py
+import os
+import time
+import asyncio
+import zlib
+import hashlib
+import zipfile
+import subprocess
+import aiofiles
+from fastapi import Request, HTTPException, status
+from multipart.multipart import MultipartParser, parse_options_header
+from multipart.exceptions import MultipartParseError
+from dotenv import load_dotenv
+from render import probe_duration
+from metrics import observe_stage
+from workspace import scratch
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Лимиты загрузки для бесплатного и премиум тарифа
+MAX_UPLOAD_MB_FREE = int(os.getenv("MAX_UPLOAD_MB_FREE", "200"))
+MAX_UPLOAD_MB_PREMIUM = int(os.getenv("MAX_UPLOAD_MB_PREMIUM", "2048"))
+MAX_DURATION_SECONDS_FREE = float(os.getenv("MAX_DURATION_SECONDS_FREE", "600"))
+MAX_DURATION_SECONDS_PREMIUM = float(os.getenv("MAX_DURATION_SECONDS_PREMIUM", str(3 * 3600)))
+# Сколько видео можно передать в одном пакете (/generate/batch)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+# Текстовые поля формы и заголовки частей держатся в памяти, поэтому их размер ограничен
+MAX_FIELD_BYTES = 64 * 1024
+MAX_PART_HEADER_BYTES = 8 * 1024
+
+_DEFAULT_SUFFIXES = {"video": ".mp4", "audio": ".wav"}
+
+
+def upload_limits(user):
+    """Лимиты (байты, секунды) для тарифа пользователя"""
+    if user.free_tier:
+        return MAX_UPLOAD_MB_FREE * 1024 * 1024, MAX_DURATION_SECONDS_FREE
+    return MAX_UPLOAD_MB_PREMIUM * 1024 * 1024, MAX_DURATION_SECONDS_PREMIUM
+
+
+def _too_large(max_bytes):
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Файл слишком большой. Максимальный размер для вашего тарифа: {max_bytes // (1024 * 1024)} МБ"
+    )
+
+
+class _Part:
+    def __init__(self):
+        self.headers = {}
+        self.field_name = None
+        self.filename = None
+        self.path = None
+        self.file = None
+        self.size = 0
+        self.hasher = None
+        self.data = bytearray()
+
+
+class UploadIngestor:
+    """
+    Разбирает multipart-тело запроса по мере поступления и пишет файлы
+    сразу в рабочий каталог задачи через aiofiles. Одновременно считается
+    sha256 каждого файла и проверяется лимит размера, поэтому слишком
+    большая загрузка отклоняется, не дожидаясь конца тела запроса.
+    Поля из multiple могут повторяться: их файлы получают ключи field.0, field.1, ...
+    """
+
+    def __init__(self, request: Request, directory, prefix, max_bytes, file_fields=("video", "audio"), multiple=()):
+        self.request = request
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.file_fields = file_fields
+        self.multiple = multiple
+        self.files = {}
+        self.fields = {}
+        self.total_bytes = 0
+        self._part = None
+        self._header_field = b""
+        self._header_value = b""
+        self._events = []
+
+    # Колбэки парсера синхронные, поэтому они только копят события,
+    # а запись на диск выполняется асинхронно после каждого куска тела
+    def _on_part_begin(self):
+        self._part = _Part()
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+        self._check_header_size()
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+        self._check_header_size()
+
+    def _check_header_size(self):
+        if len(self._header_field) + len(self._header_value) > MAX_PART_HEADER_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Слишком длинный заголовок в multipart-теле запроса"
+            )
+
+    def _on_header_end(self):
+        self._part.headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._part.headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректное multipart-тело запроса")
+        self._part.field_name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            key = self._part.field_name
+            if key in self.multiple:
+                key = f"{key}.{sum(1 for name in self.files if name.startswith(key + '.'))}"
+            if self._part.field_name not in self.file_fields or key in self.files:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Неожиданный файл в поле '{self._part.field_name}'"
+                )
+            self._part.filename = options[b"filename"].decode("utf-8", "replace")
+            suffix = os.path.splitext(self._part.filename)[1] or _DEFAULT_SUFFIXES.get(self._part.field_name, "")
+            self._part.path = os.path.join(self.directory, f"{self.prefix}.{key}{suffix}")
+            self._part.hasher = hashlib.sha256()
+            self.files[key] = self._part
+            self._events.append(("open", self._part, None))
+
+    def _on_part_data(self, data, start, end):
+        if self._part.path is None:
+            # Поля формы тоже входят в лимит тела запроса
+            self.total_bytes += end - start
+            if self.total_bytes > self.max_bytes:
+                raise _too_large(self.max_bytes)
+            if len(self._part.data) + end - start > MAX_FIELD_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Поле '{self._part.field_name}' слишком большое"
+                )
+            self._part.data += data[start:end]
+        else:
+            self._events.append(("data", self._part, data[start:end]))
+
+    def _on_part_end(self):
+        if self._part.path is None:
+            self.fields[self._part.field_name] = self._part.data.decode("utf-8", "replace")
+        else:
+            self._events.append(("close", self._part, None))
+
+    async def _flush_events(self):
+        for event, part, data in self._events:
+            if event == "open":
+                part.file = await aiofiles.open(part.path, "wb")
+            elif event == "data":
+                part.size += len(data)
+                self.total_bytes += len(data)
+                if self.total_bytes > self.max_bytes:
+                    raise _too_large(self.max_bytes)
+                part.hasher.update(data)
+                await part.file.write(data)
+            else:
+                await part.file.close()
+                part.file = None
+        self._events.clear()
+
+    async def ingest(self):
+        content_type = self.request.headers.get("content-type", "")
+        media_type, params = parse_options_header(content_type)
+        if media_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ожидается multipart/form-data")
+
+        # Если размер известен заранее, отклоняем запрос до чтения тела
+        content_length = self.request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes + 64 * 1024:
+            raise _too_large(self.max_bytes)
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+        try:
+            try:
+                async for chunk in self.request.stream():
+                    parser.write(chunk)
+                    await self._flush_events()
+                parser.finalize()
+            except MultipartParseError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректное multipart-тело запроса")
+            await self._flush_events()
+        except BaseException:
+            await self.discard()
+            raise
+        return self
+
+    async def discard(self):
+        """Закрывает и удаляет все уже записанные файлы"""
+        for part in self.files.values():
+            if part.file is not None:
+                await part.file.close()
+                part.file = None
+            if part.path and os.path.exists(part.path):
+                os.remove(part.path)
+
+    def result(self, field):
+        part = self.files.get(field)
+        if part is None:
+            return None
+        return {
+            "path": part.path,
+            "filename": part.filename,
+            "content_type": part.headers.get(b"content-type", b"").decode("latin-1") or None,
+            "size": part.size,
+            "sha256": part.hasher.hexdigest(),
+        }
+
+
+async def _check_media(upload, field, max_duration):
+    """Проверяет длительность загруженного файла по заголовкам контейнера, без декодирования"""
+    try:
+        duration = await asyncio.to_thread(probe_duration, upload["path"])
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        duration = None
+    if duration is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не удалось прочитать медиафайл '{field}'"
+        )
+    if duration > max_duration:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Файл слишком длинный. Максимальная длительность для вашего тарифа: {int(max_duration)} с"
+        )
+    return duration
+
+
+async def ingest_upload(request: Request, user, directory, prefix, required=("video",), optional=()):
+    """
+    Принимает загрузку пользователя в directory с учетом лимитов его тарифа.
+    Возвращает словарь поле -> сведения о файле (path, filename, size, sha256).
+    """
+    max_bytes, max_duration = upload_limits(user)
+    ingestor = UploadIngestor(request, directory, prefix, max_bytes, file_fields=tuple(required) + tuple(optional))
+    started = time.perf_counter()
+    await ingestor.ingest()
+    observe_stage("upload", time.perf_counter() - started)
+
+    try:
+        uploads = {}
+        for field in tuple(required) + tuple(optional):
+            upload = ingestor.result(field)
+            if upload is None:
+                if field in required:
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail=f"Не передан файл '{field}'"
+                    )
+                continue
+            upload["duration"] = await _check_media(upload, field, max_duration)
+            uploads[field] = upload
+        return uploads
+    except BaseException:
+        await ingestor.discard()
+        raise
+
+
+def extract_archive(archive_path, directory, prefix, max_file_bytes, max_items, max_total_bytes=None):
+    """
+    Распаковывает файлы из ZIP-архива пакета под собственными именами (пути из
+    архива не используются). Размер считается по распакованным байтам, а не по
+    заголовкам архива. Файлы, которые не удалось распаковать или которые больше
+    max_file_bytes, возвращаются с полем error; после max_items распаковка прекращается.
+    Если всего распаковано больше max_total_bytes, распакованное удаляется и - 413.
+    """
+    try:
+        archive = zipfile.ZipFile(archive_path)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Архив поврежден или не является ZIP")
+    uploads = []
+    total_bytes = 0
+    over_budget = False
+    with archive:
+        for info in archive.infolist():
+            filename = os.path.basename(info.filename)
+            # Каталоги, служебные файлы macOS и скрытые файлы - не видео
+            if info.is_dir() or not filename or filename.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(uploads) >= max_items:
+                break
+            suffix = os.path.splitext(filename)[1] or _DEFAULT_SUFFIXES["video"]
+            upload = {
+                "path": os.path.join(directory, f"{prefix}.archive.{len(uploads)}{suffix}"),
+                "filename": filename,
+                "content_type": None,
+                "size": 0,
+            }
+            hasher = hashlib.sha256()
+            try:
+                with archive.open(info) as source, open(upload["path"], "wb") as target:
+                    while True:
+                        data = source.read(ARCHIVE_CHUNK_SIZE)
+                        if not data:
+                            break
+                        upload["size"] += len(data)
+                        total_bytes += len(data)
+                        if max_total_bytes is not None and total_bytes > max_total_bytes:
+                            over_budget = True
+                            break
+                        if upload["size"] > max_file_bytes:
+                            upload["error"] = _too_large(max_file_bytes).detail
+                            break
+                        hasher.update(data)
+                        target.write(data)
+            except (zipfile.BadZipFile, zlib.error, EOFError, OSError, RuntimeError, NotImplementedError) as e:
+                # Поврежденный, обрезанный или зашифрованный файл в архиве
+                upload["error"] = f"Не удалось распаковать файл: {e}"
+            if over_budget:
+                for path in [upload["path"]] + [item["path"] for item in uploads]:
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Архив распаковывается больше чем в {max_total_bytes // (1024 * 1024)} МБ"
+                )
+            if "error" in upload:
+                # Зашифрованный файл или неизвестный метод сжатия - ошибка еще до создания файла
+                if os.path.exists(upload["path"]):
+                    os.remove(upload["path"])
+                upload["path"] = None
+            else:
+                upload["sha256"] = hasher.hexdigest()
+            uploads.append(upload)
+    return uploads
+
+
+async def ingest_batch(request: Request, user, directory, prefix, max_items=BATCH_MAX_ITEMS):
+    """
+    Принимает пакет: файлы в повторяющемся поле video и/или ZIP-архив в поле archive.
+    Возвращает список файлов в порядке загрузки. Лимиты тарифа действуют на каждый
+    файл; файл, который их превышает или не читается как медиа, возвращается с полем
+    error (и удаляется), а не отклоняет весь пакет.
+    """
+    max_bytes, max_duration = upload_limits(user)
+    ingestor = UploadIngestor(request, directory, prefix, max_bytes * max_items,
+                              file_fields=("video", "archive"), multiple=("video",))
+    started = time.perf_counter()
+    await ingestor.ingest()
+    observe_stage("upload", time.perf_counter() - started)
+
+    try:
+        uploads = [ingestor.result(key) for key in ingestor.files if key != "archive"]
+        archive = ingestor.result("archive")
+        if archive is not None:
+            # Распакованное входит в тот же лимит тела запроса, что и файлы из формы,
+            # и не может превысить бюджет рабочих файлов узла
+            max_total_bytes = max_bytes * max_items - sum(upload["size"] for upload in uploads)
+            if scratch.budget_bytes:
+                max_total_bytes = min(max_total_bytes, scratch.budget_bytes)
+            uploads += await asyncio.to_thread(
+                extract_archive, archive["path"], directory, prefix, max_bytes, max(max_items - len(uploads), 0),
+                max_total_bytes
+            )
+            os.remove(archive["path"])
+        if not uploads:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Не переданы файлы 'video' или архив 'archive'"
+            )
+        for index, upload in enumerate(uploads):
+            try:
+                if "error" in upload:
+                    continue
+                if index >= max_items:
+                    upload["error"] = f"Превышено число видео в пакете: не более {max_items}"
+                elif upload["size"] > max_bytes:
+                    upload["error"] = _too_large(max_bytes).detail
+                else:
+                    upload["duration"] = await _check_media(upload, upload["filename"], max_duration)
+            except HTTPException as e:
+                upload["error"] = e.detail
+            if "error" in upload and upload["path"]:
+                os.remove(upload["path"])
+                upload["path"] = None
+        return uploads
+    except BaseException:
+        await ingestor.discard()
+        raise
@@ -0,0 +1,725 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from queue import PriorityQueue, Empty
+from dotenv import load_dotenv
+from database import SessionLocal
+from sqlalchemy import select
+from models import Video, UserStatistics
+from subs import create_shorts_video, extract_audio_from_video, transcribe_audio, STREAMING_TRANSCRIPTION
+from transcript import Transcript
+from ffmpeg_runner import FFmpegCancelled
+from render import RENDER_PROFILE
+from model_registry import get_model
+from result_cache import result_cache, transcript_key, render_key
+from user_cache import user_cache
+from admission import admission, PRIORITY_FREE, PRIORITY_PREMIUM
+from workspace import create_workspace, workspace_path, remove_workspace, cleanup_orphans
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# local - пул потоков внутри процесса, redis - общая очередь для нескольких процессов и узлов
+JOB_BACKEND = os.getenv("JOB_BACKEND", "local")
+# Количество воркеров в этом процессе (для redis можно 0, тогда API только ставит задачи)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Каталог готовых видео и сколько они хранятся после рендера
+RESULTS_DIR = os.getenv("RESULTS_DIR", "uploads/results")
+RESULT_TTL_SECONDS = int(os.getenv("RESULT_TTL_SECONDS", "3600"))
+# Сколько хранится состояние задачи
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+# Максимальное время long-poll ожидания статуса
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+JOB_POLL_INTERVAL = 0.5
+# Как часто прогресс рендера записывается в состояние задачи
+PROGRESS_INTERVAL = 1.0
+# Сколько при остановке ждать задачи, которые воркеры уже начали; не успевшие отменяются
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "300"))
+# Сколько ждать воркеры после отмены (ffmpeg убивается в течение секунды)
+CANCEL_GRACE_SECONDS = 5
+
+QUEUE_KEY = "captioncraft:jobs"
+PREMIUM_QUEUE_KEY = "captioncraft:jobs:premium"
+JOB_KEY_PREFIX = "captioncraft:job:"
+CANCEL_KEY_PREFIX = "captioncraft:job_cancel:"
+
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+class MemoryJobStore:
+    """Состояние задач в памяти процесса"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def set(self, job_id, state):
+        with self._lock:
+            self._jobs[job_id] = dict(state, updated_at=time.time())
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            state = self._jobs.get(job_id, {})
+            state.update(fields, updated_at=time.time())
+            self._jobs[job_id] = state
+
+    def get(self, job_id):
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None:
+                return None
+            if time.time() - state["updated_at"] > JOB_TTL_SECONDS:
+                del self._jobs[job_id]
+                return None
+            return dict(state)
+
+    def request_cancel(self, job_id):
+        self.update(job_id, cancel_requested=True)
+
+    def cancel_requested(self, job_id):
+        return bool((self.get(job_id) or {}).get("cancel_requested"))
+
+
+class RedisJobStore:
+    """Состояние задач в Redis, доступное всем процессам и узлам"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def set(self, job_id, state):
+        state = dict(state, updated_at=time.time())
+        self.client.set(JOB_KEY_PREFIX + job_id, json.dumps(state), ex=JOB_TTL_SECONDS)
+
+    def update(self, job_id, **fields):
+        state = self.get(job_id) or {}
+        state.update(fields)
+        self.set(job_id, state)
+
+    def get(self, job_id):
+        raw = self.client.get(JOB_KEY_PREFIX + job_id)
+        return json.loads(raw) if raw else None
+
+    # Флаг отмены хранится отдельным ключом, чтобы его не затерли обновления прогресса
+    def request_cancel(self, job_id):
+        self.client.set(CANCEL_KEY_PREFIX + job_id, 1, ex=JOB_TTL_SECONDS)
+
+    def cancel_requested(self, job_id):
+        return bool(self.client.exists(CANCEL_KEY_PREFIX + job_id))
+
+
+class LocalJobQueue:
+    """
+    Очередь с приоритетами на пуле потоков: ffmpeg и Vosk отпускают GIL,
+    модели общие для всех потоков. Задачи премиум-тарифа забираются первыми,
+    внутри одного приоритета - в порядке поступления.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._pending = PriorityQueue()
+        self._order = itertools.count()
+        self._stop = threading.Event()
+        self._threads = []
+        self._active = {}
+        # У каждого процесса своя очередь, в /metrics значения процессов суммируются
+        self._depth_gauge = metrics.gauge("captioncraft_job_queue_depth", "Jobs waiting in the queue")
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(max(self.workers, 1)):
+            thread = threading.Thread(target=self._consume, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job):
+        self.start()
+        self._pending.put((job.get("priority", PRIORITY_FREE), next(self._order), job))
+        self._depth_gauge.inc()
+
+    def _consume(self):
+        while not self._stop.is_set():
+            try:
+                _, _, job = self._pending.get(timeout=1)
+            except Empty:
+                continue
+            self._depth_gauge.dec()
+            _run_tracked(job, self._active)
+
+    def depth(self):
+        return self._pending.qsize()
+
+    def stop(self, drain_timeout=JOB_DRAIN_SECONDS):
+        self._stop.set()
+        _drain(self._threads, self._active, drain_timeout)
+        self._threads = []
+        # Очередь в памяти процесса после остановки никто не разберет
+        while True:
+            try:
+                _, _, job = self._pending.get_nowait()
+            except Empty:
+                break
+            self._depth_gauge.dec()
+            _abandon(job)
+
+
+class RedisJobQueue:
+    """Очередь в Redis: задачи забирают воркеры любого процесса (см. worker.py)"""
+
+    def __init__(self, client, workers):
+        self.client = client
+        self.workers = workers
+        self._stop = threading.Event()
+        self._threads = []
+        self._active = {}
+        # Очередь общая для всех процессов, поэтому ее длина читается при запросе /metrics
+        metrics.live_gauge("captioncraft_job_queue_depth", "Jobs waiting in the queue", self.depth)
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._consume, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job):
+        key = PREMIUM_QUEUE_KEY if job.get("priority") == PRIORITY_PREMIUM else QUEUE_KEY
+        self.client.rpush(key, json.dumps(job))
+
+    def _consume(self):
+        while not self._stop.is_set():
+            try:
+                # BLPOP проверяет ключи по порядку, поэтому премиум-очередь разбирается первой
+                item = self.client.blpop([PREMIUM_QUEUE_KEY, QUEUE_KEY], timeout=1)
+            except Exception as e:
+                logger.error(f"Job queue read failed: {e}")
+                time.sleep(1)
+                continue
+            if item:
+                _run_tracked(json.loads(item[1]), self._active)
+
+    def depth(self):
+        return self.client.llen(PREMIUM_QUEUE_KEY) + self.client.llen(QUEUE_KEY)
+
+    def stop(self, drain_timeout=JOB_DRAIN_SECONDS):
+        # Задачи, оставшиеся в Redis, заберут другие воркеры или этот после перезапуска
+        self._stop.set()
+        _drain(self._threads, self._active, drain_timeout)
+        self._threads = []
+
+
+def _run_tracked(job, active):
+    active[job["id"]] = job
+    try:
+        if "items" in job:
+            run_batch(job)
+        else:
+            run_job(job)
+    finally:
+        active.pop(job["id"], None)
+
+
+def _drain(threads, active, timeout):
+    """
+    Ждет, пока воркеры доделают уже начатые задачи (новые они не берут после stop).
+    Задачи, не завершившиеся за timeout секунд, отменяются, а те, что не успели
+    остановиться (распознавание не прерывается), помечаются failed, чтобы не
+    остаться навсегда в статусе processing.
+    """
+    if active:
+        logger.info(f"Waiting up to {timeout:.0f}s for {len(active)} running jobs")
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(timeout=max(deadline - time.monotonic(), 0))
+    unfinished = list(active)
+    if not unfinished:
+        return
+    logger.warning(f"Cancelling {len(unfinished)} jobs still running after shutdown drain: {', '.join(unfinished)}")
+    for job_id in unfinished:
+        store.request_cancel(job_id)
+    for thread in threads:
+        thread.join(timeout=CANCEL_GRACE_SECONDS)
+    for job in list(active.values()):
+        _abandon(job)
+
+
+def _abandon(job):
+    """Помечает failed задачу, которую этот процесс уже не выполнит"""
+    logger.error(f"Job {job['id']} interrupted by shutdown")
+    error = "Задача прервана остановкой сервера"
+    store.update(job["id"], status="failed", error=error)
+    # run_job для нее уже не освободит место в admission и не удалит рабочие файлы
+    admission.release(job["user_id"])
+    remove_workspace(job["id"])
+    if job.get("video_id") is not None:
+        _set_video_status(job["video_id"], "failed")
+    # У пакета - еще и все его видео, которые не успели обработаться
+    for item in job.get("items", ()):
+        if (store.get(item["id"]) or {}).get("status") == "processing":
+            store.update(item["id"], status="failed", error=error)
+            _set_video_status(item["video_id"], "failed")
+
+
+def _create_backend():
+    if JOB_BACKEND == "redis":
+        import redis
+        client = redis.Redis.from_url(REDIS_URL)
+        return RedisJobStore(client), RedisJobQueue(client, JOB_WORKERS)
+    return MemoryJobStore(), LocalJobQueue(JOB_WORKERS)
+
+
+store, queue = _create_backend()
+
+
+# Воркеры работают в потоках и отдельных процессах без event loop,
+# поэтому пишут в базу через синхронную сессию
+def _set_video_status(video_id, video_status):
+    with SessionLocal() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video:
+            video.status = video_status
+            db.commit()
+
+
+def _complete_video(video_id, user_id):
+    """Помечает видео готовым и обновляет статистику пользователя в одной транзакции"""
+    with SessionLocal() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video:
+            video.status = "completed"
+        stats = db.query(UserStatistics).filter(UserStatistics.user_id == user_id).first()
+        if stats:
+            stats.videos_processed += 1
+        db.commit()
+
+
+def _load_cached_transcript(key):
+    path = result_cache.get(key, ".json")
+    if path is None:
+        return None
+    try:
+        return Transcript.load(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring unreadable cached transcript {path}: {e}")
+        return None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@contextmanager
+def _stage(stages, name):
+    """Засекает длительность этапа задачи (extract, transcribe, render)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stages[name] = round(elapsed, 3)
+        metrics.observe_stage(name, elapsed)
+
+
+def _progress_reporter(job_id):
+    """Пишет прогресс рендера в состояние задачи не чаще раза в PROGRESS_INTERVAL секунд"""
+    last_update = [0.0]
+
+    def report(progress):
+        now = time.monotonic()
+        if now - last_update[0] >= PROGRESS_INTERVAL or progress.get("percent") == 100.0:
+            last_update[0] = now
+            store.update(job_id, progress=progress)
+    return report
+
+
+def run_job(job):
+    """Выполняет задачу, затем освобождает ее место в admission и рабочие файлы"""
+    try:
+        _execute_job(job)
+    finally:
+        admission.release(job["user_id"])
+        # Входные файлы, WAV и субтитры лежат в каталоге задачи
+        remove_workspace(job["id"])
+
+
+def run_batch(batch):
+    """
+    Выполняет видео пакета подряд в одном воркере. У каждого видео своя задача
+    и свой статус: ошибка одного не прерывает остальные. Место в admission
+    и каталог с рабочими файлами у пакета общие.
+    """
+    batch_id = batch["id"]
+    logger.info(f"Batch {batch_id} started: {len(batch['items'])} videos")
+    try:
+        # Ссылка держит модель загруженной весь пакет, даже если реестр вытеснит ее ради других
+        pinned_model = None
+        try:
+            pinned_model = get_model(batch["vosk"])
+        except Exception as e:
+            # Каждое видео пакета завершится с этой ошибкой по отдельности
+            logger.error(f"Batch {batch_id}: model {batch['vosk']} is unavailable: {e}")
+        for job in batch["items"]:
+            _execute_job(job)
+            # Входные файлы и субтитры готового видео больше не нужны, место освобождается сразу
+            for path in (job["video_path"], job["srt"], os.path.join(workspace_path(batch_id), job["id"] + ".wav")):
+                if os.path.exists(path):
+                    os.remove(path)
+        # Пакет обработан, реестр снова может вытеснить модель
+        del pinned_model
+        batch_status = "cancelled" if store.cancel_requested(batch_id) else "completed"
+        store.update(batch_id, status=batch_status)
+        logger.info(f"Batch {batch_id} {batch_status}")
+    finally:
+        admission.release(batch["user_id"])
+        remove_workspace(batch_id)
+
+
+def _execute_job(job):
+    """
+    Выполняет задачу и записывает результат в хранилище и в Video.status.
+    Задачи с render=False только распознают речь и сохраняют транскрипт.
+    Длительность этапов сохраняется в поле stages, прогресс рендера - в progress.
+    Видео пакета отменяются и вместе с пакетом (batch_id).
+    """
+    job_id = job["id"]
+    logger.info(f"Job {job_id} started")
+    audio_path = job.get("audio_path")
+    render = job.get("render", True)
+    stages = {}
+
+    def should_cancel():
+        return store.cancel_requested(job_id) or bool(job.get("batch_id") and store.cancel_requested(job["batch_id"]))
+
+    try:
+        if should_cancel():
+            raise JobCancelled()
+        # Если транскрипт этого содержимого уже есть в кэше, Vosk не запускается
+        transcript = _load_cached_transcript(job.get("transcript_key"))
+        cached_transcript = transcript is not None
+        # В потоковом режиме аудио читается прямо из видео, отдельный WAV не нужен
+        if audio_path is None and not STREAMING_TRANSCRIPTION and not cached_transcript:
+            audio_path = os.path.join(create_workspace(job.get("batch_id") or job_id), job_id + ".wav")
+            with _stage(stages, "extract"):
+                extract_audio_from_video(job["video_path"], audio_path, should_cancel=should_cancel)
+        if transcript is None:
+            with _stage(stages, "transcribe"):
+                transcript = transcribe_audio(audio_path or job["video_path"], job["vosk"], job_id,
+                                              should_cancel=should_cancel)
+            store.update(job_id, stages=stages)
+            # Длительность из заголовков контейнера; без нее - по последнему слову
+            audio_seconds = job.get("duration") or transcript.duration
+            if audio_seconds:
+                metrics.RECOGNITION_REALTIME_FACTOR.observe(stages["transcribe"] / audio_seconds)
+        if render:
+            if should_cancel():
+                raise JobCancelled()
+            with _stage(stages, "render"):
+                create_shorts_video(
+                    job["video_path"], audio_path, job["vosk"], job["output"], job["srt"],
+                    job.get("profile", RENDER_PROFILE), job.get("soft_subtitles", False),
+                    transcript=transcript, duration=job.get("duration"),
+                    on_progress=_progress_reporter(job_id), should_cancel=should_cancel,
+                    frame=job.get("frame")
+                )
+            if not os.path.exists(job["output"]):
+                raise RuntimeError("Output video file was not created.")
+
+        transcript.save(job["transcript"])
+        if not cached_transcript:
+            result_cache.put(job.get("transcript_key"), ".json", job["transcript"])
+        if render:
+            result_cache.put(job.get("render_key"), ".mp4", job["output"])
+            _complete_video(job["video_id"], job["user_id"])
+        store.update(job_id, status="completed", stages=stages)
+        metrics.JOBS_TOTAL.labels("completed").inc()
+        logger.info(f"Job {job_id} completed, stages: {stages}")
+    except Exception as e:
+        cancelled = isinstance(e, (JobCancelled, FFmpegCancelled))
+        job_status = "cancelled" if cancelled else "failed"
+        if cancelled:
+            logger.info(f"Job {job_id} cancelled")
+        else:
+            logger.error(f"Job {job_id} failed: {e}")
+        if job.get("video_id") is not None:
+            try:
+                _set_video_status(job["video_id"], job_status)
+            except Exception as db_error:
+                logger.error(f"Failed to mark video {job['video_id']} as {job_status}: {db_error}")
+        store.update(job_id, status=job_status, error=None if cancelled else str(e), stages=stages)
+        metrics.JOBS_TOTAL.labels(job_status).inc()
+        for path in (job.get("output"), job["transcript"]):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+async def enqueue_job(db, user_id, job_id, video_path, audio_path=None, vosk="vosk-model-small-en-us-0.15", title=None,
+                profile=RENDER_PROFILE, soft_subtitles=False, video_hash=None, audio_hash=None,
+                priority=PRIORITY_FREE, karaoke=False, duration=None, frame=None):
+    """
+    Создает запись Video в статусе processing и ставит задачу в очередь.
+    Если audio_path не задан, используется звуковая дорожка видео.
+    По хешам содержимого ищется готовый результат в кэше: при попадании
+    задача сразу завершается без рендера. При karaoke=True субтитры пишутся
+    в ASS с подсветкой слов. duration (секунды) нужна для процента готовности.
+    frame - формат кадра результата (render.frame_format). Место в admission должно быть уже зарезервировано; оно освобождается
+    после завершения задачи. Входные файлы должны лежать в каталоге задачи
+    (workspace.create_workspace), он удаляется целиком.
+    """
+    job = await _create_render_job(db, user_id, job_id, video_path, audio_path, vosk, title, profile, soft_subtitles,
+                                   video_hash, audio_hash, priority, karaoke, duration, frame)
+    if job["status"] == "completed":
+        await asyncio.to_thread(admission.release, user_id)
+        await asyncio.to_thread(remove_workspace, job_id)
+        return job
+    await asyncio.to_thread(queue.submit, job)
+    return job
+
+
+async def _create_render_job(db, user_id, job_id, video_path, audio_path, vosk, title, profile, soft_subtitles,
+                             video_hash, audio_hash, priority, karaoke, duration, frame=None, batch_id=None):
+    """
+    Создает Video и состояние задачи рендера, не ставя ее в очередь. При попадании
+    в кэш задача сразу завершена. У видео пакета субтитры пишутся в каталог пакета.
+    """
+    subtitle_format = "ass" if karaoke else "srt"
+    keys = {"transcript_key": None, "render_key": None}
+    if video_hash:
+        keys["transcript_key"] = transcript_key(audio_hash or video_hash, vosk)
+        keys["render_key"] = render_key(video_hash, audio_hash, vosk, profile, soft_subtitles, subtitle_format, frame)
+
+    output = os.path.join(RESULTS_DIR, job_id + ".mp4")
+    transcript_path = os.path.join(RESULTS_DIR, job_id + ".json")
+    cached = await asyncio.to_thread(result_cache.fetch, keys["render_key"], ".mp4", output)
+
+    from user import create_video, update_user_statistics
+    video = await create_video(
+        db, user_id, title, job_id + ".mp4",
+        status="completed" if cached else "processing"
+    )
+    # videos_count пользователя изменился
+    await user_cache.invalidate(user_id)
+
+    if cached:
+        await update_user_statistics(db, user_id)
+        await asyncio.to_thread(result_cache.fetch, keys["transcript_key"], ".json", transcript_path)
+        await asyncio.to_thread(store.set, job_id, {
+            "status": "completed", "user_id": user_id, "video_id": video.id,
+            "output": output, "transcript": transcript_path,
+        })
+        logger.info(f"Job {job_id} served from cache")
+        return {"id": job_id, "status": "completed", "output": output}
+
+    job = {
+        "id": job_id,
+        "user_id": user_id,
+        "video_id": video.id,
+        "video_path": video_path,
+        "audio_path": audio_path,
+        "vosk": vosk,
+        "status": "processing",
+        "output": output,
+        "transcript": transcript_path,
+        "srt": os.path.join(workspace_path(batch_id or job_id), f"{job_id}.{subtitle_format}"),
+        "profile": profile,
+        "soft_subtitles": soft_subtitles,
+        "priority": priority,
+        "duration": duration,
+        "frame": frame,
+        "batch_id": batch_id,
+        **keys,
+    }
+    await asyncio.to_thread(store.set, job_id, {
+        "status": "processing",
+        "user_id": user_id,
+        "video_id": video.id,
+        "output": job["output"],
+        "transcript": transcript_path,
+    })
+    return job
+
+
+async def enqueue_batch(db, user_id, batch_id, uploads, vosk="vosk-model-small-en-us-0.15", profile=RENDER_PROFILE,
+                        soft_subtitles=False, karaoke=False, priority=PRIORITY_FREE, frame=None):
+    """
+    Ставит пакет видео в очередь одной задачей: воркер обрабатывает их подряд
+    с одной загруженной моделью. Каждое видео получает свою задачу (job_id и Video),
+    поэтому статус, видео и транскрипт отдаются обычными /jobs/{job_id}.
+    uploads - файлы из ingest.ingest_batch: файлы с error сразу попадают
+    в манифест как rejected, готовые результаты из кэша - как completed.
+    Место в admission резервируется одно на весь пакет, файлы лежат в каталоге пакета.
+    """
+    items = []
+    pending = []
+    for upload in uploads:
+        if upload.get("error"):
+            items.append({"filename": upload["filename"], "error": upload["error"]})
+            continue
+        job = await _create_render_job(db, user_id, str(uuid.uuid4()), upload["path"], None, vosk, upload["filename"],
+                                       profile, soft_subtitles, upload["sha256"], None, priority, karaoke,
+                                       upload["duration"], frame, batch_id=batch_id)
+        items.append({"filename": upload["filename"], "job_id": job["id"]})
+        if job["status"] == "processing":
+            pending.append(job)
+
+    state = {"status": "processing" if pending else "completed", "user_id": user_id, "items": items}
+    await asyncio.to_thread(store.set, batch_id, state)
+    if not pending:
+        await asyncio.to_thread(admission.release, user_id)
+        await asyncio.to_thread(remove_workspace, batch_id)
+        logger.info(f"Batch {batch_id} needs no processing")
+    else:
+        batch = {"id": batch_id, "user_id": user_id, "vosk": vosk, "priority": priority, "items": pending}
+        await asyncio.to_thread(queue.submit, batch)
+    return dict(state, id=batch_id)
+
+
+async def enqueue_transcription(user_id, job_id, media_path, vosk="vosk-model-small-en-us-0.15", media_hash=None,
+                                priority=PRIORITY_FREE):
+    """
+    Ставит в очередь задачу только на распознавание речи, без рендера и без записи Video.
+    Транскрипт из кэша отдается сразу. media_path должен лежать в каталоге задачи.
+    """
+    key = transcript_key(media_hash, vosk) if media_hash else None
+    transcript_path = os.path.join(RESULTS_DIR, job_id + ".json")
+    state = {"status": "processing", "user_id": user_id, "render": False, "transcript": transcript_path}
+
+    if await asyncio.to_thread(result_cache.fetch, key, ".json", transcript_path):
+        await asyncio.to_thread(admission.release, user_id)
+        await asyncio.to_thread(remove_workspace, job_id)
+        await asyncio.to_thread(store.set, job_id, dict(state, status="completed"))
+        logger.info(f"Transcription {job_id} served from cache")
+        return {"id": job_id, "status": "completed"}
+
+    job = {
+        "id": job_id,
+        "user_id": user_id,
+        "video_path": media_path,
+        "audio_path": None,
+        "vosk": vosk,
+        "status": "processing",
+        "render": False,
+        "transcript": transcript_path,
+        "transcript_key": key,
+        "priority": priority,
+    }
+    await asyncio.to_thread(store.set, job_id, state)
+    await asyncio.to_thread(queue.submit, job)
+    return job
+
+
+async def get_job(db, job_id):
+    """Возвращает состояние задачи; если его уже нет в хранилище, берет статус из Video"""
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is not None:
+        return job
+    result = await db.execute(select(Video).where(Video.filename == job_id + ".mp4"))
+    video = result.scalars().first()
+    if video is None:
+        return None
+    return {
+        "status": video.status,
+        "user_id": video.user_id,
+        "video_id": video.id,
+        "output": os.path.join(RESULTS_DIR, video.filename),
+        "transcript": os.path.join(RESULTS_DIR, job_id + ".json"),
+    }
+
+
+async def wait_for_job(db, job_id, timeout=0, limit=JOB_MAX_WAIT_SECONDS, is_disconnected=None):
+    """
+    Long-poll: ждет завершения задачи не дольше timeout (но не больше limit) секунд.
+    Если ожидающий клиент отключился (is_disconnected() вернул True), задача отменяется.
+    """
+    deadline = time.monotonic() + min(max(timeout, 0), limit)
+    while True:
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is None:
+            return await get_job(db, job_id)
+        if job["status"] != "processing" or time.monotonic() >= deadline:
+            return job
+        if is_disconnected is not None and await is_disconnected():
+            logger.info(f"Client waiting for job {job_id} disconnected, cancelling")
+            await asyncio.to_thread(cancel_job, job_id)
+            return job
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+def cancel_job(job_id):
+    """Просит воркер остановить задачу; ffmpeg убивается в течение секунды"""
+    store.request_cancel(job_id)
+
+
+def batch_manifest(batch):
+    """Статус и ссылки на результаты каждого видео пакета, в порядке загрузки"""
+    manifest = []
+    for index, item in enumerate(batch["items"]):
+        entry = {"index": index, "filename": item["filename"]}
+        if "job_id" not in item:
+            entry.update(status="rejected", error=item["error"])
+            manifest.append(entry)
+            continue
+        job_id = item["job_id"]
+        job = store.get(job_id) or {"status": "expired"}
+        entry.update(job_id=job_id, status=job["status"])
+        if job.get("progress"):
+            entry["progress"] = job["progress"]
+        if job["status"] == "failed":
+            entry["error"] = job.get("error")
+        elif job["status"] == "completed":
+            entry["download_url"] = f"/jobs/{job_id}/video"
+            entry["transcript_url"] = f"/jobs/{job_id}/transcript"
+        manifest.append(entry)
+    return manifest
+
+
+def batch_archive_entries(batch):
+    """
+    Файлы для ZIP с результатами пакета: manifest.json и готовые видео
+    под именами "номер-имя загрузки.mp4". Видео, срок хранения которых истек, пропускаются.
+    """
+    manifest = batch_manifest(batch)
+    entries = [("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))]
+    for entry in manifest:
+        if entry["status"] != "completed":
+            continue
+        output = os.path.join(RESULTS_DIR, entry["job_id"] + ".mp4")
+        if os.path.exists(output):
+            name = os.path.splitext(os.path.basename(entry["filename"]))[0] or entry["job_id"]
+            entries.append((f"{entry['index'] + 1:03d}-{name}.mp4", output))
+    return entries
+
+
+def cleanup_scratch():
+    """Удаляет рабочие каталоги, которые остались от задач, уже не выполняющихся"""
+    def is_active(job_id):
+        return (store.get(job_id) or {}).get("status") == "processing"
+    return cleanup_orphans(is_active)
+
+
+def cleanup_expired_results():
+    """Удаляет готовые видео, которые хранятся дольше RESULT_TTL_SECONDS"""
+    now = time.time()
+    removed = 0
+    for name in os.listdir(RESULTS_DIR):
+        path = os.path.join(RESULTS_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > RESULT_TTL_SECONDS:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} expired results")
+    return removed
@@ -0,0 +1,172 @@
+# live.py
+import json
+import asyncio
+import logging
+from fastapi import WebSocket, WebSocketDisconnect
+from subs import SAMPLE_RATE, CHUNK_FRAMES, pcm_decode_command
+from transcript import Transcript
+from metrics import FFMPEG_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт PCM отдается распознавателю за раз: чаще - свежее частичные результаты
+FEED_BYTES = CHUNK_FRAMES * 2
+# Сообщение клиента, завершающее поток аудио
+END_MESSAGE = "end"
+
+
+class LiveSession:
+    """
+    Инкрементальное распознавание для живых клиентов. Принимает PCM кусками
+    произвольного размера и возвращает события: partial - текущая гипотеза
+    фразы, words - слова законченной фразы с таймингами, final - весь транскрипт.
+    """
+
+    def __init__(self, model, sample_rate=SAMPLE_RATE):
+        # vosk загружает нативную библиотеку, поэтому импортируется при первом использовании
+        from vosk import KaldiRecognizer
+        self.recognizer = KaldiRecognizer(model, sample_rate)
+        self.recognizer.SetWords(True)
+        self.sample_rate = sample_rate
+        self.transcript = Transcript()
+        self.seconds = 0.0
+        self._pending = b""
+        self._last_partial = ""
+
+    def accept(self, data):
+        """Скармливает PCM распознавателю и возвращает новые события"""
+        data = self._pending + data
+        # s16le: в распознаватель уходят только целые сэмплы
+        usable = len(data) - len(data) % 2
+        self._pending = data[usable:]
+        events = []
+        for offset in range(0, usable, FEED_BYTES):
+            chunk = data[offset:min(offset + FEED_BYTES, usable)]
+            self.seconds += len(chunk) / 2 / self.sample_rate
+            if self.recognizer.AcceptWaveform(chunk):
+                events += self._result(self.recognizer.Result())
+            else:
+                partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+                if partial and partial != self._last_partial:
+                    self._last_partial = partial
+                    events.append({"type": "partial", "text": partial})
+        return events
+
+    def _result(self, raw_result):
+        self._last_partial = ""
+        words = json.loads(raw_result).get("result", [])
+        if not words:
+            return []
+        self.transcript.extend(words)
+        return [{"type": "words", "words": words}]
+
+    def finish(self):
+        events = self._result(self.recognizer.FinalResult())
+        events.append({"type": "final", "transcript": self.transcript.to_dict()})
+        return events
+
+
+class DurationExceeded(Exception):
+    pass
+
+
+async def _send_events(websocket: WebSocket, session: LiveSession, data, max_seconds):
+    for event in await asyncio.to_thread(session.accept, data):
+        await websocket.send_json(event)
+    if session.seconds > max_seconds:
+        raise DurationExceeded()
+
+
+async def _pump_decoder(websocket, session, process, max_seconds):
+    while True:
+        data = await process.stdout.read(FEED_BYTES)
+        if not data:
+            break
+        await _send_events(websocket, session, data, max_seconds)
+
+
+async def run_websocket_session(websocket: WebSocket, session: LiveSession, media=False, max_seconds=float("inf")):
+    """
+    Читает аудио из WebSocket до сообщения "end" и отправляет события по мере
+    распознавания. media=False - бинарные сообщения содержат 16 кГц mono s16le,
+    media=True - произвольный медиапоток, который декодирует ffmpeg.
+    Возвращает итоговый Transcript или None, если клиент отключился.
+    """
+    process = None
+    pump = None
+    if media:
+        process = await asyncio.create_subprocess_exec(
+            *pcm_decode_command("pipe:0"),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        FFMPEG_PROCESSES.inc()
+        pump = asyncio.create_task(_pump_decoder(websocket, session, process, max_seconds))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return None
+            if message.get("bytes"):
+                if process is not None:
+                    if pump.done():
+                        break
+                    process.stdin.write(message["bytes"])
+                    await process.stdin.drain()
+                else:
+                    await _send_events(websocket, session, message["bytes"], max_seconds)
+            elif message.get("text") == END_MESSAGE:
+                break
+        if process is not None:
+            process.stdin.close()
+            await pump
+        for event in await asyncio.to_thread(session.finish):
+            await websocket.send_json(event)
+        await websocket.close()
+        return session.transcript
+    except DurationExceeded:
+        await websocket.send_json({"type": "error", "detail": "Превышена максимальная длительность для вашего тарифа"})
+        await websocket.close(code=1009)
+        return None
+    except (WebSocketDisconnect, ConnectionResetError, BrokenPipeError):
+        return None
+    finally:
+        if pump is not None and not pump.done():
+            pump.cancel()
+        if process is not None:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            FFMPEG_PROCESSES.dec()
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def stream_file_events(session: LiveSession, media_path):
+    """События распознавания файла в формате Server-Sent Events"""
+    process = await asyncio.create_subprocess_exec(
+        *pcm_decode_command(media_path),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    FFMPEG_PROCESSES.inc()
+    try:
+        while True:
+            data = await process.stdout.read(FEED_BYTES * 4)
+            if not data:
+                break
+            for event in await asyncio.to_thread(session.accept, data):
+                yield format_sse(event)
+        if await process.wait() != 0:
+            yield format_sse({"type": "error", "detail": "Не удалось декодировать аудио"})
+            return
+        for event in await asyncio.to_thread(session.finish):
+            yield format_sse(event)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        FFMPEG_PROCESSES.dec()
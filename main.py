@@ -1,22 +1,37 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Request, Form
-from fastapi.responses import JSONResponse
-from tempfile import NamedTemporaryFile
-import shutil
+from readiness import readiness
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Request, Form, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 import os
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 import uvicorn
-from subs import create_shorts_video, extract_audio_from_video
+from model_registry import registry, get_model, available_models, PRELOAD_MODELS
+from jobs import (
+    queue, enqueue_job, enqueue_transcription, enqueue_batch, get_job, wait_for_job, cancel_job,
+    cleanup_expired_results, cleanup_scratch, batch_manifest, batch_archive_entries
+)
+from workspace import create_workspace, remove_workspace
+from streaming import file_response, zip_response, CleanupStreamingResponse
+from result_cache import result_cache, transcript_key
+from ingest import ingest_upload, ingest_batch, upload_limits
+from user_cache import user_cache
+from admission import admission
+from render import ENCODER_PROFILES, RENDER_PROFILE, frame_format
+from cues import SERIALIZERS, group_words
+from transcript import Transcript
+from live import LiveSession, run_websocket_session, stream_file_events, format_sse
+from metrics import RequestMetricsMiddleware, render_metrics, METRICS_CONTENT_TYPE
 import uuid
 from auth import (
-    authenticate_user, create_access_token, get_current_user, 
+    authenticate_user, create_access_token, get_current_user, resolve_user,
     ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash, SECRET_KEY, ALGORITHM
 )
 from datetime import timedelta
-from database import engine, Base, SessionLocal, reset_database, update_schema
-from sqlalchemy.orm import Session
+from database import AsyncSessionLocal, reset_database, run_migrations, DB_MIGRATE_ON_STARTUP
+from sqlalchemy.ext.asyncio import AsyncSession
 from user import create_user, get_user, get_user_by_email, get_user_statistics
 from models import (
-    UserCreate, User, SubscriptionPlan,
+    UserCreate, User,
     UserResponse, UserStatisticsResponse
 )
 import base64
@@ -37,6 +52,12 @@ load_dotenv()
 
 app = FastAPI()
 
+# Сколько ждать рендера в режиме ?inline=base64 и как часто чистить старые результаты
+INLINE_WAIT_SECONDS = float(os.getenv("INLINE_WAIT_SECONDS", "600"))
+# Видео больше этого размера не отдается в base64 внутри JSON: ответ собирается в памяти
+INLINE_MAX_MB = int(os.getenv("INLINE_MAX_MB", "100"))
+RESULTS_CLEANUP_INTERVAL = 300
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=os.getenv("ALLOWED_ORIGINS", "http://localhost:5173/*").split(","),
@@ -44,44 +65,70 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, etc.)
     allow_headers=["*"],  # Allow all headers; adjust as needed
 )
+# Длительность запросов по маршрутам для /metrics
+app.add_middleware(RequestMetricsMiddleware)
 
-# Создаем таблицы в базе данных при запуске приложения
 @app.on_event("startup")
 def startup():
-    # Безопасно обновляем схему базы данных без потери данных
-    update_schema()
-    
-    # Создаем базовые планы подписки
-    with SessionLocal() as db:
-        if db.query(SubscriptionPlan).count() == 0:
-            logger.info("Creating default subscription plans...")
-            basic_plan = SubscriptionPlan(
-                name="Базовый",
-                price=0.0,
-                description="До 5 видео в месяц, базовое распознавание речи",
-                max_videos=5
-            )
-            premium_plan = SubscriptionPlan(
-                name="Премиум",
-                price=999.0,
-                description="Неограниченное количество видео, улучшенное распознавание речи",
-                max_videos=-1  # -1 означает неограниченное количество
-            )
-            db.add_all([basic_plan, premium_plan])
-            db.commit()
-            logger.info("Default subscription plans created successfully.")
+    # Схему обновляет отдельный шаг alembic upgrade head (он же создает планы подписки);
+    # из приложения - только в разработке или одним процессом
+    if DB_MIGRATE_ON_STARTUP:
+        run_migrations()
 
-def get_db():
-    db = SessionLocal()
-    try:
+    # Модели Vosk загружаются в фоне, до их загрузки /readyz отвечает 503
+    readiness.warm_models(PRELOAD_MODELS)
+
+    # Запускаем воркеры очереди рендера
+    queue.start()
+
+@app.on_event("startup")
+async def start_results_janitor():
+    # Периодически удаляем готовые видео, срок хранения которых истек,
+    # и рабочие файлы задач, оставшиеся после падений и прерванных загрузок
+    async def janitor():
+        while True:
+            for cleanup in (cleanup_expired_results, cleanup_scratch):
+                try:
+                    await asyncio.to_thread(cleanup)
+                except Exception as e:
+                    logger.error(f"{cleanup.__name__} failed: {e}")
+            await asyncio.sleep(RESULTS_CLEANUP_INTERVAL)
+
+    asyncio.create_task(janitor())
+
+@app.on_event("shutdown")
+def shutdown():
+    queue.stop()
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def upload_size(request: Request):
+    """Размер тела запроса по Content-Length (0, если не указан)"""
+    try:
+        return int(request.headers.get("content-length") or 0)
+    except ValueError:
+        return 0
+
+def check_frame_format(size: Optional[str], fit: Optional[str], max_fps: Optional[float]):
+    """Формат кадра результата из параметров запроса; ошибки - 400"""
+    try:
+        return frame_format(size, fit, max_fps)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def check_render_profile(profile: str):
+    if profile not in ENCODER_PROFILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестный профиль кодирования. Доступны: {', '.join(ENCODER_PROFILES)}"
+        )
 
 
 @app.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, user.email)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -89,17 +136,17 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Создаем пользователя
-    new_user = create_user(db, user)
+    new_user = await create_user(db, user)
     
     return new_user
 
 @app.get("/users/{user_id}")
-async def read_user(user_id: int, db: Session = Depends(get_db)):
-    return get_user(db=db, user_id=user_id)
+async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    return await get_user(db=db, user_id=user_id)
 
 @app.post("/login")
-async def simple_login(email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = authenticate_user(db, email, password)
+async def simple_login(email: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(db, email, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -124,8 +171,24 @@ async def simple_login(email: str = Form(...), password: str = Form(...), db: Se
         }
     }
 
-@app.post("/generate/videoandaudio")
-async def upload_files(request: Request, video: UploadFile = File(...), audio: UploadFile = File(...), vosk: str = "vosk-model-small-en-us-0.15", db: Session = Depends(get_db)):
+def check_vosk_model(vosk: str):
+    # Модели не скачиваются по запросу: доступны только уже лежащие на диске
+    models = available_models()
+    if vosk not in models:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестная модель распознавания. Доступны: {', '.join(models)}"
+        )
+
+@app.post("/generate/videoandaudio", status_code=status.HTTP_202_ACCEPTED)
+async def upload_files(request: Request, vosk: str = "vosk-model-small-en-us-0.15", profile: str = RENDER_PROFILE, soft_subtitles: bool = False, karaoke: bool = False, size: Optional[str] = None, fit: Optional[str] = None, max_fps: Optional[float] = None, inline: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Принимает multipart-форму с файлами video и audio. Тело читается потоком
+    уже после проверки токена и сразу пишется в каталог задачи.
+    karaoke=true - субтитры фразами с подсветкой произносимого слова.
+    size=1080x1920, fit=contain|crop|pad, max_fps - формат кадра результата:
+    например, size=1080x1920&fit=crop делает из горизонтального видео вертикальное.
+    """
     token = request.headers.get("Authorization").split(" ")[1]
     user = await get_current_user(db=db, token=token)
 
@@ -135,95 +198,448 @@ async def upload_files(request: Request, video: UploadFile = File(...), audio: U
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    name = str(uuid.uuid4()) + '.mp4'
+    check_vosk_model(vosk)
+    check_render_profile(profile)
+    frame = check_frame_format(size, fit, max_fps)
+    # Квота тарифа, лимиты одновременных задач и место на диске проверяются до чтения тела запроса
+    priority = await admission.admit(db, user, incoming_bytes=upload_size(request))
+    job_id = str(uuid.uuid4())
     try:
-        print(f"Received video file: {video.filename} with content type {video.content_type}")
-        print(f"Received audio file: {audio.filename} with content type {audio.content_type}")
+        uploads = await ingest_upload(request, user, create_workspace(job_id), job_id, required=("video", "audio"))
+    except BaseException:
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, job_id)
+        raise
+    video, audio = uploads["video"], uploads["audio"]
+    try:
+        logger.info(f"Job {job_id}: video {video['filename']} ({video['content_type']}, {video['size']} bytes), "
+                    f"audio {audio['filename']} ({audio['content_type']}, {audio['size']} bytes)")
 
-        with NamedTemporaryFile(delete=False, suffix=".mp4") as video_tempfile:
-            shutil.copyfileobj(video.file, video_tempfile)
-            video_temp_path = video_tempfile.name
+        job = await enqueue_job(db, user.id, job_id, video["path"], audio["path"], vosk, title=video["filename"],
+                                profile=profile, soft_subtitles=soft_subtitles,
+                                video_hash=video["sha256"], audio_hash=audio["sha256"], priority=priority,
+                                karaoke=karaoke, duration=video["duration"], frame=frame)
 
-        with NamedTemporaryFile(delete=False, suffix=".wav") as audio_tempfile:
-            shutil.copyfileobj(audio.file, audio_tempfile)
-            audio_temp_path = audio_tempfile.name
+    except Exception as e:
+        logger.error(f"Job {job_id} could not be queued: {e}")
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, job_id)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
-        try:
-            create_shorts_video(video_temp_path, audio_temp_path, vosk, name)
-        except Exception as e:
-            print(f"Error during video creation: {e}")
-            raise HTTPException(status_code=500, detail=f"Video creation failed: {e}")
+    if inline == "base64":
+        return await inline_video_response(request, db, job_id)
+    return {"job_id": job_id, "status": job["status"]}
 
-        if not os.path.exists(name):
-            raise HTTPException(status_code=500, detail="Output video file was not created.")
+@app.post("/generate/video", status_code=status.HTTP_202_ACCEPTED)
+async def upload_files_without_audio(request: Request, vosk: str = "vosk-model-small-en-us-0.15", profile: str = RENDER_PROFILE, soft_subtitles: bool = False, karaoke: bool = False, size: Optional[str] = None, fit: Optional[str] = None, max_fps: Optional[float] = None, inline: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Принимает multipart-форму с файлом video. Тело читается потоком
+    уже после проверки токена и сразу пишется в каталог задачи.
+    karaoke=true - субтитры фразами с подсветкой произносимого слова.
+    size=1080x1920, fit=contain|crop|pad, max_fps - формат кадра результата:
+    например, size=1080x1920&fit=crop делает из горизонтального видео вертикальное.
+    """
+    token = request.headers.get("Authorization").split(" ")[1]
+    user = await get_current_user(db=db, token=token)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    check_vosk_model(vosk)
+    check_render_profile(profile)
+    frame = check_frame_format(size, fit, max_fps)
+    # Квота тарифа, лимиты одновременных задач и место на диске проверяются до чтения тела запроса
+    priority = await admission.admit(db, user, incoming_bytes=upload_size(request))
+    job_id = str(uuid.uuid4())
+    try:
+        uploads = await ingest_upload(request, user, create_workspace(job_id), job_id, required=("video",))
+    except BaseException:
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, job_id)
+        raise
+    video = uploads["video"]
+    try:
+        logger.info(f"Job {job_id}: video {video['filename']} ({video['content_type']}, {video['size']} bytes)")
 
-        with open(name, "rb") as file:
-            video_data = base64.b64encode(file.read()).decode('utf-8')
-        return JSONResponse(content={"video": video_data, "name": name})
+        # Звук берется воркером из самого видео
+        job = await enqueue_job(db, user.id, job_id, video["path"], vosk=vosk, title=video["filename"],
+                                profile=profile, soft_subtitles=soft_subtitles, video_hash=video["sha256"],
+                                priority=priority, karaoke=karaoke, duration=video["duration"], frame=frame)
 
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Job {job_id} could not be queued: {e}")
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, job_id)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
-    finally:
-        if os.path.exists(video_temp_path):
-            os.remove(video_temp_path)
-        if os.path.exists(audio_temp_path):
-            os.remove(audio_temp_path)
-        if os.path.exists(name):
-            os.remove(name)
-
-@app.post("/generate/video")
-async def upload_files_without_audio(request: Request, video: UploadFile = File(...), vosk: str = "vosk-model-small-en-us-0.15", db: Session = Depends(get_db)):
+    if inline == "base64":
+        return await inline_video_response(request, db, job_id)
+    return {"job_id": job_id, "status": job["status"]}
+
+@app.post("/generate/batch", status_code=status.HTTP_202_ACCEPTED)
+async def upload_batch(request: Request, vosk: str = "vosk-model-small-en-us-0.15", profile: str = RENDER_PROFILE, soft_subtitles: bool = False, karaoke: bool = False, size: Optional[str] = None, fit: Optional[str] = None, max_fps: Optional[float] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Принимает пакет видео с общими настройками: multipart-форму с несколькими
+    файлами в поле video и/или ZIP-архивом в поле archive. Пакет - одна задача
+    в очереди: видео обрабатываются подряд одним воркером с одной загруженной
+    моделью, ошибка одного видео не прерывает остальные. Статус и ссылки на
+    результат каждого видео - в /jobs/{job_id}, все готовые видео одним
+    ZIP - в /jobs/{job_id}/archive. Файлы, не прошедшие проверки, и видео
+    сверх месячного лимита тарифа получают статус rejected. size, fit и max_fps -
+    формат кадра, как в /generate/video.
+    """
     token = request.headers.get("Authorization").split(" ")[1]
     user = await get_current_user(db=db, token=token)
-    
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    base_name = str(uuid.uuid4())
-    name = base_name + '.mp4'
-    audio = base_name + '.wav'
-    srt = base_name + '.srt'
+    check_vosk_model(vosk)
+    check_render_profile(profile)
+    frame = check_frame_format(size, fit, max_fps)
+    # До чтения тела проверяется, что лимит тарифа позволяет хотя бы одно видео
+    priority = await admission.admit(db, user, incoming_bytes=upload_size(request))
+    batch_id = str(uuid.uuid4())
     try:
-        print(f"Received video file: {video.filename} with content type {video.content_type}")
+        uploads = await ingest_batch(request, user, create_workspace(batch_id), batch_id)
+        videos_left = await admission.videos_left(db, user)
+    except BaseException:
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, batch_id)
+        raise
+    for upload in uploads:
+        if upload.get("error"):
+            continue
+        if videos_left is not None:
+            if videos_left == 0:
+                upload["error"] = "Лимит тарифа исчерпан"
+                os.remove(upload["path"])
+                continue
+            videos_left -= 1
+    try:
+        logger.info(f"Batch {batch_id}: {len(uploads)} files, "
+                    f"{sum(1 for upload in uploads if upload.get('error'))} rejected")
+        batch = await enqueue_batch(db, user.id, batch_id, uploads, vosk, profile=profile,
+                                    soft_subtitles=soft_subtitles, karaoke=karaoke, priority=priority, frame=frame)
+    except Exception as e:
+        logger.error(f"Batch {batch_id} could not be queued: {e}")
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, batch_id)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+    return {"job_id": batch_id, "status": batch["status"], "items": await asyncio.to_thread(batch_manifest, batch)}
 
-        with NamedTemporaryFile(delete=False, suffix=".mp4") as video_tempfile:
-            shutil.copyfileobj(video.file, video_tempfile)
-            video_temp_path = video_tempfile.name
+@app.post("/transcribe", status_code=status.HTTP_202_ACCEPTED)
+async def transcribe_media(request: Request, vosk: str = "vosk-model-small-en-us-0.15", db: AsyncSession = Depends(get_db)):
+    """
+    Принимает multipart-форму с файлом video или audio и только распознает
+    речь, без рендера. Транскрипт отдается по /jobs/{job_id}/transcript.
+    """
+    token = request.headers.get("Authorization").split(" ")[1]
+    user = await get_current_user(db=db, token=token)
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    check_vosk_model(vosk)
+    priority = await admission.admit(db, user, incoming_bytes=upload_size(request))
+    job_id = str(uuid.uuid4())
+    try:
+        uploads = await ingest_upload(request, user, create_workspace(job_id), job_id, required=(), optional=("video", "audio"))
+        if not uploads:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Не передан файл 'video' или 'audio'"
+            )
+        if len(uploads) > 1:
+            # Распознается аудио, видео не нужно
+            os.remove(uploads.pop("video")["path"])
+        media = next(iter(uploads.values()))
+        job = await enqueue_transcription(user.id, job_id, media["path"], vosk, media_hash=media["sha256"],
+                                          priority=priority)
+    except BaseException:
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, job_id)
+        raise
+    return {"job_id": job_id, "status": job["status"]}
+
+@app.post("/transcribe/live")
+async def transcribe_media_live(request: Request, vosk: str = "vosk-model-small-en-us-0.15", db: AsyncSession = Depends(get_db)):
+    """
+    Принимает multipart-форму с файлом video или audio и отдает результаты
+    распознавания потоком Server-Sent Events: partial - текущая гипотеза,
+    words - законченная фраза с таймингами, final - весь транскрипт.
+    """
+    token = request.headers.get("Authorization").split(" ")[1]
+    user = await get_current_user(db=db, token=token)
 
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    check_vosk_model(vosk)
+    await admission.admit(db, user, incoming_bytes=upload_size(request))
+    job_id = str(uuid.uuid4())
+    released = False
+
+    async def release():
+        # Место и каталог освобождаются один раз: тем, что сработает первым из
+        # обработчика ошибок, генератора событий и фоновой задачи ответа
+        nonlocal released
+        if released:
+            return
+        released = True
+        await asyncio.to_thread(admission.release, user.id)
+        await asyncio.to_thread(remove_workspace, job_id)
+
+    try:
+        uploads = await ingest_upload(request, user, create_workspace(job_id), job_id, required=(), optional=("video", "audio"))
+        if not uploads:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Не передан файл 'video' или 'audio'"
+            )
+        if len(uploads) > 1:
+            os.remove(uploads.pop("video")["path"])
+        media = next(iter(uploads.values()))
+        model = await asyncio.to_thread(get_model, vosk)
+        key = transcript_key(media["sha256"], vosk)
+    except BaseException:
+        await release()
+        raise
+
+    async def events():
         try:
-            extract_audio_from_video(video_temp_path, audio)
-            create_shorts_video(video_temp_path, audio, vosk, name, srt)
-        except Exception as e:
-            print(f"Error during video creation: {e}")
-            raise HTTPException(status_code=500, detail=f"Video creation failed: {e}")
+            cached = await asyncio.to_thread(result_cache.get, key, ".json")
+            if cached:
+                transcript = await asyncio.to_thread(Transcript.load, cached)
+                yield format_sse({"type": "words", "words": list(transcript)})
+                yield format_sse({"type": "final", "transcript": transcript.to_dict()})
+                return
+            session = LiveSession(model)
+            async for event in stream_file_events(session, media["path"]):
+                yield event
+            if len(session.transcript):
+                # Распознанный транскрипт пригодится для /transcribe и рендера того же файла
+                path = os.path.join(create_workspace(job_id), job_id + ".json")
+                await asyncio.to_thread(session.transcript.save, path)
+                await asyncio.to_thread(result_cache.put, key, ".json", path)
+        finally:
+            await release()
+
+    # Фоновая задача выполняется и тогда, когда генератор так и не был запущен
+    return CleanupStreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"},
+                                    background=BackgroundTask(release))
+
+@app.websocket("/ws/transcribe")
+async def transcribe_websocket(websocket: WebSocket, token: Optional[str] = None, vosk: str = "vosk-model-small-en-us-0.15", input: str = "pcm"):
+    """
+    Живое распознавание через WebSocket. Токен передается в ?token= или в
+    заголовке Authorization. Клиент шлет бинарные сообщения: при input=pcm -
+    16 кГц mono s16le, при input=media - байты любого медиафайла (например,
+    запись MediaRecorder), и текстовое "end" в конце. Сервер отвечает JSON-событиями
+    partial/words по мере распознавания и final со всем транскриптом.
+    """
+    token = token or (websocket.headers.get("authorization") or " ").split(" ")[-1]
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await get_current_user(db=db, token=token)
+            check_vosk_model(vosk)
+            await admission.admit(db, user)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=str(e.detail))
+            return
+    try:
+        model = await asyncio.to_thread(get_model, vosk)
+        await websocket.accept()
+        _, max_duration = upload_limits(user)
+        await run_websocket_session(websocket, LiveSession(model), media=input == "media", max_seconds=max_duration)
+    finally:
+        await asyncio.to_thread(admission.release, user.id)
+
+def read_inline_video(path):
+    """Видео в base64 или None, если оно больше INLINE_MAX_MB; читает файл целиком, вызывать в потоке"""
+    if os.path.getsize(path) > INLINE_MAX_MB * 1024 * 1024:
+        return None
+    with open(path, "rb") as file:
+        return base64.b64encode(file.read()).decode('utf-8')
 
-        if not os.path.exists(name):
-            raise HTTPException(status_code=500, detail="Output video file was not created.")
+async def inline_video_response(request: Request, db: AsyncSession, job_id: str):
+    """
+    Совместимость со старыми клиентами (?inline=base64): дожидается рендера
+    и возвращает видео в base64 внутри JSON, как раньше. Если клиент
+    отключился, не дождавшись, рендер отменяется.
+    """
+    job = await wait_for_job(db, job_id, timeout=INLINE_WAIT_SECONDS, limit=INLINE_WAIT_SECONDS,
+                             is_disconnected=request.is_disconnected)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Video creation failed: {job.get('error')}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=504, detail="Video creation timed out")
+    if not os.path.exists(job["output"]):
+        raise HTTPException(status_code=500, detail="Output video file was not created.")
+
+    video_data = await asyncio.to_thread(read_inline_video, job["output"])
+    if video_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Видео больше {INLINE_MAX_MB} МБ, скачайте его по /jobs/{job_id}/video"
+        )
+    return JSONResponse(content={"video": video_data, "name": job_id + ".mp4"})
 
-        with open(name, "rb") as file:
-            video_data = base64.b64encode(file.read()).decode('utf-8')
-        return JSONResponse(content={"video": video_data, "name": name})
+def get_owned_job(job: Optional[dict], current_user: User):
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача не найдена"
+        )
+    return job
 
-    except Exception as e:
-        print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+def check_not_batch(job: dict):
+    if "items" in job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Это пакет: результаты видео доступны по ссылкам из /jobs/{job_id} или одним архивом"
+        )
 
-    finally:
-        if os.path.exists(video_temp_path):
-            os.remove(video_temp_path)
-        if os.path.exists(name):
-            os.remove(name)
-        if os.path.exists(audio):
-            os.remove(audio)
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, wait: float = 0, inline: Optional[str] = None, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Возвращает статус задачи рендера: processing, completed или failed.
+
+    Параметр wait включает long-poll: ответ придет, как только задача завершится,
+    но не позже чем через wait секунд. Готовое видео скачивается по download_url
+    и хранится RESULT_TTL_SECONDS; с inline=base64 оно возвращается в поле video,
+    если не больше INLINE_MAX_MB.
+    Пока идет рендер, в progress приходят процент готовности, fps и скорость,
+    в stages - длительность завершенных этапов (extract, transcribe, render).
+    """
+    job = get_owned_job(await wait_for_job(db, job_id, timeout=wait), current_user)
+
+    response = {"job_id": job_id, "status": job["status"]}
+    if "items" in job:
+        # Пакет: статус каждого видео и ссылки на его результаты
+        response["items"] = await asyncio.to_thread(batch_manifest, job)
+        response["archive_url"] = f"/jobs/{job_id}/archive"
+        return JSONResponse(content=response)
+    for field in ("progress", "stages"):
+        if job.get(field):
+            response[field] = job[field]
+    if job["status"] == "failed":
+        response["error"] = job.get("error")
+    elif job["status"] == "completed":
+        response["transcript_url"] = f"/jobs/{job_id}/transcript"
+        if not job.get("render", True):
+            return JSONResponse(content=response)
+        response["name"] = job_id + ".mp4"
+        response["download_url"] = f"/jobs/{job_id}/video"
+        if inline == "base64" and os.path.exists(job["output"]):
+            video_data = await asyncio.to_thread(read_inline_video, job["output"])
+            if video_data is not None:
+                response["video"] = video_data
+    return JSONResponse(content=response)
+
+@app.delete("/jobs/{job_id}", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_job_request(job_id: str, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Отменяет задачу: из очереди она не будет взята, запущенный ffmpeg будет остановлен"""
+    job = get_owned_job(await get_job(db, job_id), current_user)
+    if job["status"] != "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Задача уже завершена (статус: {job['status']})"
+        )
+    await asyncio.to_thread(cancel_job, job_id)
+    return {"job_id": job_id, "status": "cancelling"}
+
+@app.get("/jobs/{job_id}/video")
+async def download_job_video(job_id: str, request: Request, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Отдает готовое видео потоком. Поддерживаются Range-запросы и ETag,
+    поэтому плееры могут перематывать, а клиенты - докачивать файл.
+    """
+    job = get_owned_job(await get_job(db, job_id), current_user)
+    check_not_batch(job)
+    if not job.get("render", True):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача только распознает речь, видео у нее нет"
+        )
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Видео еще не готово (статус: {job['status']})"
+        )
+    if not os.path.exists(job["output"]):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Срок хранения видео истек"
+        )
+    return file_response(request, job["output"], media_type="video/mp4", filename=job_id + ".mp4")
+
+@app.get("/jobs/{job_id}/archive")
+async def download_batch_archive(job_id: str, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Отдает готовые видео пакета одним ZIP вместе с manifest.json (статусы и
+    ошибки всех видео). Архив собирается на лету и передается потоком;
+    пока пакет обрабатывается, в него попадают уже готовые видео.
+    """
+    job = get_owned_job(await get_job(db, job_id), current_user)
+    if "items" not in job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача не является пакетом"
+        )
+    entries = await asyncio.to_thread(batch_archive_entries, job)
+    return zip_response(entries, filename=job_id + ".zip")
+
+@app.get("/jobs/{job_id}/transcript")
+async def download_job_transcript(job_id: str, request: Request, format: str = "json", current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Отдает транскрипт задачи: json - слова с таймингами и уверенностью,
+    srt, vtt или ass - субтитры, сгруппированные во фразы.
+    """
+    if format != "json" and format not in SERIALIZERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестный формат. Доступны: json, {', '.join(SERIALIZERS)}"
+        )
+    job = get_owned_job(await get_job(db, job_id), current_user)
+    check_not_batch(job)
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Транскрипт еще не готов (статус: {job['status']})"
+        )
+    if not job.get("transcript") or not os.path.exists(job["transcript"]):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Срок хранения транскрипта истек"
+        )
+    if format == "json":
+        return file_response(request, job["transcript"], media_type="application/json", filename=job_id + ".json")
+
+    transcript = await asyncio.to_thread(Transcript.load, job["transcript"])
+    chunks, media_type = SERIALIZERS[format]
+    return StreamingResponse(
+        chunks(group_words(transcript)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.{format}"'}
+    )
 
 @app.get("/user/statistics", response_model=UserStatisticsResponse)
-async def get_user_stats(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    stats = get_user_statistics(db, current_user.id)
+async def get_user_stats(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    stats = await get_user_statistics(db, current_user.id)
     if not stats:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -231,6 +647,39 @@ async def get_user_stats(current_user: User = Depends(get_current_user), db: Ses
         )
     return stats
 
+@app.get("/models/stats")
+async def get_models_stats():
+    return registry.stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return await asyncio.to_thread(result_cache.stats)
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    stats = await asyncio.to_thread(admission.stats)
+    stats["queue_depth"] = await asyncio.to_thread(queue.depth)
+    return stats
+
+@app.get("/healthz")
+async def get_health():
+    # Процесс жив и обслуживает запросы; готовность к работе - /readyz
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def get_readiness():
+    state = await asyncio.to_thread(readiness.check)
+    return JSONResponse(state, status_code=status.HTTP_200_OK if state["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@app.get("/metrics")
+async def get_metrics():
+    # Чтение файлов метрик всех процессов не должно блокировать event loop
+    return Response(await asyncio.to_thread(render_metrics), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/auth/cache/stats")
+async def get_user_cache_stats():
+    return user_cache.stats()
+
 class TokenRequest(BaseModel):
     token: str
 
@@ -248,7 +697,7 @@ async def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.post("/profile/token", response_model=UserResponse)
-async def get_profile_by_token(token_request: TokenRequest, db: Session = Depends(get_db)):
+async def get_profile_by_token(token_request: TokenRequest, db: AsyncSession = Depends(get_db)):
     """
     Получает профиль пользователя на основе JWT токена, переданного в теле запроса.
     
@@ -268,11 +717,12 @@ async def get_profile_by_token(token_request: TokenRequest, db: Session = Depend
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_email(db, email=email)
+    user = await resolve_user(db, email)
     if user is None:
         raise credentials_exception
     return user
 
 if __name__ == "__main__":
+    # Один процесс для разработки; в продакшене: gunicorn -c gunicorn.conf.py main:app
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
@@ -0,0 +1,181 @@
+# metrics.py
+import os
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, start_http_server
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Каталог, куда процессы пишут свои метрики (нужен при uvicorn --workers и нескольких worker.py
+# на одном узле). Переменная должна быть в окружении до запуска процессов, а каталог - пустым.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Длительности HTTP-запросов: от быстрых ответов из кэша до долгого ожидания задачи
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Длительности этапов конвейера: от загрузки модели до рендера длинного видео
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+REALTIME_FACTOR_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 4)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "captioncraft_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+# Этапы: upload, extract, model_load, transcribe, render
+PIPELINE_STAGE_SECONDS = Histogram(
+    "captioncraft_pipeline_stage_seconds", "Duration of caption pipeline stages",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+RECOGNITION_REALTIME_FACTOR = Histogram(
+    "captioncraft_recognition_realtime_factor", "Recognition time divided by audio duration",
+    buckets=REALTIME_FACTOR_BUCKETS
+)
+# Доля аудио, которую VAD оставил распознавателю (TRANSCRIBE_VAD=1)
+VAD_SPEECH_RATIO = Histogram(
+    "captioncraft_vad_speech_ratio", "Share of audio passed to the recognizer after silence skipping",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+JOBS_TOTAL = Counter("captioncraft_jobs_total", "Finished jobs by status", ["status"])
+FFMPEG_PROCESSES = Gauge(
+    "captioncraft_ffmpeg_processes", "Running ffmpeg processes", multiprocess_mode="livesum"
+)
+# cache: model, result, user; result: hit, miss
+CACHE_REQUESTS = Counter("captioncraft_cache_requests_total", "Cache lookups by result", ["cache", "result"])
+DB_POOL_CHECKED_OUT = Gauge(
+    "captioncraft_db_pool_checked_out", "Database connections in use", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "captioncraft_db_pool_connections", "Open database connections", ["engine"], multiprocess_mode="livesum"
+)
+
+_gauges = {}
+_gauges_lock = threading.Lock()
+
+
+def gauge(name, documentation, multiprocess_mode="livesum"):
+    """Gauge без меток, созданный один раз на процесс"""
+    with _gauges_lock:
+        if name not in _gauges:
+            _gauges[name] = Gauge(name, documentation, multiprocess_mode=multiprocess_mode)
+        return _gauges[name]
+
+
+class _LiveCollector:
+    """
+    Значения, общие для всех процессов (например длина очереди в Redis), читаются
+    в момент запроса /metrics, а не складываются из значений процессов
+    """
+
+    def __init__(self):
+        self.readers = {}
+
+    def collect(self):
+        for name, (documentation, read) in list(self.readers.items()):
+            try:
+                value = read()
+            except Exception as e:
+                logger.error(f"Failed to read metric {name}: {e}")
+                continue
+            yield GaugeMetricFamily(name, documentation, value=value)
+
+
+_live = _LiveCollector()
+
+
+def live_gauge(name, documentation, read):
+    _live.readers[name] = (documentation, read)
+
+
+def observe_stage(stage, seconds):
+    PIPELINE_STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def track_pool(engine, name):
+    """Считает выданные и открытые соединения пула через события SQLAlchemy"""
+    from sqlalchemy import event
+
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+    connections = DB_POOL_CONNECTIONS.labels(name)
+    event.listen(engine.pool, "connect", lambda *_: connections.inc())
+    event.listen(engine.pool, "close", lambda *_: connections.dec())
+    event.listen(engine.pool, "close_detached", lambda *_: connections.dec())
+    event.listen(engine.pool, "checkout", lambda *_: checked_out.inc())
+    event.listen(engine.pool, "checkin", lambda *_: checked_out.dec())
+
+
+if not PROMETHEUS_MULTIPROC_DIR:
+    REGISTRY.register(_live)
+
+
+def _registry():
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+    # Значения процессов собираются из файлов в PROMETHEUS_MULTIPROC_DIR при каждом запросе
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_live)
+    return registry
+
+
+def render_metrics():
+    """Метрики всех процессов узла в текстовом формате Prometheus"""
+    return generate_latest(_registry())
+
+
+def start_metrics_server(port):
+    """HTTP-сервер метрик для процессов без API (worker.py)"""
+    start_http_server(port, registry=_registry())
+    logger.info(f"Metrics server listening on port {port}")
+
+
+def mark_process_dead(pid):
+    """Убирает live-метрики завершившегося процесса; вызывается родителем процессов"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI-middleware, измеряющее длительность HTTP-запросов. Маршрут берется
+    из шаблона пути (/jobs/{job_id}), чтобы число рядов не росло с числом задач.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response_status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(response_status[0])
+            ).observe(time.perf_counter() - started)
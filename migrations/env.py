@@ -0,0 +1,27 @@
+# migrations/env.py
+from logging.config import fileConfig
+from alembic import context
+from database import Base, engine
+import models  # noqa: F401 - регистрирует таблицы в Base.metadata для autogenerate
+
+config = context.config
+
+# При запуске из приложения (database.run_migrations) его настройки логирования не трогаем
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_online():
+    # Тот же движок и те же настройки подключения, что у приложения
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+# Миграции проверяют существующие таблицы, поэтому режим --sql (offline) не поддерживается
+if context.is_offline_mode():
+    raise RuntimeError("Offline migrations are not supported, run alembic upgrade against the database")
+run_migrations_online()
@@ -0,0 +1,126 @@
+# migrations/versions/0001_initial_schema.py
+"""Initial schema
+
+Базы, созданные раньше через Base.metadata.create_all и migrate_schema,
+принимаются как есть: существующие таблицы не пересоздаются, а недостающие
+колонки и индексы добавляются.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Индексы по внешним ключам, которых нет в таблицах, созданных до их появления в моделях
+FOREIGN_KEY_INDEXES = (
+    ("ix_videos_user_id", "videos", "user_id"),
+    ("ix_subtitles_video_id", "subtitles", "video_id"),
+    ("ix_subscriptions_user_id", "subscriptions", "user_id"),
+)
+
+
+def _timestamps():
+    return [sa.Column("created_at", sa.DateTime()), sa.Column("updated_at", sa.DateTime())]
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String()),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("password", sa.String()),
+            sa.Column("is_active", sa.Boolean()),
+            sa.Column("free_tier", sa.Boolean()),
+            sa.Column("videos_count", sa.Integer(), server_default="0", nullable=False),
+            *_timestamps(),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    if "subscription_plans" not in existing:
+        op.create_table(
+            "subscription_plans",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), unique=True),
+            sa.Column("price", sa.Float()),
+            sa.Column("description", sa.Text()),
+            sa.Column("max_videos", sa.Integer()),
+            *_timestamps(),
+        )
+        op.create_index("ix_subscription_plans_id", "subscription_plans", ["id"])
+
+    if "videos" not in existing:
+        op.create_table(
+            "videos",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String()),
+            sa.Column("filename", sa.String()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("status", sa.String()),
+            *_timestamps(),
+        )
+        op.create_index("ix_videos_id", "videos", ["id"])
+        op.create_index("ix_videos_title", "videos", ["title"])
+
+    if "subtitles" not in existing:
+        op.create_table(
+            "subtitles",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("video_id", sa.Integer(), sa.ForeignKey("videos.id")),
+            sa.Column("filename", sa.String()),
+            sa.Column("language", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+        op.create_index("ix_subtitles_id", "subtitles", ["id"])
+
+    if "user_statistics" not in existing:
+        op.create_table(
+            "user_statistics",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), unique=True),
+            sa.Column("videos_processed", sa.Integer()),
+            sa.Column("total_video_duration", sa.Float()),
+            sa.Column("last_activity", sa.DateTime()),
+            *_timestamps(),
+        )
+        op.create_index("ix_user_statistics_id", "user_statistics", ["id"])
+
+    if "subscriptions" not in existing:
+        op.create_table(
+            "subscriptions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("plan_id", sa.Integer(), sa.ForeignKey("subscription_plans.id")),
+            sa.Column("start_date", sa.DateTime()),
+            sa.Column("end_date", sa.DateTime()),
+            sa.Column("is_active", sa.Boolean()),
+            *_timestamps(),
+        )
+        op.create_index("ix_subscriptions_id", "subscriptions", ["id"])
+
+    # Денормализованный счетчик видео появился позже самой таблицы users
+    columns = [column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")]
+    if "videos_count" not in columns:
+        op.add_column("users", sa.Column("videos_count", sa.Integer(), server_default="0", nullable=False))
+        op.execute(
+            "UPDATE users SET videos_count = "
+            "(SELECT COUNT(*) FROM videos WHERE videos.user_id = users.id)"
+        )
+    for index_name, table, column in FOREIGN_KEY_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})")
+
+
+def downgrade():
+    for table in ("subscriptions", "user_statistics", "subtitles", "videos", "subscription_plans", "users"):
+        op.drop_table(table)
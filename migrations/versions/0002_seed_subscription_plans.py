@@ -0,0 +1,56 @@
+# migrations/versions/0002_seed_subscription_plans.py
+"""Seed default subscription plans
+
+Тарифы раньше создавались при каждом запуске приложения, если таблица пуста.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+subscription_plans = sa.table(
+    "subscription_plans",
+    sa.column("name", sa.String),
+    sa.column("price", sa.Float),
+    sa.column("description", sa.Text),
+    sa.column("max_videos", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+    sa.column("updated_at", sa.DateTime),
+)
+
+DEFAULT_PLANS = [
+    {
+        "name": "Базовый",
+        "price": 0.0,
+        "description": "До 5 видео в месяц, базовое распознавание речи",
+        "max_videos": 5,
+    },
+    {
+        "name": "Премиум",
+        "price": 999.0,
+        "description": "Неограниченное количество видео, улучшенное распознавание речи",
+        "max_videos": -1,  # -1 означает неограниченное количество
+    },
+]
+
+
+def upgrade():
+    # Тарифы, заведенные в уже работающей базе, не трогаем
+    if op.get_bind().execute(sa.select(sa.func.count()).select_from(subscription_plans)).scalar():
+        return
+    now = datetime.utcnow()
+    op.bulk_insert(subscription_plans, [dict(plan, created_at=now, updated_at=now) for plan in DEFAULT_PLANS])
+
+
+def downgrade():
+    op.execute(
+        subscription_plans.delete().where(subscription_plans.c.name.in_([plan["name"] for plan in DEFAULT_PLANS]))
+    )
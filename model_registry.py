@@ -0,0 +1,179 @@
+# model_registry.py
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+from metrics import observe_stage, cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Модели, которые нужно загрузить при старте (через запятую)
+PRELOAD_MODELS = [
+    name.strip() for name in os.getenv("VOSK_PRELOAD_MODELS", "").split(",") if name.strip()
+]
+# Бюджет памяти под модели в мегабайтах (0 - без ограничения)
+MODEL_CACHE_MB = int(os.getenv("VOSK_MODEL_CACHE_MB", "0"))
+# Каталог моделей: по имени загружаются только модели из него. Сюда же vosk
+# скачивает модели при сборке образа (Model(model_name=...)); во время работы
+# модели не скачиваются.
+VOSK_MODEL_DIR = os.getenv("VOSK_MODEL_DIR", os.path.expanduser("~/.cache/vosk"))
+
+
+class ModelNotFound(LookupError):
+    pass
+
+
+def resolve_model_path(name):
+    """Каталог модели: явный путь или имя каталога в VOSK_MODEL_DIR; None, если его нет"""
+    if os.path.isdir(name):
+        return name
+    if name and name == os.path.basename(name) and name not in (".", ".."):
+        path = os.path.join(VOSK_MODEL_DIR, name)
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def available_models():
+    """Имена моделей, которые можно запросить в параметре vosk: VOSK_PRELOAD_MODELS и каталоги VOSK_MODEL_DIR"""
+    names = set(PRELOAD_MODELS)
+    try:
+        names.update(
+            entry.name for entry in os.scandir(VOSK_MODEL_DIR)
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
+    except OSError:
+        pass
+    return sorted(names)
+
+
+def _model_size_bytes(path):
+    """Оценивает объем памяти модели по размеру ее файлов на диске"""
+    if not os.path.isdir(path):
+        return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ModelRegistry:
+    """
+    Кэш моделей Vosk внутри процесса.
+
+    Модель загружается один раз на воркер и переиспользуется всеми запросами
+    с тем же значением параметра vosk. При превышении бюджета памяти
+    вытесняется модель, которая дольше всех не использовалась.
+    """
+
+    def __init__(self, budget_bytes=0):
+        self.budget_bytes = budget_bytes
+        self._models = OrderedDict()  # имя -> (модель, размер в байтах)
+        self._lock = threading.Lock()
+        self._load_locks = {}  # имя -> [блокировка загрузки, число потоков, которые ее ждут]
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def get(self, name):
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                self.hits += 1
+                cache_lookup("model", True)
+                return entry[0]
+            self.misses += 1
+            cache_lookup("model", False)
+            load_lock = self._load_locks.setdefault(name, [threading.Lock(), 0])
+            load_lock[1] += 1
+
+        # Одну и ту же модель грузит только один поток, остальные ждут
+        try:
+            with load_lock[0]:
+                with self._lock:
+                    entry = self._models.get(name)
+                    if entry is not None:
+                        self._models.move_to_end(name)
+                        return entry[0]
+                return self._load(name)
+        finally:
+            # Блокировка нужна только на время загрузки: имена из запросов
+            # (в том числе несуществующие) не копятся в словаре
+            with self._lock:
+                load_lock[1] -= 1
+                if not load_lock[1]:
+                    del self._load_locks[name]
+
+    def _load(self, name):
+        # Загружаются только каталоги, которые уже есть на диске: имя из запроса
+        # не должно приводить к скачиванию модели
+        path = resolve_model_path(name)
+        if path is None:
+            raise ModelNotFound(f"Модель Vosk '{name}' не найдена")
+        # vosk загружает нативную библиотеку, поэтому импортируется при первой загрузке модели
+        from vosk import Model
+        started = time.perf_counter()
+        model = Model(path)
+        elapsed = time.perf_counter() - started
+        observe_stage("model_load", elapsed)
+        size = _model_size_bytes(path)
+        logger.info(f"Vosk model '{name}' loaded in {elapsed:.2f}s")
+
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += elapsed
+            self._models[name] = (model, size)
+            self._models.move_to_end(name)
+            self._evict()
+        return model
+
+    def _evict(self):
+        # Вызывается под self._lock; последнюю загруженную модель не трогаем
+        if not self.budget_bytes:
+            return
+        while len(self._models) > 1 and self.used_bytes() > self.budget_bytes:
+            name, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            logger.info(f"Vosk model '{name}' evicted from registry")
+
+    def used_bytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def preload(self, names):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Failed to preload Vosk model '{name}': {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": list(self._models.keys()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 3),
+                "used_bytes": self.used_bytes(),
+                "budget_bytes": self.budget_bytes,
+            }
+
+
+registry = ModelRegistry(budget_bytes=MODEL_CACHE_MB * 1024 * 1024)
+
+
+def get_model(name):
+    return registry.get(name)
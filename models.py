@@ -16,6 +16,8 @@ class User(Base):
     password = Column(String)
     is_active = Column(Boolean, default=True)
     free_tier = Column(Boolean, default=True)
+    # Денормализованный счетчик видео, обновляется вместе с созданием Video
+    videos_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -30,7 +32,7 @@ class Video(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     filename = Column(String)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     status = Column(String, default="processing")  # processing, completed, failed
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -43,7 +45,7 @@ class Subtitle(Base):
     __tablename__ = 'subtitles'
     
     id = Column(Integer, primary_key=True, index=True)
-    video_id = Column(Integer, ForeignKey('videos.id'))
+    video_id = Column(Integer, ForeignKey('videos.id'), index=True)
     filename = Column(String)
     language = Column(String, default="ru")
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -69,7 +71,7 @@ class Subscription(Base):
     __tablename__ = 'subscriptions'
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     plan_id = Column(Integer, ForeignKey('subscription_plans.id'))
     start_date = Column(DateTime, default=datetime.utcnow)
     end_date = Column(DateTime)
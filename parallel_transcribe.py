@@ -0,0 +1,166 @@
+# parallel_transcribe.py
+import os
+import re
+import logging
+import subprocess
+import multiprocessing
+from dotenv import load_dotenv
+from model_registry import get_model
+from subs import recognize_words, stream_pcm_from_media
+from ffmpeg_runner import FFmpegCancelled, CANCEL_POLL_SECONDS
+from render import probe_duration
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Количество процессов распознавания (1 - последовательный режим)
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "1"))
+# Целевая длина отрезка и перекрытие соседних отрезков в секундах
+SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "60"))
+SEGMENT_OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_OVERLAP_SECONDS", "2"))
+# Резать по паузам, найденным фильтром silencedetect, а не ровно по SEGMENT_SECONDS
+SPLIT_ON_SILENCE = os.getenv("TRANSCRIBE_SPLIT_ON_SILENCE", "1") == "1"
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_SECONDS = 0.3
+# Слова с одинаковым текстом ближе этого порога на стыке считаются дублем
+SEAM_DUPLICATE_SECONDS = 0.3
+# Процессы пула запускаются через forkserver: fork из процесса с потоками (API,
+# потоки очереди задач) унаследовал бы блокировки, захваченные другими потоками
+POOL_START_METHOD = "forkserver"
+
+_SILENCE_START_RE = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+def detect_silences(media_path, noise_db=SILENCE_NOISE_DB, min_seconds=SILENCE_MIN_SECONDS):
+    """Список пауз (start, end) по фильтру silencedetect"""
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-i", media_path,
+        "-vn",
+        "-af", f"silencedetect=n={noise_db}dB:d={min_seconds}",
+        "-f", "null",
+        "-"
+    ]
+    stderr = subprocess.run(command, check=True, capture_output=True, text=True).stderr
+    silences = []
+    start = None
+    for line in stderr.splitlines():
+        match = _SILENCE_START_RE.search(line)
+        if match:
+            start = max(float(match.group(1)), 0.0)
+            continue
+        match = _SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_segments(duration, silences=(), segment_seconds=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP_SECONDS):
+    """
+    Делит [0, duration] на отрезки примерно по segment_seconds.
+    Граница сдвигается в середину ближайшей паузы, если та не дальше четверти отрезка.
+    Каждый отрезок декодируется с перекрытием overlap, а слова из него берутся
+    только в пределах [keep_start, keep_end).
+    """
+    cuts = []
+    target = segment_seconds
+    while target < duration:
+        window = segment_seconds / 4
+        candidates = [
+            (start + end) / 2 for start, end in silences
+            if abs((start + end) / 2 - target) <= window
+        ]
+        cut = min(candidates, key=lambda c: abs(c - target)) if candidates else target
+        cuts.append(cut)
+        target = cut + segment_seconds
+
+    bounds = [0.0] + cuts + [duration]
+    segments = []
+    for keep_start, keep_end in zip(bounds, bounds[1:]):
+        start = max(keep_start - overlap, 0.0)
+        end = min(keep_end + overlap, duration)
+        segments.append({
+            "start": start,
+            "duration": end - start,
+            "keep_start": keep_start,
+            "keep_end": keep_end,
+        })
+    return segments
+
+
+def _load_worker_model(vosk):
+    # Модель загружается один раз на процесс пула и служит всем его отрезкам.
+    # Исключение в initializer заставило бы пул бесконечно перезапускать
+    # процесс, поэтому ошибка всплывет из _transcribe_segment
+    try:
+        get_model(vosk)
+    except Exception as e:
+        logger.error(f"Failed to load Vosk model '{vosk}' in transcription worker: {e}")
+
+
+def _transcribe_segment(args):
+    media_path, vosk, segment = args
+    model = get_model(vosk)
+    chunks = stream_pcm_from_media(media_path, start=segment["start"], duration=segment["duration"])
+    words = []
+    for word in recognize_words(model, chunks):
+        word = dict(word, start=word["start"] + segment["start"], end=word["end"] + segment["start"])
+        middle = (word["start"] + word["end"]) / 2
+        if segment["keep_start"] <= middle < segment["keep_end"]:
+            words.append(word)
+    return words
+
+
+def merge_segment_words(segment_words):
+    """Склеивает слова отрезков по порядку и убирает дубли на стыках"""
+    merged = []
+    for words in segment_words:
+        for word in words:
+            if merged:
+                previous = merged[-1]
+                if word["start"] < previous["start"]:
+                    continue
+                if (word["word"] == previous["word"]
+                        and word["start"] - previous["start"] < SEAM_DUPLICATE_SECONDS):
+                    continue
+            merged.append(word)
+    return merged
+
+
+def transcribe_parallel(media_path, vosk, workers=TRANSCRIBE_WORKERS, split_on_silence=SPLIT_ON_SILENCE,
+                        should_cancel=None):
+    """
+    Распознает длинный файл параллельно: режет его на отрезки, распознает
+    их в пуле процессов и возвращает слова в порядке времени. Каждый процесс
+    пула держит свою копию модели. При should_cancel() пул останавливается
+    и выбрасывается FFmpegCancelled.
+    """
+    # Неизвестная модель должна упасть здесь, до запуска пула
+    model = get_model(vosk)
+    duration = probe_duration(media_path)
+    if workers <= 1 or duration <= SEGMENT_SECONDS:
+        return list(recognize_words(model, stream_pcm_from_media(media_path, should_cancel=should_cancel)))
+
+    silences = detect_silences(media_path) if split_on_silence else []
+    segments = plan_segments(duration, silences)
+
+    logger.info(f"Transcribing {duration:.1f}s in {len(segments)} segments with {workers} workers")
+    context = multiprocessing.get_context(POOL_START_METHOD)
+    if POOL_START_METHOD == "forkserver":
+        # Процессы пула получают уже импортированные модули от сервера
+        context.set_forkserver_preload([__name__])
+    with context.Pool(processes=min(workers, len(segments)), initializer=_load_worker_model,
+                      initargs=(vosk,)) as pool:
+        pending = pool.map_async(_transcribe_segment, [(media_path, vosk, segment) for segment in segments])
+        while not pending.ready():
+            pending.wait(CANCEL_POLL_SECONDS)
+            if should_cancel and not pending.ready() and should_cancel():
+                # Выход из with завершает процессы пула вместе с их ffmpeg
+                raise FFmpegCancelled("transcription cancelled")
+        segment_words = pending.get()
+    return merge_segment_words(segment_words)
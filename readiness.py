@@ -0,0 +1,82 @@
+# readiness.py
+# Импортируется первым в main.py: STARTED_AT - начало холодного старта процесса
+import time
+
+STARTED_AT = time.monotonic()
+
+import logging
+import threading
+from sqlalchemy import text
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Готовность процесса принимать запросы (/readyz): база доступна и обновлена
+    до последней миграции, модели из VOSK_PRELOAD_MODELS загружены. Модели
+    прогреваются в фоновом потоке, поэтому /healthz отвечает сразу после импорта.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}  # имя -> "loading" | "ready" | "failed"
+        self._schema_head = None
+        self.ready_seconds = None
+
+    def warm_models(self, names):
+        """Загружает модели в фоне; повторный вызов с теми же именами ничего не делает"""
+        with self._lock:
+            names = [name for name in names if name not in self._models]
+            for name in names:
+                self._models[name] = "loading"
+        if names:
+            threading.Thread(target=self._warm, args=(names,), name="model-warmup", daemon=True).start()
+
+    def _warm(self, names):
+        from model_registry import registry
+        for name in names:
+            try:
+                registry.get(name)
+                state = "ready"
+            except Exception as e:
+                logger.error(f"Failed to warm up Vosk model '{name}': {e}")
+                state = "failed"
+            with self._lock:
+                self._models[name] = state
+
+    def _check_schema(self):
+        from database import engine, schema_head
+        if self._schema_head is None:
+            self._schema_head = schema_head()
+        try:
+            with engine.connect() as connection:
+                revision = connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": revision == self._schema_head, "revision": revision, "head": self._schema_head}
+
+    def check(self):
+        """Состояние проверок; вызывается из /readyz в отдельном потоке"""
+        schema = self._check_schema()
+        with self._lock:
+            models = dict(self._models)
+        ready = schema["ok"] and all(state == "ready" for state in models.values())
+        if ready and self.ready_seconds is None:
+            self.ready_seconds = time.monotonic() - STARTED_AT
+            metrics.gauge(
+                "captioncraft_startup_seconds", "Seconds from process start to first ready check",
+                multiprocess_mode="liveall"
+            ).set(self.ready_seconds)
+            logger.info(f"Ready {self.ready_seconds:.2f}s after start")
+        return {
+            "ready": ready,
+            "database": schema,
+            "models": models,
+            "uptime_seconds": round(time.monotonic() - STARTED_AT, 3),
+            "startup_seconds": round(self.ready_seconds, 3) if self.ready_seconds is not None else None,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,235 @@
+# render.py
+import os
+import subprocess
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Кодек видео; для аппаратных кодеков (h264_nvenc, h264_qsv, ...) crf и tune не передаются
+VIDEO_CODEC = os.getenv("RENDER_VIDEO_CODEC", "libx264")
+# Профиль кодирования по умолчанию
+RENDER_PROFILE = os.getenv("RENDER_PROFILE", "balanced")
+# Потоков кодировщика (0 - ffmpeg выбирает сам)
+RENDER_THREADS = int(os.getenv("RENDER_THREADS", "0"))
+# Формат кадра по умолчанию (см. frame_format): размер ШxВ, например 1080x1920
+# для вертикальных shorts, способ вписывания и предел частоты кадров.
+# Пустой размер и 0 fps - как у исходника.
+RENDER_SIZE = os.getenv("RENDER_SIZE", "")
+RENDER_FIT = os.getenv("RENDER_FIT", "contain")
+RENDER_MAX_FPS = float(os.getenv("RENDER_MAX_FPS", "0"))
+
+# Профили кодирования видео
+ENCODER_PROFILES = {
+    "fast": {"preset": "veryfast", "crf": 26, "tune": None},
+    "balanced": {"preset": "fast", "crf": 23, "tune": None},
+    "quality": {"preset": "medium", "crf": 20, "tune": None},
+    "film": {"preset": "medium", "crf": 20, "tune": "film"},
+    "animation": {"preset": "medium", "crf": 20, "tune": "animation"},
+}
+
+SUBTITLE_STYLE = "Alignment=2,Fontsize=24,MarginV=35,FontName=Arial,Bold=1,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,Outline=2,Shadow=1,BorderStyle=1"
+
+# Как видео вписывается в размер кадра: contain - уменьшается с сохранением пропорций
+# (не увеличивается), crop - заполняет кадр с обрезкой по центру (например, горизонтальное
+# видео в вертикальный 9:16), pad - вписывается целиком с черными полями
+FRAME_FITS = ("contain", "crop", "pad")
+MAX_FRAME_SIDE = 4096
+
+# Кодеки, которые можно копировать в mp4 без перекодирования
+_MP4_COPY_AUDIO_CODECS = {"aac"}
+_CRF_CODECS = {"libx264", "libx265"}
+
+
+def probe_audio_codec(media_path):
+    """Кодек первой аудиодорожки файла или None, если дорожки нет"""
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        media_path
+    ]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip() or None
+
+
+def probe_duration(media_path):
+    """Длительность медиафайла в секундах по данным ffprobe"""
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        media_path
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return float(output.strip())
+
+
+def probe_frame_rate(media_path):
+    """Частота кадров первой видеодорожки или None, если ее не удалось определить"""
+    command = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=avg_frame_rate",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        media_path
+    ]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout.strip()
+        numerator, _, denominator = output.partition("/")
+        return float(numerator) / float(denominator or 1)
+    except (OSError, subprocess.CalledProcessError, ValueError, ZeroDivisionError):
+        return None
+
+
+def frame_format(size=None, fit=None, max_fps=None):
+    """
+    Проверяет параметры кадра результата и возвращает их словарем для задачи
+    или None, если кадр остается как у исходника. Незаданные параметры берутся
+    из RENDER_SIZE, RENDER_FIT, RENDER_MAX_FPS. Ошибки - ValueError.
+    """
+    size = RENDER_SIZE if size is None else size
+    fit = fit or RENDER_FIT
+    max_fps = RENDER_MAX_FPS if max_fps is None else max_fps
+    if fit not in FRAME_FITS:
+        raise ValueError(f"Неизвестный способ вписывания кадра. Доступны: {', '.join(FRAME_FITS)}")
+    if max_fps < 0:
+        raise ValueError("Частота кадров должна быть положительной")
+    width = height = None
+    if size:
+        try:
+            width, height = (int(side) for side in size.lower().split("x"))
+        except ValueError:
+            raise ValueError("Размер кадра задается как ШИРИНАxВЫСОТА, например 1080x1920")
+        # x264 с yuv420p требует четных сторон
+        if not (2 <= width <= MAX_FRAME_SIDE and 2 <= height <= MAX_FRAME_SIDE) or width % 2 or height % 2:
+            raise ValueError(f"Стороны кадра должны быть четными и не больше {MAX_FRAME_SIDE}")
+    if width is None and not max_fps:
+        return None
+    return {"width": width, "height": height, "fit": fit, "max_fps": max_fps or None}
+
+
+def frame_filters(frame, source_fps=None):
+    """
+    Фильтры -vf, приводящие кадр к формату frame. Прореживание кадров идет
+    первым, чтобы масштабирование, субтитры и кодировщик обрабатывали меньше кадров.
+    """
+    if not frame:
+        return []
+    filters = []
+    if frame["max_fps"] and (source_fps is None or source_fps > frame["max_fps"]):
+        filters.append(f"fps={frame['max_fps']:g}")
+    if frame["width"]:
+        width, height = frame["width"], frame["height"]
+        if frame["fit"] == "crop":
+            filters += [f"scale={width}:{height}:force_original_aspect_ratio=increase",
+                        f"crop={width}:{height}"]
+        elif frame["fit"] == "pad":
+            filters += [f"scale={width}:{height}:force_original_aspect_ratio=decrease:force_divisible_by=2",
+                        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black"]
+        else:
+            filters.append(f"scale='min({width},iw)':'min({height},ih)'"
+                           f":force_original_aspect_ratio=decrease:force_divisible_by=2")
+        filters.append("setsar=1")
+    return filters
+
+
+def frame_settings_key(frame):
+    """Строка для ключа кэша рендера: результат зависит от формата кадра"""
+    if not frame:
+        return ""
+    return f"{frame['width']}x{frame['height']}:{frame['fit']}:{frame['max_fps']}"
+
+
+def _audio_args(audio_source):
+    # Если звук уже в AAC, копируем его как есть
+    if probe_audio_codec(audio_source) in _MP4_COPY_AUDIO_CODECS:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac"]
+
+
+def _video_args(profile):
+    settings = ENCODER_PROFILES[profile]
+    args = ["-c:v", VIDEO_CODEC, "-preset", settings["preset"]]
+    if VIDEO_CODEC in _CRF_CODECS:
+        args += ["-crf", str(settings["crf"])]
+        if settings["tune"]:
+            args += ["-tune", settings["tune"]]
+    args += ["-threads", str(RENDER_THREADS)]
+    return args
+
+
+def _inputs_and_audio_map(video_file, audio_file):
+    inputs = ["-i", video_file]
+    if audio_file is not None:
+        inputs += ["-i", audio_file]
+        return inputs, ["-map", "1:a:0"], audio_file
+    # Без отдельного аудиофайла берется звуковая дорожка самого видео, если она есть
+    return inputs, ["-map", "0:a:0?"], video_file
+
+
+def build_burn_in_command(video_file, audio_file, srt_file, output_file, profile=RENDER_PROFILE, frame=None):
+    """
+    Команда ffmpeg, вжигающая субтитры в видео за один проход. Формат кадра
+    (frame_format) применяется в той же цепочке -vf до субтитров, поэтому libass
+    и кодировщик работают уже с уменьшенным кадром.
+    """
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Неизвестный профиль кодирования '{profile}'")
+    inputs, audio_map, audio_source = _inputs_and_audio_map(video_file, audio_file)
+    # В ASS стиль уже записан в самом файле
+    if srt_file.endswith(".ass"):
+        subtitle_filter = f"subtitles={srt_file}"
+    else:
+        subtitle_filter = f"subtitles={srt_file}:force_style='{SUBTITLE_STYLE}'"
+    source_fps = probe_frame_rate(video_file) if frame and frame["max_fps"] else None
+    return [
+        "ffmpeg",
+        "-y",
+        *inputs,
+        "-map", "0:v:0",
+        *audio_map,
+        "-vf", ",".join(frame_filters(frame, source_fps) + [subtitle_filter]),
+        *_video_args(profile),
+        *_audio_args(audio_source),
+        "-movflags", "+faststart",
+        output_file
+    ]
+
+
+def build_soft_subtitle_command(video_file, audio_file, srt_file, output_file, profile=RENDER_PROFILE, frame=None):
+    """
+    Команда ffmpeg, добавляющая субтитры отдельной дорожкой mov_text без
+    перекодирования видео. Субтитры отображает плеер клиента. Если задан
+    формат кадра, видео перекодируется с профилем profile.
+    """
+    inputs, audio_map, audio_source = _inputs_and_audio_map(video_file, audio_file)
+    subtitle_index = len(inputs) // 2
+    video_args = ["-c:v", "copy"]
+    if frame:
+        if profile not in ENCODER_PROFILES:
+            raise ValueError(f"Неизвестный профиль кодирования '{profile}'")
+        source_fps = probe_frame_rate(video_file) if frame["max_fps"] else None
+        filters = frame_filters(frame, source_fps)
+        video_args = (["-vf", ",".join(filters)] if filters else []) + _video_args(profile)
+    return [
+        "ffmpeg",
+        "-y",
+        *inputs,
+        "-i", srt_file,
+        "-map", "0:v:0",
+        *audio_map,
+        "-map", f"{subtitle_index}:s:0",
+        *video_args,
+        *_audio_args(audio_source),
+        "-c:s", "mov_text",
+        "-movflags", "+faststart",
+        output_file
+    ]
@@ -0,0 +1,180 @@
+# result_cache.py
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from dotenv import load_dotenv
+from cues import CUE_SETTINGS_KEY
+from vad import VAD_SETTINGS_KEY
+from render import frame_settings_key
+from metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Каталог кэша результатов и его размер в мегабайтах (0 - кэш выключен)
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "uploads/cache")
+CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "2048"))
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# Суффикс пустого файла-метки, по mtime которого считается последнее использование записи
+USED_SUFFIX = ".used"
+
+
+def cache_key(*parts):
+    """Ключ кэша из хешей содержимого и параметров обработки"""
+    return hashlib.sha256(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def transcript_key(media_hash, vosk):
+    # Транскрипт хранится словами (JSON), поэтому не зависит от группировки субтитров
+    return cache_key("transcript", media_hash, vosk, *_vad_key())
+
+
+def render_key(video_hash, audio_hash, vosk, profile, soft_subtitles, subtitle_format="srt", frame=None):
+    # Формат кадра входит в ключ, только если задан: ключи прежних результатов не меняются
+    frame_key = [frame_settings_key(frame)] if frame else []
+    return cache_key("render", video_hash, audio_hash or "", vosk, profile, soft_subtitles,
+                     subtitle_format, CUE_SETTINGS_KEY, *_vad_key(), *frame_key)
+
+
+def _vad_key():
+    # Без VAD ключи остаются прежними, чтобы не терять уже накопленный кэш
+    return [VAD_SETTINGS_KEY] if VAD_SETTINGS_KEY else []
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _touch(path):
+    with open(path, "a"):
+        pass
+    os.utime(path)
+
+
+class ResultCache:
+    """
+    Кэш транскриптов (JSON) и готовых видео на диске с вытеснением по LRU.
+    Время последнего использования хранится в mtime метки <запись>.used, поэтому
+    кэш общий для всех процессов, работающих с одним каталогом. mtime самих
+    записей не меняется: они жестко связаны с результатами в RESULTS_DIR, а там
+    mtime входит в ETag и отсчитывает срок хранения результата.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key, suffix):
+        """Путь к закэшированному файлу или None"""
+        if not self.enabled or not key:
+            return None
+        path = self._path(key, suffix)
+        if not os.path.exists(path):
+            self.misses += 1
+            cache_lookup("result", False)
+            return None
+        self._mark_used(path)
+        self.hits += 1
+        cache_lookup("result", True)
+        return path
+
+    def fetch(self, key, suffix, destination):
+        """Кладет закэшированный файл в destination; False, если его нет в кэше"""
+        path = self.get(key, suffix)
+        if path is None:
+            return False
+        try:
+            _link_or_copy(path, destination)
+        except OSError:
+            return False
+        return True
+
+    def put(self, key, suffix, source):
+        if not self.enabled or not key or not os.path.exists(source):
+            return
+        path = self._path(key, suffix)
+        temp_path = path + ".tmp"
+        try:
+            _link_or_copy(source, temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to cache {source}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._mark_used(path)
+        self._evict()
+
+    def _mark_used(self, path):
+        try:
+            _touch(path + USED_SUFFIX)
+        except OSError as e:
+            logger.warning(f"Failed to update cache recency for {path}: {e}")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith((".tmp", USED_SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            try:
+                used_at = os.stat(path + USED_SUFFIX).st_mtime
+            except OSError:
+                # Запись без метки (например, из прежней версии кэша) - по времени создания
+                used_at = stat.st_mtime
+            entries.append((used_at, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            used = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if used <= self.max_bytes:
+                    break
+                path = os.path.join(self.directory, name)
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                used -= size
+                try:
+                    os.remove(path + USED_SUFFIX)
+                except OSError:
+                    pass
+
+    def stats(self):
+        entries = self._entries() if self.enabled else []
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "used_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+result_cache = ResultCache(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,155 @@
+# streaming.py
+import os
+import re
+import hashlib
+import zipfile
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(path):
+    """ETag по размеру и времени изменения файла, без чтения содержимого"""
+    stat = os.stat(path)
+    digest = hashlib.md5(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _parse_range(header, size):
+    """Возвращает (start, end) включительно или None, если диапазон невалиден"""
+    match = _RANGE_RE.match(header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        # bytes=-N - последние N байт
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end:
+        return None
+    return start, end
+
+
+async def _iter_file(path, start, length):
+    async with aiofiles.open(path, "rb") as file:
+        await file.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = await file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def file_response(request: Request, path, media_type="video/mp4", filename=None):
+    """
+    Отдает файл потоком с поддержкой ETag/If-None-Match и одного диапазона Range.
+    Файл не читается в память целиком.
+    """
+    size = os.path.getsize(path)
+    etag = file_etag(path)
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        start, end = byte_range
+        length = end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            _iter_file(path, start, length), status_code=206, media_type=media_type, headers=headers
+        )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_file(path, 0, size), media_type=media_type, headers=headers)
+
+
+class _ZipBuffer:
+    """Приемник для ZipFile без seek: копит записанные байты до отправки клиенту"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(entries):
+    """
+    Собирает ZIP на лету и отдает его кусками: файлы читаются по CHUNK_SIZE,
+    архив не хранится ни в памяти, ни на диске. entries - пары (имя в архиве,
+    путь к файлу или bytes). Без сжатия: видео уже сжато.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, source in entries:
+            if isinstance(source, bytes):
+                archive.writestr(name, source)
+            else:
+                with open(source, "rb") as file, archive.open(name, "w", force_zip64=True) as target:
+                    while True:
+                        data = file.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        target.write(data)
+                        yield buffer.take()
+            yield buffer.take()
+    yield buffer.take()
+
+
+class CleanupStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse, у которого background выполняется при любом исходе.
+    Обычный StreamingResponse пропускает его, если отправка ответа оборвалась
+    с ошибкой, и тогда генератор тела может так и не запуститься.
+    background должен выдерживать повторный вызов.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        except BaseException:
+            if self.background is not None:
+                await self.background()
+            raise
+
+
+def zip_response(entries, filename):
+    """Отдает entries одним ZIP потоком (см. zip_stream)"""
+    chunks = (chunk for chunk in zip_stream(entries) if chunk)
+    return StreamingResponse(
+        chunks, media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
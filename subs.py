@@ -1,109 +1,176 @@
 import os
 import wave
 import json
+import logging
 import subprocess
-from vosk import Model, KaldiRecognizer
-from pydub import AudioSegment
-
-
+from dotenv import load_dotenv
+from model_registry import get_model
+from render import RENDER_PROFILE, build_burn_in_command, build_soft_subtitle_command
+from cues import write_subtitles
+from transcript import Transcript
+from ffmpeg_runner import run_ffmpeg, FFmpegSupervisor, FFMPEG_TIMEOUT_SECONDS
+from metrics import VAD_SPEECH_RATIO
+from vad import TRANSCRIBE_VAD, SpeechFilter
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Частота и формат, в которых Vosk принимает аудио
+SAMPLE_RATE = 16000
+CHUNK_FRAMES = 4000
+# Декодировать аудио ffmpeg'ом прямо в распознаватель, без промежуточных WAV
+STREAMING_TRANSCRIPTION = os.getenv("STREAMING_TRANSCRIPTION", "1") == "1"
+
+
+def pcm_decode_command(media_path, start=None, duration=None):
+    """
+    Команда ffmpeg, декодирующая аудиодорожку в 16 кГц mono s16le на stdout.
+    media_path="pipe:0" - читать медиа из stdin.
+    """
+    seek = ["-ss", str(start)] if start else []
+    limit = ["-t", str(duration)] if duration else []
+    return [
+        "ffmpeg",
+        *([] if media_path == "pipe:0" else ["-nostdin"]),
+        "-loglevel", "error",
+        *seek,
+        "-i", media_path,
+        *limit,
+        "-vn",
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-f", "s16le",
+        "-"
+    ]
 
 
-def transcribe_audio_to_srt(audio_path, vosk, output_srt, unique_id):
-    model = Model(vosk)
-   
+def stream_pcm_from_media(media_path, chunk_frames=CHUNK_FRAMES, start=None, duration=None,
+                          should_cancel=None, timeout=FFMPEG_TIMEOUT_SECONDS):
+    """
+    Декодирует аудиодорожку любого медиафайла в 16 кГц mono s16le через ffmpeg
+    и отдает ее кусками по chunk_frames кадров. Память не зависит от длины файла.
+    start и duration (в секундах) ограничивают декодируемый отрезок. Как и
+    run_ffmpeg, процесс останавливается по timeout и по should_cancel().
+    """
+    command = pcm_decode_command(media_path, start, duration)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with FFmpegSupervisor(process, should_cancel, timeout) as supervisor:
+        while True:
+            supervisor.poll_cancel()
+            data = process.stdout.read(chunk_frames * 2)
+            if not data:
+                break
+            yield data
+        process.wait()
+    supervisor.check(command)
+
+
+def _read_wave_chunks(wf, chunk_frames=CHUNK_FRAMES):
+    while True:
+        data = wf.readframes(chunk_frames)
+        if len(data) == 0:
+            break
+        yield data
+
+
+def transcribe_audio(audio_path, vosk, unique_id, streaming=STREAMING_TRANSCRIPTION, workers=None, should_cancel=None):
+    """
+    Распознает речь в аудио- или видеофайле и возвращает Transcript.
+    should_cancel позволяет прервать декодирование (FFmpegCancelled).
+    """
+    model = get_model(vosk)
+
+    if streaming:
+        # Импортируем здесь, чтобы избежать циклического импорта
+        from parallel_transcribe import TRANSCRIBE_WORKERS, transcribe_parallel
+        workers = workers or TRANSCRIBE_WORKERS
+        if workers > 1:
+            return Transcript.from_words(transcribe_parallel(audio_path, vosk, workers, should_cancel=should_cancel))
+        chunks = stream_pcm_from_media(audio_path, should_cancel=should_cancel)
+        return Transcript.from_words(recognize_words(model, chunks))
+
+    from pydub import AudioSegment
     audio = AudioSegment.from_file(audio_path)
-    audio = audio.set_channels(1).set_frame_rate(16000)
+    audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE)
 
-    wav_path = f"temp{unique_id}.wav"
+    # Временный WAV кладется рядом с исходным файлом (в каталог задачи), а не в текущий каталог
+    wav_path = os.path.join(os.path.dirname(os.path.abspath(audio_path)), f"temp{unique_id}.wav")
     audio.export(wav_path, format="wav")
 
     wf = wave.open(wav_path, "rb")
-    recognizer = KaldiRecognizer(model, wf.getframerate())
-    recognizer.SetWords(True)
-    
-    has_content = False
-    with open(output_srt, 'w', encoding='utf-8') as srt_file:
-        idx = 1
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
+    try:
+        return Transcript.from_words(recognize_words(model, _read_wave_chunks(wf), wf.getframerate()))
+    finally:
+        wf.close()
+        os.remove(wav_path)
+
+def transcribe_audio_to_srt(audio_path, vosk, output_srt, unique_id, streaming=STREAMING_TRANSCRIPTION, workers=None):
+    transcript = transcribe_audio(audio_path, vosk, unique_id, streaming, workers)
+    write_transcript_subtitles(transcript, output_srt)
+    return transcript
 
-            if recognizer.AcceptWaveform(data):
-                result = json.loads(recognizer.Result())
-                for word in result.get('result', []):
-                    has_content = True
-                    start_time = word['start']
-                    end_time = word['end']
-                    start_srt = format_timestamp(start_time)
-                    end_srt = format_timestamp(end_time)
-                    text = word['word']
-
-                    srt_file.write(f"{idx}\n")
-                    srt_file.write(f"{start_srt} --> {end_srt}\n")
-                    srt_file.write(f"{text}\n\n")
-                    idx += 1
-        final_result = json.loads(recognizer.FinalResult())
-        for word in final_result.get('result', []):
-            has_content = True
-            start_time = word['start']
-            end_time = word['end']
-            start_srt = format_timestamp(start_time)
-            end_srt = format_timestamp(end_time)
-            text = word['word']
-
-            srt_file.write(f"{idx}\n")
-            srt_file.write(f"{start_srt} --> {end_srt}\n")
-            srt_file.write(f"{text}\n\n")
-            idx += 1
-
-    wf.close()
-    os.remove(wav_path)
-    
-    if not has_content:
-        os.remove(output_srt)
+def write_transcript_subtitles(transcript, output_srt):
+    if not write_subtitles(transcript, output_srt):
         raise ValueError("Не удалось распознать речь в аудиофайле")
-        
-    print(f"SRT file saved at: {output_srt}")
-
-def format_timestamp(seconds):
-    """Convert seconds to SRT timestamp format: hh:mm:ss,ms"""
-    millis = int((seconds - int(seconds)) * 1000)
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    return f"{h:02}:{m:02}:{s:02},{millis:03}"
-
-def add_subtitles_to_video(video_file, audio_file, srt_file='subtitles.srt', output_file='output_shorts.mp4'):
+    logger.info(f"Subtitles saved at: {output_srt}")
+
+def recognize_words(model, chunks, sample_rate=SAMPLE_RATE, skip_silence=TRANSCRIBE_VAD):
+    """
+    Прогоняет куски PCM через KaldiRecognizer и отдает слова по мере распознавания.
+    skip_silence - отдавать распознавателю только участки с речью (vad.SpeechFilter);
+    тайминги слов при этом пересчитываются обратно во время исходного аудио.
+    """
+    # vosk загружает нативную библиотеку, поэтому импортируется при первом распознавании
+    from vosk import KaldiRecognizer
+    recognizer = KaldiRecognizer(model, sample_rate)
+    recognizer.SetWords(True)
+    speech = SpeechFilter(sample_rate) if skip_silence else None
+    if speech:
+        chunks = speech.filter(chunks)
+    for data in chunks:
+        if recognizer.AcceptWaveform(data):
+            words = json.loads(recognizer.Result()).get('result', [])
+            yield from speech.restore_times(words) if speech else words
+    words = json.loads(recognizer.FinalResult()).get('result', [])
+    yield from speech.restore_times(words) if speech else words
+    if speech and speech.total_seconds:
+        stats = speech.stats()
+        VAD_SPEECH_RATIO.observe(stats["speech_ratio"])
+        logger.info(f"VAD kept {stats['speech_seconds']:.1f}s of {stats['total_seconds']:.1f}s audio "
+                    f"({stats['speech_ratio']:.0%})")
+
+def add_subtitles_to_video(video_file, audio_file, srt_file='subtitles.srt', output_file='output_shorts.mp4', profile=RENDER_PROFILE, soft_subtitles=False,
+                           duration=None, on_progress=None, should_cancel=None, frame=None):
+    """
+    Рендерит видео с субтитрами. duration (секунды) нужна для процента готовности
+    в on_progress; should_cancel позволяет прервать кодирование. frame - формат
+    кадра результата (render.frame_format), None - как у исходника.
+    """
     if not os.path.exists(video_file):
         raise FileNotFoundError(f"Видеофайл '{video_file}' не найден")
 
-    if not os.path.exists(audio_file):
+    # Без отдельного аудиофайла берется звуковая дорожка самого видео
+    if audio_file is not None and not os.path.exists(audio_file):
         raise FileNotFoundError(f"Аудиофайл '{audio_file}' не найден")
 
     if not os.path.exists(srt_file):
         raise FileNotFoundError(f"Файл субтитров '{srt_file}' не найден")
 
-    command = [
-        "ffmpeg",
-        "-y",
-        "-i", video_file,
-        "-i", audio_file,
-        "-vf", f"subtitles={srt_file}:force_style='Alignment=2,Fontsize=24,MarginV=35,FontName=Arial,Bold=1,PrimaryColour=&HFFFFFF,OutlineColour=&H000000,Outline=2,Shadow=1,BorderStyle=1'",
-        "-c:v", "h264",
-        "-c:a", "aac",
-        "-preset", "fast",
-        output_file
-    ]
+    if soft_subtitles:
+        command = build_soft_subtitle_command(video_file, audio_file, srt_file, output_file, profile, frame)
+    else:
+        command = build_burn_in_command(video_file, audio_file, srt_file, output_file, profile, frame)
 
-    subprocess.run(command, check=True)
-    print(f"Видео с субтитрами сохранено как: {output_file}")
+    run_ffmpeg(command, duration=duration, on_progress=on_progress, should_cancel=should_cancel)
+    logger.info(f"Video with subtitles saved as: {output_file}")
 
 
 
-def extract_audio_from_video(video_file, output_audio_file):
+def extract_audio_from_video(video_file, output_audio_file, should_cancel=None):
     if not video_file:
-        print(f"Видеофайл '{video_file}' не найден")
+        logger.error(f"Video file '{video_file}' not found")
         return
 
     command = [
@@ -116,18 +183,27 @@ def extract_audio_from_video(video_file, output_audio_file):
         output_audio_file
     ]
 
-    subprocess.run(command, check=True)
-    print(f"Аудио из видео сохранено как: {output_audio_file}")
+    run_ffmpeg(command, should_cancel=should_cancel)
+    logger.info(f"Audio extracted to: {output_audio_file}")
 
 
 
-def create_shorts_video(video_file, audio_file, vosk='vosk-model-small-en-us-0.15', output_file="output_shorts.mp4", srt_file='subtitles.srt'):
+def create_shorts_video(video_file, audio_file, vosk='vosk-model-small-en-us-0.15', output_file="output_shorts.mp4", srt_file='subtitles.srt', profile=RENDER_PROFILE, soft_subtitles=False, transcript=None,
+                        duration=None, on_progress=None, should_cancel=None, frame=None):
+    """
+    Распознает речь (если transcript не передан, например взят из кэша),
+    вжигает субтитры и возвращает Transcript
+    """
     try:
-        transcribe_audio_to_srt(audio_file, vosk, srt_file, output_file)
-        add_subtitles_to_video(video_file, audio_file, srt_file, output_file)
+        if transcript is None:
+            transcript = transcribe_audio(audio_file or video_file, vosk, os.path.basename(output_file),
+                                          should_cancel=should_cancel)
+        write_transcript_subtitles(transcript, srt_file)
+        add_subtitles_to_video(video_file, audio_file, srt_file, output_file, profile, soft_subtitles,
+                               duration, on_progress, should_cancel, frame)
+        return transcript
     finally:
         if os.path.exists(srt_file):
             os.remove(srt_file)
-            print(f"Временный файл {srt_file} удален.")
 
 
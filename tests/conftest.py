@@ -0,0 +1,22 @@
+# tests/conftest.py
+# Модули приложения лежат в корне репозитория и при импорте создают рабочие
+# каталоги, поэтому каталоги переводятся во временную папку до первого импорта.
+# Запуск из корня репозитория:
+#   python -m pytest -q tests
+import os
+import sys
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="captioncraft-tests-")
+os.environ.setdefault("SCRATCH_DIR", os.path.join(_TMP, "videos"))
+os.environ.setdefault("JOBS_DIR", os.path.join(_TMP, "videos"))
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_TMP, "cache"))
+os.environ.setdefault("ADMISSION_BACKEND", "memory")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TMP, ignore_errors=True)
@@ -0,0 +1,130 @@
+# tests/test_admission.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+import admission as admission_module
+from admission import (
+    AdmissionController, _MemoryCounters, ADMITTED, USER_LIMIT, NODE_LIMIT,
+    PRIORITY_FREE, PRIORITY_PREMIUM, ADMISSION_MAX_PER_USER, ADMISSION_RETRY_AFTER_SECONDS,
+)
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    async def commit(self):
+        self.commits += 1
+
+
+def controller(max_videos=-1, used=0):
+    """AdmissionController без базы: plan_usage возвращает заданные значения"""
+    admission = AdmissionController(_MemoryCounters())
+
+    async def plan_usage(db, user):
+        return max_videos, used
+
+    admission.plan_usage = plan_usage
+    return admission
+
+
+def user(user_id=1, free_tier=True):
+    return SimpleNamespace(id=user_id, free_tier=free_tier)
+
+
+def admit(admission, db, user, incoming_bytes=None):
+    return asyncio.run(admission.admit(db, user, incoming_bytes))
+
+
+def test_memory_counters_limits():
+    counters = _MemoryCounters()
+    assert counters.acquire(1, max_total=3, max_per_user=2) == ADMITTED
+    assert counters.acquire(1, max_total=3, max_per_user=2) == ADMITTED
+    assert counters.acquire(1, max_total=3, max_per_user=2) == USER_LIMIT
+    assert counters.acquire(2, max_total=3, max_per_user=2) == ADMITTED
+    assert counters.acquire(3, max_total=3, max_per_user=2) == NODE_LIMIT
+    assert counters.in_flight() == 3
+    counters.release(1)
+    assert counters.in_flight() == 2
+    assert counters.acquire(3, max_total=3, max_per_user=2) == ADMITTED
+
+
+def test_memory_counters_release_is_safe_to_repeat():
+    counters = _MemoryCounters()
+    counters.acquire(1, max_total=3, max_per_user=2)
+    counters.release(1)
+    counters.release(1)
+    counters.release(42)
+    assert counters.in_flight() == 0
+    assert counters.acquire(1, max_total=1, max_per_user=1) == ADMITTED
+
+
+def test_admit_returns_priority_and_commits():
+    admission = controller()
+    db = FakeSession()
+    assert admit(admission, db, user(1, free_tier=False)) == PRIORITY_PREMIUM
+    # Бесплатный пользователь без лимита видео обслуживается как премиум
+    assert admit(admission, db, user(2, free_tier=True)) == PRIORITY_PREMIUM
+    limited = controller(max_videos=5, used=1)
+    assert admit(limited, db, user(3, free_tier=True)) == PRIORITY_FREE
+    # Транзакция завершается до ожидания места и приема тела запроса
+    assert db.commits == 3
+    assert admission.admitted == 2
+    assert admission.counters.in_flight() == 2
+
+
+def test_admit_rejects_exhausted_quota():
+    admission = controller(max_videos=5, used=5)
+    with pytest.raises(HTTPException) as error:
+        admit(admission, FakeSession(), user())
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) > 0
+    assert admission.rejected["quota"] == 1
+    assert admission.counters.in_flight() == 0
+
+
+def test_admit_rejects_too_many_jobs_per_user():
+    admission = controller(max_videos=100)
+    db = FakeSession()
+    for _ in range(ADMISSION_MAX_PER_USER):
+        admit(admission, db, user(7))
+    with pytest.raises(HTTPException) as error:
+        admit(admission, db, user(7))
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == str(ADMISSION_RETRY_AFTER_SECONDS)
+    assert admission.rejected["user"] == 1
+    admission.release(7)
+    assert admit(admission, db, user(7)) == PRIORITY_FREE
+
+
+def test_admit_rejects_when_node_is_full(monkeypatch):
+    monkeypatch.setattr(admission_module, "ADMISSION_MAX_IN_FLIGHT", 2)
+    admission = controller()
+    db = FakeSession()
+    admit(admission, db, user(1))
+    admit(admission, db, user(2))
+    with pytest.raises(HTTPException) as error:
+        admit(admission, db, user(3))
+    assert error.value.status_code == 429
+    assert admission.rejected["node"] == 1
+    assert admission.stats()["rejected"]["node"] == 1
+
+
+def test_admit_rejects_without_scratch_space(monkeypatch):
+    requested = []
+
+    async def wait_for_room(incoming_bytes=0, timeout=None):
+        requested.append(incoming_bytes)
+        return False
+
+    monkeypatch.setattr(admission_module.scratch, "wait_for_room", wait_for_room)
+    admission = controller()
+    with pytest.raises(HTTPException) as error:
+        admit(admission, FakeSession(), user(), incoming_bytes=123)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(ADMISSION_RETRY_AFTER_SECONDS)
+    assert requested == [123]
+    assert admission.rejected["disk"] == 1
+    # Место в счетчиках не занято
+    assert admission.counters.in_flight() == 0
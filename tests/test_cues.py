@@ -0,0 +1,68 @@
+# tests/test_cues.py
+from cues import group_words, iter_ass, format_ass_timestamp
+
+
+def word(text, start, end):
+    return {"word": text, "start": start, "end": end, "conf": 1.0}
+
+
+def test_group_words_splits_on_chars_duration_and_gap():
+    words = [
+        word("раз", 0.0, 0.3),
+        word("два", 0.4, 0.7),
+        # Фраза стала бы длиннее max_chars
+        word("длинное", 0.8, 1.2),
+        # Пауза перед словом больше max_gap
+        word("три", 2.5, 2.8),
+        word("четыре", 2.9, 3.3),
+        # Фраза стала бы длиннее max_duration
+        word("пять", 5.0, 5.3),
+    ]
+    cues = list(group_words(words, max_chars=10, max_duration=2.7, max_gap=0.6))
+    assert [cue["text"] for cue in cues] == ["раз два", "длинное", "три четыре", "пять"]
+    assert (cues[0]["start"], cues[0]["end"]) == (0.0, 0.7)
+    assert cues[2]["words"] == words[3:5]
+
+
+def test_group_words_keeps_long_word_as_own_cue():
+    words = [word("а", 0.0, 0.1), word("сверхдлинноеслово", 0.2, 0.5), word("б", 0.6, 0.7)]
+    cues = list(group_words(words, max_chars=5, max_duration=10, max_gap=1))
+    assert [cue["text"] for cue in cues] == ["а", "сверхдлинноеслово", "б"]
+
+
+def test_group_words_empty():
+    assert list(group_words([])) == []
+
+
+def test_format_ass_timestamp():
+    assert format_ass_timestamp(0) == "0:00:00.00"
+    assert format_ass_timestamp(3723.456) == "1:02:03.46"
+
+
+def test_iter_ass_karaoke_timing():
+    cue = {
+        "start": 1.0,
+        "end": 2.5,
+        "text": "раз два три",
+        "words": [word("раз", 1.2, 1.5), word("два", 1.5, 1.9), word("три", 2.0, 2.3)],
+    }
+    header, line = list(iter_ass([cue]))
+    assert header.startswith("[Script Info]")
+    assert "[Events]" in header
+    # Пауза до первого слова, затем каждое слово до начала следующего, последнее - до конца субтитра
+    assert line == "Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\\k20}{\\k30}раз {\\k50}два {\\k50}три\n"
+
+
+def test_iter_ass_karaoke_durations_sum_to_cue_length():
+    words = [word(f"w{i}", i * 0.333, i * 0.333 + 0.2) for i in range(7)]
+    cue = next(group_words(words, max_chars=100, max_duration=100, max_gap=1))
+    line = list(iter_ass([cue]))[1]
+    durations = [int(part.split("}")[0]) for part in line.split("{\\k")[1:]]
+    assert sum(durations) == round((cue["end"] - cue["start"]) * 100)
+
+
+def test_iter_ass_without_karaoke_escapes_text():
+    cue = {"start": 0.0, "end": 1.0, "text": "a{b}\\c", "words": [word("a{b}\\c", 0.0, 1.0)]}
+    line = list(iter_ass([cue], karaoke=False))[1]
+    assert line.endswith(",,a(b)\\\\c\n")
+    assert "\\k" not in line
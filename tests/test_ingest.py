@@ -0,0 +1,210 @@
+# tests/test_ingest.py
+import os
+import asyncio
+import zipfile
+import pytest
+from fastapi import HTTPException
+from ingest import UploadIngestor, extract_archive, MAX_FIELD_BYTES, MAX_PART_HEADER_BYTES
+
+BOUNDARY = "testboundary"
+
+
+class FakeRequest:
+    """Минимальный Request: заголовки и тело кусками, как их отдает Starlette"""
+
+    def __init__(self, body, chunk_size=1000, content_type=f"multipart/form-data; boundary={BOUNDARY}"):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.chunk_size = chunk_size
+        self.consumed = 0
+
+    async def stream(self):
+        for offset in range(0, len(self.body), self.chunk_size):
+            self.consumed = offset + self.chunk_size
+            yield self.body[offset:offset + self.chunk_size]
+
+
+def multipart(*parts):
+    """parts - (имя поля, имя файла или None, данные)"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def ingest(request, directory, max_bytes=10_000, **kwargs):
+    ingestor = UploadIngestor(request, str(directory), "job", max_bytes, **kwargs)
+    return asyncio.run(ingestor.ingest())
+
+
+def test_ingest_writes_files_and_fields(tmp_path):
+    request = FakeRequest(multipart(("language", None, b"ru"), ("video", "clip.mov", b"x" * 2500)))
+    ingestor = ingest(request, tmp_path)
+    assert ingestor.fields == {"language": "ru"}
+    upload = ingestor.result("video")
+    assert upload["path"] == os.path.join(str(tmp_path), "job.video.mov")
+    assert upload["filename"] == "clip.mov"
+    assert upload["size"] == 2500
+    with open(upload["path"], "rb") as file:
+        assert file.read() == b"x" * 2500
+    assert ingestor.result("audio") is None
+
+
+def test_ingest_multiple_field_gets_numbered_keys(tmp_path):
+    request = FakeRequest(multipart(("video", "a.mp4", b"a"), ("video", "b.mp4", b"b")))
+    ingestor = ingest(request, tmp_path, file_fields=("video",), multiple=("video",))
+    assert sorted(ingestor.files) == ["video.0", "video.1"]
+
+
+def test_ingest_rejects_oversized_file_early(tmp_path):
+    request = FakeRequest(multipart(("video", "clip.mp4", b"x" * 50_000)))
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path, max_bytes=10_000)
+    assert error.value.status_code == 413
+    # Тело дочитывается только до превышения лимита, частичный файл удален
+    assert request.consumed < 20_000
+    assert os.listdir(tmp_path) == []
+
+
+def test_ingest_rejects_by_content_length(tmp_path):
+    request = FakeRequest(multipart(("video", "clip.mp4", b"x")))
+    request.headers["content-length"] = str(10_000_000)
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path, max_bytes=10_000)
+    assert error.value.status_code == 413
+    assert request.consumed == 0
+
+
+def test_ingest_form_fields_count_towards_limit(tmp_path):
+    request = FakeRequest(multipart(("comment", None, b"x" * 20_000)))
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path, max_bytes=10_000)
+    assert error.value.status_code == 413
+
+
+def test_ingest_rejects_oversized_field(tmp_path):
+    request = FakeRequest(multipart(("comment", None, b"x" * (MAX_FIELD_BYTES + 1))))
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path, max_bytes=10 * MAX_FIELD_BYTES)
+    assert error.value.status_code == 413
+    assert "comment" in error.value.detail
+
+
+def test_ingest_rejects_oversized_part_header(tmp_path):
+    request = FakeRequest(multipart(("x" * MAX_PART_HEADER_BYTES, None, b"1")))
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path, max_bytes=10 * MAX_PART_HEADER_BYTES)
+    assert error.value.status_code == 400
+
+
+def test_ingest_rejects_duplicate_file_field(tmp_path):
+    request = FakeRequest(multipart(("video", "a.mp4", b"a" * 100), ("video", "b.mp4", b"b" * 100)))
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path)
+    assert error.value.status_code == 400
+    assert "video" in error.value.detail
+    # Первый файл тоже удаляется
+    assert os.listdir(tmp_path) == []
+
+
+def test_ingest_rejects_unexpected_file_field(tmp_path):
+    request = FakeRequest(multipart(("avatar", "me.png", b"png")))
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path)
+    assert error.value.status_code == 400
+
+
+def test_ingest_requires_multipart(tmp_path):
+    request = FakeRequest(b"{}", content_type="application/json")
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path)
+    assert error.value.status_code == 400
+
+
+def test_ingest_rejects_malformed_body(tmp_path):
+    request = FakeRequest(f"--{BOUNDARY}\r\nContent-Disposition: form-data\r\n\r\n1\r\n--{BOUNDARY}--\r\n".encode())
+    with pytest.raises(HTTPException) as error:
+        ingest(request, tmp_path)
+    assert error.value.status_code == 400
+
+
+def make_archive(path, entries, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+
+
+def corrupt_entry(path, name):
+    """Портит сжатые данные одного файла архива, не трогая каталог архива"""
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(name)
+    with open(path, "r+b") as file:
+        file.seek(info.header_offset + 26)
+        name_length = int.from_bytes(file.read(2), "little")
+        extra_length = int.from_bytes(file.read(2), "little")
+        data_offset = info.header_offset + 30 + name_length + extra_length
+        file.seek(data_offset)
+        data = bytearray(file.read(info.compress_size))
+        for index in range(0, len(data), 3):
+            data[index] ^= 0xFF
+        file.seek(data_offset)
+        file.write(data)
+
+
+def test_extract_archive_reports_corrupt_entries_per_file(tmp_path):
+    archive_path = tmp_path / "batch.zip"
+    good = os.urandom(1000) + b"a" * 5000
+    make_archive(archive_path, [("one.mp4", good), ("two.mp4", b"b" * 5000), ("three.mp4", good)])
+    corrupt_entry(archive_path, "two.mp4")
+    out = tmp_path / "out"
+    out.mkdir()
+    uploads = extract_archive(str(archive_path), str(out), "job", max_file_bytes=10_000, max_items=10)
+    assert [upload["filename"] for upload in uploads] == ["one.mp4", "two.mp4", "three.mp4"]
+    assert "error" not in uploads[0] and "error" not in uploads[2]
+    assert uploads[1]["error"].startswith("Не удалось распаковать файл")
+    with open(uploads[2]["path"], "rb") as file:
+        assert file.read() == good
+    # Испорченный файл не остается в рабочем каталоге
+    assert sorted(os.listdir(out)) == sorted(os.path.basename(u["path"]) for u in (uploads[0], uploads[2]))
+
+
+def test_extract_archive_skips_service_files_and_limits(tmp_path):
+    archive_path = tmp_path / "batch.zip"
+    make_archive(archive_path, [
+        ("__MACOSX/._one.mp4", b"meta"),
+        (".DS_Store", b"meta"),
+        ("dir/one.mp4", b"1" * 100),
+        ("big.mp4", b"2" * 3000),
+        ("three.mp4", b"3" * 100),
+        ("four.mp4", b"4" * 100),
+    ])
+    out = tmp_path / "out"
+    out.mkdir()
+    uploads = extract_archive(str(archive_path), str(out), "job", max_file_bytes=1000, max_items=3)
+    assert [upload["filename"] for upload in uploads] == ["one.mp4", "big.mp4", "three.mp4"]
+    assert "error" in uploads[1] and uploads[1]["path"] is None
+    assert len(os.listdir(out)) == 2
+
+
+def test_extract_archive_total_budget(tmp_path):
+    archive_path = tmp_path / "batch.zip"
+    # Хорошо сжимаемые данные: архив маленький, распакованное - нет
+    make_archive(archive_path, [(f"{i}.mp4", b"\0" * 4000) for i in range(5)])
+    out = tmp_path / "out"
+    out.mkdir()
+    with pytest.raises(HTTPException) as error:
+        extract_archive(str(archive_path), str(out), "job", max_file_bytes=10_000, max_items=10,
+                        max_total_bytes=10_000)
+    assert error.value.status_code == 413
+    assert os.listdir(out) == []
+
+
+def test_extract_archive_rejects_non_zip(tmp_path):
+    archive_path = tmp_path / "batch.zip"
+    archive_path.write_bytes(b"not a zip")
+    with pytest.raises(HTTPException) as error:
+        extract_archive(str(archive_path), str(tmp_path), "job", max_file_bytes=1000, max_items=10)
+    assert error.value.status_code == 400
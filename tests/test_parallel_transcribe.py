@@ -0,0 +1,67 @@
+# tests/test_parallel_transcribe.py
+import pytest
+from parallel_transcribe import plan_segments, merge_segment_words
+
+
+def word(text, start, end):
+    return {"word": text, "start": start, "end": end, "conf": 1.0}
+
+
+def test_plan_segments_short_media_is_single_segment():
+    assert plan_segments(30, segment_seconds=60, overlap=2) == [
+        {"start": 0.0, "duration": 30, "keep_start": 0.0, "keep_end": 30},
+    ]
+
+
+def test_plan_segments_fixed_cuts_with_overlap():
+    segments = plan_segments(150, segment_seconds=60, overlap=2)
+    assert [(s["keep_start"], s["keep_end"]) for s in segments] == [(0.0, 60), (60, 120), (120, 150)]
+    assert [(s["start"], s["duration"]) for s in segments] == [(0.0, 62), (58, 64), (118, 32)]
+
+
+def test_plan_segments_snaps_cut_to_nearby_silence():
+    # Середина паузы 53 с в пределах четверти отрезка, пауза на 80 с - дальше
+    silences = [(52.0, 54.0), (79.0, 81.0)]
+    segments = plan_segments(100, silences, segment_seconds=60, overlap=1)
+    assert [(s["keep_start"], s["keep_end"]) for s in segments] == [(0.0, 53.0), (53.0, 100)]
+
+
+def test_plan_segments_ignores_distant_silence():
+    segments = plan_segments(100, [(20.0, 22.0)], segment_seconds=60, overlap=0)
+    assert [(s["keep_start"], s["keep_end"]) for s in segments] == [(0.0, 60), (60, 100)]
+
+
+def test_plan_segments_covers_whole_duration():
+    segments = plan_segments(1234.5, [(100.0, 101.0), (610.0, 611.0)], segment_seconds=60, overlap=2)
+    assert segments[0]["keep_start"] == 0.0
+    assert segments[-1]["keep_end"] == 1234.5
+    for previous, current in zip(segments, segments[1:]):
+        assert previous["keep_end"] == current["keep_start"]
+    for segment in segments:
+        assert segment["start"] >= 0.0
+        assert segment["start"] + segment["duration"] == pytest.approx(min(segment["keep_end"] + 2, 1234.5))
+
+
+def test_merge_segment_words_drops_seam_duplicates():
+    first = [word("раз", 0.0, 0.4), word("два", 59.8, 60.1)]
+    # Соседний отрезок распознал то же слово на стыке чуть иначе
+    second = [word("два", 59.9, 60.2), word("три", 60.5, 60.9)]
+    merged = merge_segment_words([first, second])
+    assert [(w["word"], w["start"]) for w in merged] == [("раз", 0.0), ("два", 59.8), ("три", 60.5)]
+
+
+def test_merge_segment_words_drops_words_out_of_order():
+    first = [word("раз", 0.0, 0.4), word("два", 10.0, 10.4)]
+    second = [word("эхо", 9.5, 9.9), word("три", 11.0, 11.4)]
+    merged = merge_segment_words([first, second])
+    assert [w["word"] for w in merged] == ["раз", "два", "три"]
+
+
+def test_merge_segment_words_keeps_repeated_word_after_pause():
+    merged = merge_segment_words([[word("да", 1.0, 1.2)], [word("да", 1.5, 1.7)]])
+    assert [w["start"] for w in merged] == [1.0, 1.5]
+
+
+def test_merge_segment_words_empty():
+    assert merge_segment_words([]) == []
+    assert merge_segment_words([[], []]) == []
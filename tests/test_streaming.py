@@ -0,0 +1,54 @@
+# tests/test_streaming.py
+import io
+import zipfile
+import pytest
+from streaming import _parse_range, zip_stream, CHUNK_SIZE
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_parse_range_valid(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=-",
+    "bytes=1000-",
+    "bytes=50-10",
+    "bytes=0-10,20-30",
+    "items=0-10",
+    "bytes=a-b",
+])
+def test_parse_range_invalid(header):
+    assert _parse_range(header, 1000) is None
+
+
+def test_parse_range_empty_file():
+    assert _parse_range("bytes=0-", 0) is None
+    assert _parse_range("bytes=-10", 0) is None
+
+
+def test_zip_stream_roundtrip(tmp_path):
+    large = tmp_path / "video.mp4"
+    large_data = bytes(range(256)) * (CHUNK_SIZE // 256 * 2 + 3)
+    large.write_bytes(large_data)
+    chunks = list(zip_stream([("a/video.mp4", str(large)), ("transcript.json", b'{"words": []}')]))
+    # Файл больше CHUNK_SIZE отдается несколькими кусками, а не одним буфером
+    assert sum(1 for chunk in chunks if chunk) > 2
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.namelist() == ["a/video.mp4", "transcript.json"]
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+        assert archive.read("a/video.mp4") == large_data
+        assert archive.read("transcript.json") == b'{"words": []}'
+        assert archive.testzip() is None
+
+
+def test_zip_stream_empty():
+    with zipfile.ZipFile(io.BytesIO(b"".join(zip_stream([])))) as archive:
+        assert archive.namelist() == []
@@ -0,0 +1,30 @@
+# tests/test_vad.py
+import pytest
+from vad import SpeechFilter
+
+
+def test_to_original_without_cuts_is_identity():
+    speech_filter = SpeechFilter(16000)
+    assert speech_filter.to_original(0) == 0
+    assert speech_filter.to_original(2.5) == pytest.approx(2.5)
+
+
+def test_to_original_skips_removed_silence():
+    speech_filter = SpeechFilter(100)
+    # Из исходного аудио вырезаны 1-3 с и 4-9 с
+    speech_filter.timeline = [(0, 0), (100, 300), (200, 900)]
+    assert speech_filter.to_original(0.5) == pytest.approx(0.5)
+    assert speech_filter.to_original(1.0) == pytest.approx(3.0)
+    assert speech_filter.to_original(1.5) == pytest.approx(3.5)
+    assert speech_filter.to_original(2.25) == pytest.approx(9.25)
+
+
+def test_restore_times_maps_words():
+    speech_filter = SpeechFilter(100)
+    speech_filter.timeline = [(0, 0), (100, 300)]
+    words = [{"word": "да", "start": 0.5, "end": 0.9}, {"word": "нет", "start": 1.2, "end": 1.6}]
+    restored = list(speech_filter.restore_times(words))
+    assert [(w["start"], w["end"]) for w in restored] == [
+        pytest.approx((0.5, 0.9)),
+        pytest.approx((3.2, 3.6)),
+    ]
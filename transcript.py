@@ -0,0 +1,94 @@
+# transcript.py
+import os
+import json
+from array import array
+
+FORMAT_VERSION = 1
+
+
+class Transcript:
+    """
+    Распознанные слова в колонках: время начала, конца и уверенность в
+    массивах array('d'), сами слова - списком строк. Заполняется по мере
+    поступления слов от распознавателя и сериализуется в SRT/VTT/ASS/JSON без
+    повторного разбора файлов субтитров.
+    """
+
+    __slots__ = ("words", "starts", "ends", "confidences")
+
+    def __init__(self):
+        self.words = []
+        self.starts = array("d")
+        self.ends = array("d")
+        self.confidences = array("d")
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        # Слова в виде словарей Vosk, как их ожидает cues.group_words
+        for index, word in enumerate(self.words):
+            yield {
+                "word": word,
+                "start": self.starts[index],
+                "end": self.ends[index],
+                "conf": self.confidences[index],
+            }
+
+    @property
+    def duration(self):
+        return self.ends[-1] if self.ends else 0.0
+
+    def append(self, word, start, end, conf=1.0):
+        self.words.append(word)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.confidences.append(conf)
+
+    def extend(self, words):
+        """Добавляет слова в формате Vosk ({'word', 'start', 'end', 'conf'})"""
+        for word in words:
+            self.append(word["word"], word["start"], word["end"], word.get("conf", 1.0))
+
+    @classmethod
+    def from_words(cls, words):
+        transcript = cls()
+        transcript.extend(words)
+        return transcript
+
+    def to_dict(self):
+        return {
+            "version": FORMAT_VERSION,
+            "words": self.words,
+            "start": [round(value, 3) for value in self.starts],
+            "end": [round(value, 3) for value in self.ends],
+            "conf": [round(value, 4) for value in self.confidences],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия транскрипта: {data.get('version')}")
+        if not len(data["words"]) == len(data["start"]) == len(data["end"]) == len(data["conf"]):
+            raise ValueError("Колонки транскрипта разной длины")
+        transcript = cls()
+        transcript.words = list(data["words"])
+        transcript.starts = array("d", data["start"])
+        transcript.ends = array("d", data["end"])
+        transcript.confidences = array("d", data["conf"])
+        return transcript
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    def save(self, path):
+        """Атомарно сохраняет транскрипт в JSON"""
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(self.to_json())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as file:
+            return cls.from_dict(json.load(file))
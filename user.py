@@ -1,52 +1,59 @@
 # crud.py
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User, UserCreate, UserStatistics, Video
 
-def get_user(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    result = await db.execute(select(User).where(User.id == user_id))
+    return result.scalars().first()
 
-def get_user_by_email(db: Session, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """
     Получает пользователя по email
     """
-    user = db.query(User).filter(User.email == email).first()
-    
-    if user:
-        # Получаем количество видео пользователя
-        videos_count = db.query(Video).filter(Video.user_id == user.id).count()
-        # Добавляем это поле к объекту пользователя
-        setattr(user, 'videos_count', videos_count)
-    
-    return user
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
     # Импортируем здесь, чтобы избежать циклического импорта
-    from auth import get_password_hash
-    hashed_password = get_password_hash(user.password)
+    from auth import get_password_hash_async
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(
         email=user.email, 
         password=hashed_password,
         username=user.username
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Создаем статистику для пользователя
     user_stats = UserStatistics(user_id=db_user.id)
     db.add(user_stats)
-    db.commit()
+    await db.commit()
     
     return db_user
 
-def get_user_statistics(db: Session, user_id: int):
-    return db.query(UserStatistics).filter(UserStatistics.user_id == user_id).first()
+async def get_user_statistics(db: AsyncSession, user_id: int):
+    result = await db.execute(select(UserStatistics).where(UserStatistics.user_id == user_id))
+    return result.scalars().first()
 
-def update_user_statistics(db: Session, user_id: int, video_duration: float = 0):
-    stats = get_user_statistics(db, user_id)
+async def update_user_statistics(db: AsyncSession, user_id: int, video_duration: float = 0):
+    stats = await get_user_statistics(db, user_id)
     if stats:
         stats.videos_processed += 1
         stats.total_video_duration += video_duration
-        db.commit()
-        db.refresh(stats)
+        await db.commit()
+        await db.refresh(stats)
     return stats
+
+async def create_video(db: AsyncSession, user_id: int, title: str, filename: str, status: str = "processing"):
+    """Создает запись Video и увеличивает users.videos_count в одной транзакции"""
+    video = Video(title=title, filename=filename, user_id=user_id, status=status)
+    db.add(video)
+    await db.execute(
+        update(User).where(User.id == user_id).values(videos_count=User.videos_count + 1)
+    )
+    await db.commit()
+    await db.refresh(video)
+    return video
@@ -0,0 +1,157 @@
+# user_cache.py
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+from models import User
+from metrics import cache_lookup
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# memory - кэш внутри процесса, redis - общий для всех воркеров
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+KEY_PREFIX = "captioncraft:user:"
+ID_KEY_PREFIX = "captioncraft:user_id:"
+
+# Хеш пароля в кэш не попадает
+_FIELDS = ("id", "email", "username", "is_active", "free_tier", "videos_count", "created_at", "updated_at")
+_DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+def _serialize(user):
+    data = {field: getattr(user, field) for field in _FIELDS}
+    for field in _DATETIME_FIELDS:
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+
+def _deserialize(data):
+    data = dict(data)
+    for field in _DATETIME_FIELDS:
+        if data.get(field):
+            data[field] = datetime.fromisoformat(data[field])
+    # Отдельный объект на каждый запрос, не привязанный к сессии
+    return User(**data)
+
+
+class _MemoryBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # email -> (срок действия, данные)
+        self._lock = threading.Lock()
+
+    async def get(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return entry[1]
+
+    async def set(self, email, data, ttl):
+        with self._lock:
+            self._entries[email] = (time.monotonic() + ttl, data)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete_user(self, user_id):
+        with self._lock:
+            for email, (_, data) in list(self._entries.items()):
+                if data["id"] == user_id:
+                    del self._entries[email]
+
+    def size(self):
+        return len(self._entries)
+
+
+class _RedisBackend:
+    def __init__(self, url):
+        import redis.asyncio
+        self.client = redis.asyncio.Redis.from_url(url)
+
+    async def get(self, email):
+        raw = await self.client.get(KEY_PREFIX + email)
+        return json.loads(raw) if raw else None
+
+    async def set(self, email, data, ttl):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(KEY_PREFIX + email, json.dumps(data), ex=ttl)
+            pipe.set(ID_KEY_PREFIX + str(data["id"]), email, ex=ttl)
+            await pipe.execute()
+
+    async def delete_user(self, user_id):
+        email = await self.client.get(ID_KEY_PREFIX + str(user_id))
+        if email:
+            await self.client.delete(KEY_PREFIX + email.decode(), ID_KEY_PREFIX + str(user_id))
+
+    def size(self):
+        return None
+
+
+class UserCache:
+    """
+    TTL-кэш пользователей, найденных по subject токена (email).
+    Избавляет аутентифицированные запросы от двух запросов к базе.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, email):
+        if self.ttl <= 0:
+            return None
+        data = await self.backend.get(email)
+        if data is None:
+            self.misses += 1
+            cache_lookup("user", False)
+            return None
+        self.hits += 1
+        cache_lookup("user", True)
+        return _deserialize(data)
+
+    async def set(self, email, user):
+        if self.ttl > 0:
+            await self.backend.set(email, _serialize(user), self.ttl)
+
+    async def invalidate(self, user_id):
+        """Сбрасывает запись пользователя после изменения его данных или видео"""
+        self.invalidations += 1
+        await self.backend.delete_user(user_id)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": USER_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size(),
+            "ttl_seconds": self.ttl,
+        }
+
+
+def _create_backend():
+    if USER_CACHE_BACKEND == "redis":
+        return _RedisBackend(REDIS_URL)
+    return _MemoryBackend(USER_CACHE_MAX_ENTRIES)
+
+
+user_cache = UserCache(_create_backend(), USER_CACHE_TTL_SECONDS)
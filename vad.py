@@ -0,0 +1,160 @@
+# vad.py
+import os
+import math
+import logging
+import warnings
+from collections import deque
+from dotenv import load_dotenv
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        # Python 3.13+: чистая реализация из pydub
+        from pydub import pyaudioop as audioop
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Пропускать тишину перед распознаванием (энергетический VAD)
+TRANSCRIBE_VAD = os.getenv("TRANSCRIBE_VAD", "0") == "1"
+# Кадр считается речью, если его уровень выше VAD_THRESHOLD_DB (dBFS) и выше
+# оценки уровня шума на VAD_MARGIN_DB
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))
+# Сколько тишины оставлять после речи и перед ней, чтобы не срезать края слов.
+# Паузы короче их суммы распознаватель получает целиком.
+VAD_HANGOVER_SECONDS = float(os.getenv("VAD_HANGOVER_SECONDS", "0.5"))
+VAD_PREROLL_SECONDS = float(os.getenv("VAD_PREROLL_SECONDS", "0.3"))
+FRAME_SECONDS = 0.03
+# Как быстро оценка шума поднимается к текущему уровню (опускается сразу)
+NOISE_FLOOR_RISE = 0.002
+SILENCE_DB = -96.0
+
+# Входит в ключ кэша транскриптов: при других настройках VAD слова могут отличаться
+VAD_SETTINGS_KEY = (
+    f"vad:{VAD_THRESHOLD_DB}:{VAD_MARGIN_DB}:{VAD_HANGOVER_SECONDS}:{VAD_PREROLL_SECONDS}"
+    if TRANSCRIBE_VAD else None
+)
+
+
+def _level_db(frame):
+    rms = audioop.rms(frame, 2)
+    return 20 * math.log10(rms / 32768) if rms else SILENCE_DB
+
+
+class SpeechFilter:
+    """
+    Оставляет в потоке s16le mono только участки с речью. Долгие паузы
+    вырезаются, а timeline запоминает, с какого места исходного аудио
+    начинается каждый оставленный участок, чтобы вернуть словам исходные
+    тайминги (restore_times).
+    """
+
+    def __init__(self, sample_rate, threshold_db=VAD_THRESHOLD_DB, margin_db=VAD_MARGIN_DB,
+                 hangover=VAD_HANGOVER_SECONDS, preroll=VAD_PREROLL_SECONDS):
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(sample_rate * FRAME_SECONDS) * 2
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.hangover_frames = int(hangover / FRAME_SECONDS)
+        self.preroll_frames = int(preroll / FRAME_SECONDS)
+        # (сэмпл в отфильтрованном потоке, сэмпл в исходном аудио) начала каждого участка
+        self.timeline = [(0, 0)]
+        self.total_samples = 0
+        self.speech_samples = 0
+        # Начинаем с тихой оценки шума, чтобы речь в самом начале файла не приняли за шум
+        self._noise_floor = threshold_db - margin_db
+        self._silent_run = self.hangover_frames + 1
+        self._skipped = deque(maxlen=self.preroll_frames or None)
+        self._dropped = False
+        self._pending = b""
+
+    def _is_speech(self, frame):
+        level = _level_db(frame)
+        if level < self._noise_floor:
+            self._noise_floor = level
+        else:
+            self._noise_floor += (level - self._noise_floor) * NOISE_FLOOR_RISE
+        return level > self.threshold_db and level > self._noise_floor + self.margin_db
+
+    def _frame(self, frame, output):
+        samples = len(frame) // 2
+        if self._is_speech(frame):
+            self._silent_run = 0
+            if self._dropped:
+                # Речь после вырезанной паузы: новый участок начинается с буфера pre-roll
+                skipped_samples = sum(len(skipped) for skipped in self._skipped) // 2
+                self.timeline.append((self.speech_samples, self.total_samples - skipped_samples))
+                self._dropped = False
+            for skipped in self._skipped:
+                output.append(skipped)
+                self.speech_samples += len(skipped) // 2
+            self._skipped.clear()
+        else:
+            self._silent_run += 1
+        if self._silent_run <= self.hangover_frames:
+            output.append(frame)
+            self.speech_samples += samples
+        else:
+            if self.preroll_frames and len(self._skipped) < self.preroll_frames:
+                self._skipped.append(frame)
+            else:
+                # Буфер pre-roll полон (или не нужен): самый старый кадр пропадает
+                if self.preroll_frames:
+                    self._skipped.append(frame)
+                self._dropped = True
+        self.total_samples += samples
+
+    def filter(self, chunks):
+        """Отдает куски PCM только с речью (и краями вокруг нее)"""
+        for data in chunks:
+            data = self._pending + data
+            usable = len(data) - len(data) % self.frame_bytes
+            self._pending = data[usable:]
+            output = []
+            for offset in range(0, usable, self.frame_bytes):
+                self._frame(data[offset:offset + self.frame_bytes], output)
+            if output:
+                yield b"".join(output)
+        if self._pending:
+            output = []
+            self._frame(self._pending, output)
+            self._pending = b""
+            if output:
+                yield b"".join(output)
+
+    def to_original(self, seconds):
+        """Переводит время в отфильтрованном потоке во время исходного аудио"""
+        position = seconds * self.sample_rate
+        index = len(self.timeline) - 1
+        while index > 0 and self.timeline[index][0] > position:
+            index -= 1
+        filtered_start, original_start = self.timeline[index]
+        return (original_start + position - filtered_start) / self.sample_rate
+
+    def restore_times(self, words):
+        """Возвращает словам тайминги исходного аудио"""
+        for word in words:
+            start = self.to_original(word["start"])
+            # Конец слова считается от его участка, даже если попал на стык
+            end = start + max(word["end"] - word["start"], 0.0)
+            yield dict(word, start=start, end=end)
+
+    @property
+    def total_seconds(self):
+        return self.total_samples / self.sample_rate
+
+    @property
+    def speech_seconds(self):
+        return self.speech_samples / self.sample_rate
+
+    def stats(self):
+        return {
+            "total_seconds": round(self.total_seconds, 3),
+            "speech_seconds": round(self.speech_seconds, 3),
+            "speech_ratio": round(self.speech_samples / self.total_samples, 4) if self.total_samples else None,
+        }
@@ -0,0 +1,99 @@
+# worker.py
+# Отдельный процесс-воркер рендера. Запуск: JOB_BACKEND=redis python worker.py
+# Процессов можно запускать сколько угодно и на разных узлах с общим SCRATCH_DIR.
+# PIPELINE_PROCESSES=4 - запустить 4 процесса-воркера от одного родителя. Модели из
+# VOSK_PRELOAD_MODELS загружаются в родителе до fork, и процессы делят их память.
+# METRICS_PORT=9100 - отдавать метрики воркера для Prometheus на этом порту (вместе с
+# PIPELINE_PROCESSES нужен PROMETHEUS_MULTIPROC_DIR, чтобы собрать метрики всех процессов).
+import os
+import sys
+import signal
+import logging
+import threading
+import multiprocessing
+from jobs import JOB_BACKEND, JOB_WORKERS, queue
+from model_registry import registry, PRELOAD_MODELS
+from metrics import start_metrics_server, mark_process_dead
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PIPELINE_PROCESSES = int(os.getenv("PIPELINE_PROCESSES", "1"))
+# Как часто родитель проверяет, живы ли процессы-воркеры
+SUPERVISE_INTERVAL = 1.0
+
+
+def _stop_event():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    return stop
+
+
+def run_worker():
+    """Разбирает очередь, пока не придет SIGTERM, затем дожидается начатых задач"""
+    stop = _stop_event()
+    queue.start()
+    logger.info(f"Worker {os.getpid()} started with {JOB_WORKERS} threads")
+    stop.wait()
+    logger.info(f"Stopping worker {os.getpid()}, draining running jobs...")
+    queue.stop()
+
+
+def run_pool(processes):
+    """Запускает processes воркеров через fork и перезапускает упавшие"""
+    context = multiprocessing.get_context("fork")
+    stop = _stop_event()
+    children = {}
+
+    def spawn():
+        process = context.Process(target=run_worker, name="pipeline-worker")
+        process.start()
+        children[process.pid] = process
+
+    for _ in range(processes):
+        spawn()
+    while not stop.wait(SUPERVISE_INTERVAL):
+        for pid, process in list(children.items()):
+            if process.is_alive():
+                continue
+            del children[pid]
+            mark_process_dead(pid)
+            logger.error(f"Worker {pid} exited with code {process.exitcode}, restarting")
+            spawn()
+
+    logger.info("Stopping workers...")
+    # SIGTERM: каждый воркер перестает брать задачи и доделывает начатые
+    for process in children.values():
+        process.terminate()
+    for pid, process in children.items():
+        process.join()
+        mark_process_dead(pid)
+
+
+def main():
+    if JOB_BACKEND != "redis":
+        logger.error("worker.py requires JOB_BACKEND=redis")
+        sys.exit(1)
+    if JOB_WORKERS < 1:
+        logger.error("JOB_WORKERS must be at least 1")
+        sys.exit(1)
+
+    # Модели загружаются до fork, чтобы процессы-воркеры делили их страницы памяти
+    if PRELOAD_MODELS:
+        logger.info(f"Preloading Vosk models: {', '.join(PRELOAD_MODELS)}")
+        registry.preload(PRELOAD_MODELS)
+
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    if PIPELINE_PROCESSES > 1:
+        run_pool(PIPELINE_PROCESSES)
+    else:
+        run_worker()
+
+
+if __name__ == "__main__":
+    main()
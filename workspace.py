@@ -0,0 +1,157 @@
+# workspace.py
+import os
+import time
+import shutil
+import asyncio
+import logging
+import threading
+from dotenv import load_dotenv
+from metrics import live_gauge
+
+logger = logging.getLogger(__name__)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Каталог рабочих файлов задач: у каждой задачи свой подкаталог. Лучше держать его на
+# быстром томе (tmpfs, например /dev/shm/captioncraft); при API и воркерах на разных
+# узлах каталог должен быть общим, как раньше JOBS_DIR.
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.getenv("JOBS_DIR", "uploads/videos"))
+# Бюджет места под рабочие файлы в мегабайтах (0 - без ограничения). При превышении
+# новые задачи ждут освобождения места до SCRATCH_WAIT_SECONDS, затем получают 503.
+SCRATCH_MAX_MB = int(os.getenv("SCRATCH_MAX_MB", "0"))
+SCRATCH_WAIT_SECONDS = float(os.getenv("SCRATCH_WAIT_SECONDS", "10"))
+# Каталог без активной задачи удаляется, если его не меняли столько секунд;
+# каталог активной задачи - если он старше SCRATCH_MAX_AGE_SECONDS
+SCRATCH_ORPHAN_SECONDS = int(os.getenv("SCRATCH_ORPHAN_SECONDS", "900"))
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", str(24 * 3600)))
+# Как долго переиспользуется подсчитанный объем каталога
+USAGE_CACHE_SECONDS = 2.0
+SPACE_POLL_INTERVAL = 1.0
+
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
+
+def workspace_path(job_id):
+    return os.path.join(SCRATCH_DIR, job_id)
+
+
+def create_workspace(job_id):
+    """Создает каталог рабочих файлов задачи и возвращает путь к нему"""
+    path = workspace_path(job_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def remove_workspace(job_id):
+    """Удаляет каталог задачи со всеми рабочими файлами"""
+    shutil.rmtree(workspace_path(job_id), ignore_errors=True)
+
+
+def _scan(path):
+    """Суммарный размер и время последнего изменения файлов в path"""
+    total = 0
+    newest = 0.0
+    try:
+        entries = list(os.scandir(path))
+        newest = os.stat(path).st_mtime
+    except OSError:
+        return 0, newest
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                size, mtime = _scan(entry.path)
+            else:
+                stat = entry.stat(follow_symlinks=False)
+                size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            continue
+        total += size
+        newest = max(newest, mtime)
+    return total, newest
+
+
+class ScratchUsage:
+    """Объем рабочих файлов на диске; пересчитывается не чаще USAGE_CACHE_SECONDS"""
+
+    def __init__(self, directory, budget_bytes):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._measured_at = 0.0
+
+    def bytes_used(self):
+        with self._lock:
+            if time.monotonic() - self._measured_at > USAGE_CACHE_SECONDS:
+                self._bytes, _ = _scan(self.directory)
+                self._measured_at = time.monotonic()
+            return self._bytes
+
+    def has_room(self, incoming_bytes=0):
+        if not self.budget_bytes:
+            return True
+        used = self.bytes_used()
+        # Пустой каталог принимает любую загрузку, иначе большой файл ждал бы вечно
+        return used == 0 or used + incoming_bytes <= self.budget_bytes
+
+    async def wait_for_room(self, incoming_bytes=0, timeout=SCRATCH_WAIT_SECONDS):
+        """Ждет, пока освободится место под incoming_bytes; False - не дождались"""
+        deadline = time.monotonic() + timeout
+        while not await asyncio.to_thread(self.has_room, incoming_bytes):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(SPACE_POLL_INTERVAL)
+        return True
+
+    def stats(self):
+        return {
+            "scratch_dir": self.directory,
+            "scratch_bytes": self.bytes_used(),
+            "scratch_budget_bytes": self.budget_bytes,
+        }
+
+
+scratch = ScratchUsage(SCRATCH_DIR, SCRATCH_MAX_MB * 1024 * 1024)
+# Каталог общий для процессов узла, поэтому объем читается при запросе /metrics
+live_gauge("captioncraft_scratch_bytes", "Bytes used by job scratch files", scratch.bytes_used)
+
+
+def cleanup_orphans(is_active, now=None):
+    """
+    Удаляет рабочие файлы, оставшиеся от упавших процессов и прерванных загрузок.
+    is_active(job_id) сообщает, что задача еще выполняется или ждет в очереди.
+    Файлы в корне SCRATCH_DIR (старая раскладка без подкаталогов) удаляются по возрасту.
+    """
+    now = now or time.time()
+    removed = 0
+    try:
+        entries = list(os.scandir(SCRATCH_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                _, mtime = _scan(entry.path)
+                job_id = entry.name
+            else:
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+                job_id = entry.name.split(".", 1)[0]
+        except OSError:
+            continue
+        age = now - mtime
+        if age < SCRATCH_ORPHAN_SECONDS:
+            continue
+        if age < SCRATCH_MAX_AGE_SECONDS and is_active(job_id):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+        removed += 1
+    if removed:
+        logger.info(f"Removed {removed} orphaned scratch entries")
+    return removed